@@ -1,15 +1,11 @@
 import streamlit as st
 import pandas as pd
-import os
-import json
 from datetime import datetime, date
-import numpy as np
-from difflib import get_close_matches
-import io
+from aps.activity_log import get_log
+from aps.reference_data import load_base_matrix, load_models
+from aps.session import context_query_params, save_context
 st.set_page_config(page_title="APS Tool", layout="wide")
 
-TEMP_FILE = "temp_user_data.json"
-
 # Load prerequisites
 def load_prerequisites():
     try:
@@ -18,9 +14,14 @@ def load_prerequisites():
     except:
         return "Prerequisites file not found."
 
-def save_user_data(data):
-    with open(TEMP_FILE, "w") as f:
-        json.dump(data, f)
+activity_log = get_log()
+
+def log_user_data(user_data):
+    # One activity row per distinct form/checklist, not per rerun
+    entry = {k: v for k, v in user_data.items() if k != "timestamp"}
+    if st.session_state.get("aps_logged_context") != entry:
+        activity_log.log_activity(user_data)
+        st.session_state["aps_logged_context"] = entry
 
 st.title("🧪 APS Tool (Accuracy · Precision · Stability)")
 
@@ -33,7 +34,7 @@ with st.sidebar:
 
     # Load base & matrix options
     try:
-        base_data = pd.read_excel("Precision_tables/Database_base_matrix.xlsx", sheet_name=None)
+        base_data = load_base_matrix()
         base_options = list(base_data.keys())
     except:
         base_data = {}
@@ -44,7 +45,7 @@ with st.sidebar:
 
     # Load model
     try:
-        model_data = pd.read_excel("Precision_tables/Database_Models.xlsx", sheet_name=None)
+        model_data = load_models()
         model_options = list(model_data.keys())
     except:
         model_data = {}
@@ -81,47 +82,37 @@ if valid:
         }
     }
 
-    save_user_data(user_data)
+    save_context(user_data)
+    log_user_data(user_data)
 
     colA, colB = st.columns(2)
     with colA:
         st.success("✅ All set! You may proceed.")
-        st.page_link("pages/1_Accuracy_and_Precision.py", label="➡️ Accuracy & Precision Test", icon="🧪")
+        st.page_link("pages/1_Accuracy_and_Precision.py", label="➡️ Accuracy & Precision Test", icon="🧪",
+                     query_params=context_query_params())
 
     with colB:
-        st.page_link("pages/2_Stability_Test.py", label="📈 Stability Test", icon="📊")
+        st.page_link("pages/2_Stability_Test.py", label="📈 Stability Test", icon="📊",
+                     query_params=context_query_params())
 else:
     st.warning("⚠️ Please fill in all fields above and check confirmation boxes.")
 
-LOG_FILE = "user_log.csv"
-
-def log_user_data(user_data):
-    log_entry = {
-        "Timestamp": user_data["timestamp"],
-        "Username": user_data["username"],
-        "Bench No": user_data["bench_no"],
-        "LSD": user_data["lsd"],
-        "Base": user_data["base"],
-        "Matrix": user_data["matrix"],
-        "Model": user_data["model"],
-        "Stabilization": user_data["checklist"]["stabilization"],
-        "Maintenance": user_data["checklist"]["maintenance"],
-        "Diagnostics": user_data["checklist"]["Diagnostics"],
-        "Preparation": user_data["checklist"]["preparation"]
-    }
-
-    df_log = pd.DataFrame([log_entry])
-    if not os.path.exists(LOG_FILE):
-        df_log.to_csv(LOG_FILE, index=False)
-    else:
-        df_log.to_csv(LOG_FILE, mode='a', index=False, header=False)
-
-if os.path.exists(LOG_FILE):
+if activity_log.has_rows("activity") or activity_log.has_rows("runs"):
     st.markdown("### 👥 Download User Activity Log")
-    with open(LOG_FILE, "rb") as f:
-        st.download_button(
-            label="📥 Download Log (CSV)",
-            data=f,
-            file_name="APS_user_log.csv",
-            mime="text/csv"
-        )
+    log_table = st.radio("Log", ["activity", "runs"], horizontal=True,
+                         format_func=lambda t: "User activity" if t == "activity" else "Test runs")
+    colL1, colL2, colL3, colL4 = st.columns(4)
+    log_bench = colL1.selectbox("Bench No", [""] + activity_log.distinct("bench_no", log_table))
+    log_user = colL2.selectbox("User", [""] + activity_log.distinct("username", log_table))
+    log_model = colL3.selectbox("Model", [""] + activity_log.distinct("model", log_table))
+    log_dates = colL4.date_input("Date range", value=(), max_value=date.today())
+    log_start, log_end = (list(log_dates) + [None, None])[:2]
+
+    # The CSV is only built when the button is clicked
+    st.download_button(
+        label="📥 Download Log (CSV)",
+        data=lambda: activity_log.export_csv(table=log_table, bench_no=log_bench, username=log_user,
+                                             model=log_model, start=log_start, end=log_end or log_start),
+        file_name=f"APS_{log_table}_log.csv",
+        mime="text/csv"
+    )
@@ -0,0 +1 @@
+# Shared APS logic used by the Streamlit pages.
@@ -0,0 +1,281 @@
+# Activity and run log in a local SQLite database (WAL mode).
+#
+# "activity" holds the user form with its checklist each time an operator
+# confirms a new context; "runs" holds one row per scored report with its
+# counts and per-element verdicts. Writes go through a background thread
+# that batches inserts, so page reruns never wait on the disk.
+import atexit
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+DB_FILE = os.environ.get("APS_LOG_DB", "aps_activity.db")
+LEGACY_CSV = "user_log.csv"
+
+BATCH_SIZE = 200
+FLUSH_SECONDS = 0.5
+# Tries per batch before its rows are dropped (locked or unwritable database)
+WRITE_ATTEMPTS = 2
+EXPORT_CHUNK = 5000
+
+ACTIVITY_COLUMNS = ["timestamp", "username", "bench_no", "lsd", "base", "matrix", "model",
+                    "stabilization", "maintenance", "diagnostics", "preparation"]
+RUN_COLUMNS = ["run_key", "timestamp", "username", "bench_no", "lsd", "base", "matrix", "model", "test_type",
+               "report_name", "passed", "total", "checklist", "summary"]
+
+# Headers of the legacy CSV log, in file order
+LEGACY_HEADERS = ["Timestamp", "Username", "Bench No", "LSD", "Base", "Matrix", "Model",
+                  "Stabilization", "Maintenance", "Diagnostics", "Preparation"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    username TEXT, bench_no TEXT, lsd TEXT, base TEXT, matrix TEXT, model TEXT,
+    stabilization INTEGER, maintenance INTEGER, diagnostics INTEGER, preparation INTEGER
+);
+CREATE INDEX IF NOT EXISTS activity_timestamp ON activity (timestamp);
+CREATE INDEX IF NOT EXISTS activity_bench ON activity (bench_no, timestamp);
+CREATE INDEX IF NOT EXISTS activity_model ON activity (model, timestamp);
+
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_key TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    username TEXT, bench_no TEXT, lsd TEXT, base TEXT, matrix TEXT, model TEXT,
+    test_type TEXT, report_name TEXT, passed INTEGER, total INTEGER,
+    checklist TEXT, summary TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS runs_bench ON runs (bench_no, timestamp);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (model, timestamp);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def connect(path=DB_FILE):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _iso(timestamp):
+    # Context timestamps are "dd-mm-YYYY HH:MM:SS"; stored as ISO so they sort
+    try:
+        return datetime.strptime(timestamp, "%d-%m-%Y %H:%M:%S").isoformat(sep=" ")
+    except (TypeError, ValueError):
+        return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+
+class ActivityLog:
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+        conn = connect(path)
+        conn.close()
+
+    # Writing
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="aps-activity-log", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self._queue.get(timeout=FLUSH_SECONDS))
+            except queue.Empty:
+                pass
+            # A failing batch never stops the writer: it is retried on a new
+            # connection, then dropped, and waiting flushes are released
+            # either way
+            try:
+                for attempt in range(1, WRITE_ATTEMPTS + 1):
+                    try:
+                        conn = conn or connect(self.path)
+                        self._write_batch(conn, batch)
+                        break
+                    except sqlite3.Error as e:
+                        if conn is not None:
+                            conn.close()
+                            conn = None
+                        if attempt == WRITE_ATTEMPTS:
+                            rows = sum(1 for item in batch if item[0] != "flush")
+                            self.dropped += rows
+                            logger.error("Activity log %s: dropped %d rows after %d attempts: %s",
+                                         self.path, rows, attempt, e)
+            finally:
+                for item in batch:
+                    if item[0] == "flush":
+                        item[1].set()
+
+    def _write_batch(self, conn, batch):
+        rows = {}
+        for kind, row in (item for item in batch if item[0] != "flush"):
+            rows.setdefault(kind, []).append(row)
+        with conn:
+            if "activity" in rows:
+                conn.executemany(
+                    f"INSERT INTO activity ({', '.join(ACTIVITY_COLUMNS)}) VALUES ({', '.join('?' * len(ACTIVITY_COLUMNS))})",
+                    rows["activity"])
+            if "runs" in rows:
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO runs ({', '.join(RUN_COLUMNS)}) VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+                    rows["runs"])
+
+    def flush(self, timeout=10):
+        # Blocks until everything queued so far is on disk
+        event = threading.Event()
+        self._ensure_writer()
+        self._queue.put(("flush", event))
+        return event.wait(timeout)
+
+    def log_activity(self, user_data):
+        checklist = user_data.get("checklist", {})
+        self._ensure_writer()
+        self._queue.put(("activity", (
+            _iso(user_data.get("timestamp")), user_data.get("username"), user_data.get("bench_no"),
+            user_data.get("lsd"), user_data.get("base"), user_data.get("matrix"), user_data.get("model"),
+            int(bool(checklist.get("stabilization"))), int(bool(checklist.get("maintenance"))),
+            int(bool(checklist.get("Diagnostics"))), int(bool(checklist.get("preparation"))),
+        )))
+
+    def log_run(self, user_data, test_type, report_name, report_digest, passed, total, summary):
+        # The same user scoring the same report to the same result is logged
+        # once, however many times the page reruns
+        summary = json.dumps(summary, sort_keys=True, default=str)
+        key_parts = [user_data.get("username"), user_data.get("bench_no"), user_data.get("model"),
+                     test_type, report_digest, summary]
+        run_key = hashlib.sha1(json.dumps(key_parts, default=str).encode("utf-8")).hexdigest()
+        self._ensure_writer()
+        self._queue.put(("runs", (
+            run_key, datetime.now().isoformat(sep=" ", timespec="seconds"),
+            user_data.get("username"), user_data.get("bench_no"), user_data.get("lsd"),
+            user_data.get("base"), user_data.get("matrix"), user_data.get("model"),
+            test_type, report_name, int(passed), int(total),
+            json.dumps(user_data.get("checklist", {}), sort_keys=True), summary,
+        )))
+
+    def import_legacy_csv(self, csv_path=LEGACY_CSV):
+        # One-off import of the old appended CSV log into an empty database
+        if not os.path.exists(csv_path):
+            return 0
+        conn = connect(self.path)
+        try:
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM activity)").fetchone()[0]:
+                return 0
+            with open(csv_path, newline="") as f:
+                reader = csv.DictReader(f)
+                truthy = {"true", "1", "yes"}
+                rows = [(
+                    _iso(r.get("Timestamp")), r.get("Username"), r.get("Bench No"), r.get("LSD"),
+                    r.get("Base"), r.get("Matrix"), r.get("Model"),
+                    *[int(str(r.get(h, "")).strip().lower() in truthy) for h in LEGACY_HEADERS[7:]],
+                ) for r in reader]
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO activity ({', '.join(ACTIVITY_COLUMNS)}) VALUES ({', '.join('?' * len(ACTIVITY_COLUMNS))})",
+                    rows)
+            return len(rows)
+        finally:
+            conn.close()
+
+    # Reading
+
+    def has_rows(self, table="activity"):
+        conn = connect(self.path)
+        try:
+            return bool(conn.execute(f"SELECT EXISTS (SELECT 1 FROM {table})").fetchone()[0])
+        finally:
+            conn.close()
+
+    def distinct(self, column, table="activity"):
+        conn = connect(self.path)
+        try:
+            return [r[0] for r in conn.execute(
+                f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column}")]
+        finally:
+            conn.close()
+
+    def iter_csv(self, table="activity", bench_no=None, username=None, model=None, start=None, end=None):
+        # Yields the filtered log as CSV text in chunks of EXPORT_CHUNK rows
+        columns = ACTIVITY_COLUMNS if table == "activity" else RUN_COLUMNS[1:]
+        where, params = [], []
+        for column, value in (("bench_no", bench_no), ("username", username), ("model", model)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if start:
+            where.append("timestamp >= ?")
+            params.append(str(start))
+        if end:
+            # Dates are inclusive: anything before the next day
+            where.append("timestamp < date(?, '+1 day')")
+            params.append(str(end))
+        sql = f"SELECT {', '.join(columns)} FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp"
+
+        conn = connect(self.path)
+        try:
+            cursor = conn.execute(sql, params)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    def export_csv(self, **filters):
+        # The CSV as a binary file for st.download_button, written chunk by
+        # chunk to a temporary file so the whole log is never held as text;
+        # the returned reader keeps the (already unlinked) file alive
+        with tempfile.TemporaryFile() as f:
+            for chunk in self.iter_csv(**filters):
+                f.write(chunk.encode("utf-8"))
+            f.seek(0)
+            return open(os.dup(f.fileno()), "rb")
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    # One log (and one writer thread) per server process
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = ActivityLog()
+            _log.import_legacy_csv()
+            atexit.register(_log.flush)
+    return _log
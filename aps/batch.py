@@ -0,0 +1,190 @@
+# Headless batch scoring of instrument reports.
+#
+#   python -m aps.batch --base Fe --matrix LAS --model "Metavision 10008X_A" \
+#       --test LongTerm reports/*.xlsx --out results/
+#
+# Every report is parsed and scored in a process pool with the same
+# pipeline the pages use. Each report gets the result workbook the page
+# would offer for download, and APS_batch_summary.xlsx collects the
+# per-report counts and per-element verdicts.
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from aps.mapping_store import load_mappings
+from aps.pipeline import (
+    ACCURACY_TEST,
+    TEST_TYPES,
+    ReportError,
+    accuracy_counts,
+    apply_sample_mapping,
+    auto_map_samples,
+    check_set_count,
+    expected_samples,
+    parse_accuracy_report,
+    parse_stability_report,
+    remembered_matches,
+    score_accuracy_report,
+    score_stability_report,
+    stability_counts,
+)
+from aps.report_reader import read_report
+from aps.schema import display_frame
+from aps.stability_stats import stability_statistics
+from aps.thresholds import load_threshold_index
+
+REPORT_PATTERNS = ("*.xlsx", "*.xls", "*.csv", "*.tsv")
+SUMMARY_FILE = "APS_batch_summary.xlsx"
+
+
+def collect_reports(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in REPORT_PATTERNS:
+                paths.extend(glob.glob(os.path.join(item, pattern)))
+        else:
+            paths.extend(glob.glob(item) or [item])
+    # Excel lock files ("~$report.xlsx") are never reports
+    return sorted({p for p in paths if not os.path.basename(p).startswith("~$")})
+
+
+def score_accuracy_file(df_raw, base, matrix, bench_no=""):
+    final_df, found_samples = parse_accuracy_report(df_raw)
+    if final_df is None:
+        raise ReportError("No valid sample data found in uploaded file.")
+
+    expected = [str(s).strip().upper() for s in expected_samples(base, matrix)]
+    imported = final_df["Sample Name"].unique().tolist()
+    mapping, unmapped = auto_map_samples(expected, imported)
+    if bench_no and unmapped:
+        # Mappings operators confirmed on the accuracy page for this bench
+        for name, match in remembered_matches(unmapped, imported, load_mappings(base, matrix, bench_no)).items():
+            mapping[match] = name
+            unmapped.remove(name)
+    final_df = apply_sample_mapping(final_df, mapping)
+    final_df, accuracy_summary, precision_summary = score_accuracy_report(final_df, base, mapping)
+
+    elements = accuracy_summary.merge(precision_summary, on="Elements", how="outer", suffixes=("_Accuracy", "_Precision"))
+    info = {"Samples Found": found_samples, "Samples Expected": len(expected), "Unmapped Samples": len(unmapped)}
+    info.update(accuracy_counts(final_df))
+    return final_df, elements, info
+
+
+def score_stability_file(df_raw, base, model, stab_type):
+    threshold_index = load_threshold_index(model, base)
+    if threshold_index is None:
+        raise ReportError("Matching precision threshold file not found.")
+
+    final_df, set_count = parse_stability_report(df_raw)
+    check_set_count(stab_type, set_count)
+    final_df, element_summary = score_stability_report(final_df, base, threshold_index, stab_type)
+
+    info = {"Sets": set_count}
+    info.update(stability_counts(element_summary))
+    return final_df, element_summary, info
+
+
+def write_result(final_df, test_type, name, out_dir):
+    # The result workbook the page would offer for download, named after the report
+    suffix = "APS_AccuracyPrecision_Result.xlsx" if test_type == ACCURACY_TEST else "APS_Stability_Result.xlsx"
+    result_path = os.path.join(out_dir, f"{os.path.splitext(name)[0]}_{suffix}")
+    with pd.ExcelWriter(result_path, engine="openpyxl") as writer:
+        display_frame(final_df).to_excel(writer, index=False)
+        if test_type != ACCURACY_TEST:
+            stability_statistics(final_df).to_excel(writer, sheet_name="Statistics", index=False)
+    return result_path
+
+
+def process_report(path, base, matrix, model, test_type, out_dir, bench_no=""):
+    # Runs in a worker process; returns plain data only
+    started = time.perf_counter()
+    name = os.path.basename(path)
+    try:
+        df_raw = read_report(path)
+        if test_type == ACCURACY_TEST:
+            final_df, elements, info = score_accuracy_file(df_raw, base, matrix, bench_no)
+        else:
+            final_df, elements, info = score_stability_file(df_raw, base, model, test_type)
+        result_path = write_result(final_df, test_type, name, out_dir)
+
+        info.update({"Report": name, "Status": "OK", "Rows": len(final_df), "Result File": os.path.basename(result_path)})
+        elements.insert(0, "Report", name)
+    except Exception as e:
+        # Any failure is this report's error row, the rest of the batch goes on
+        info = {"Report": name, "Status": f"Error: {e}", "Rows": 0}
+        elements = None
+    info["Seconds"] = round(time.perf_counter() - started, 3)
+    return info, elements
+
+
+def write_summary(out_dir, infos, elements):
+    path = os.path.join(out_dir, SUMMARY_FILE)
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        reports = pd.DataFrame(infos)
+        lead = ["Report", "Status", "Rows", "Seconds"]
+        reports[lead + [c for c in reports.columns if c not in lead]].to_excel(writer, sheet_name="Reports", index=False)
+        if elements:
+            pd.concat(elements, ignore_index=True).to_excel(writer, sheet_name="Elements", index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m aps.batch", description="Score APS instrument reports without the web UI.")
+    parser.add_argument("reports", nargs="+", help="report files, folders or glob patterns")
+    parser.add_argument("--base", required=True)
+    parser.add_argument("--matrix", default="", help="required for the Accuracy test")
+    parser.add_argument("--model", default="", help="required for the stability tests")
+    parser.add_argument("--test", required=True, choices=TEST_TYPES)
+    parser.add_argument("--bench", default="", help="reuse sample mappings confirmed for this bench")
+    parser.add_argument("--out", default="aps_results", help="output folder (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.test == ACCURACY_TEST and not args.matrix:
+        parser.error("--matrix is required for the Accuracy test")
+    if args.test != ACCURACY_TEST and not args.model:
+        parser.error("--model is required for the stability tests")
+
+    paths = collect_reports(args.reports)
+    if not paths:
+        parser.error("no report files found")
+    os.makedirs(args.out, exist_ok=True)
+
+    started = time.perf_counter()
+    infos, elements = [], []
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(paths)))) as pool:
+        futures = {pool.submit(process_report, p, args.base, args.matrix, args.model, args.test, args.out,
+                               args.bench): p for p in paths}
+        for future in as_completed(futures):
+            try:
+                info, element_rows = future.result()
+            except Exception as e:
+                # e.g. a worker process that died
+                info = {"Report": os.path.basename(futures[future]), "Status": f"Error: {e}", "Rows": 0, "Seconds": 0.0}
+                element_rows = None
+            print(f"{info['Status']:<6} {info['Report']} ({info['Seconds']:.2f}s)")
+            infos.append(info)
+            if element_rows is not None:
+                elements.append(element_rows)
+    elapsed = time.perf_counter() - started
+
+    infos.sort(key=lambda i: i["Report"])
+    elements.sort(key=lambda e: e["Report"].iat[0] if len(e) else "")
+    summary_path = write_summary(args.out, infos, elements)
+
+    scored = [i for i in infos if i["Status"] == "OK"]
+    rows = sum(i["Rows"] for i in scored)
+    print(f"\nScored {len(scored)}/{len(infos)} reports ({rows} result rows) in {elapsed:.2f}s")
+    print(f"Throughput: {len(infos) / elapsed:.2f} reports/s, {rows / elapsed:.0f} rows/s")
+    print(f"Summary: {summary_path}")
+    return 0 if len(scored) == len(infos) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
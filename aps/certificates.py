@@ -0,0 +1,225 @@
+# PDF certificates for scored reports, built in the background.
+#
+# Rendering a certificate with every per-element row takes seconds, so it
+# never runs in the page script: jobs go to a small process-wide thread pool
+# and the page polls their status from a fragment. Finished PDFs are kept
+# by result key (LRU, capped by size), so downloading the same result again
+# costs nothing. The logo is decoded and downscaled once per process.
+#
+# Optional dependency: fpdf2. Without it the pages say so and carry on.
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from importlib.util import find_spec
+
+import pandas as pd
+import streamlit as st
+
+from aps.reference_data import REFERENCE_DIR
+
+PDF_AVAILABLE = find_spec("fpdf") is not None
+
+LOGO_FILE = f"{REFERENCE_DIR}/MPA Logo.jpg"
+LOGO_WIDTH_PX = 600
+
+MAX_WORKERS = 2
+MAX_PENDING = 8
+CACHE_BYTES = 64 * 1024 * 1024
+# Failure messages kept for the pages to show, oldest dropped first
+MAX_ERRORS = 64
+
+RESULT_COLORS = {"Pass": (0, 128, 0), "Fail": (192, 0, 0)}
+
+_logo_lock = threading.Lock()
+_logo = {"data": None}
+
+
+def logo_bytes():
+    # The shipped logo is a large JPEG; embed a small copy in every PDF
+    with _logo_lock:
+        if _logo["data"] is None:
+            try:
+                from PIL import Image
+
+                with Image.open(LOGO_FILE) as image:
+                    image = image.convert("RGB")
+                    image.thumbnail((LOGO_WIDTH_PX, LOGO_WIDTH_PX))
+                    buffer = io.BytesIO()
+                    image.save(buffer, format="JPEG", quality=85)
+                    _logo["data"] = buffer.getvalue()
+            except (ImportError, OSError):
+                _logo["data"] = b""
+        return _logo["data"]
+
+
+def _text(value):
+    # Core PDF fonts are latin-1 only; numbers to 4 significant digits
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value is pd.NA:
+        return ""
+    if isinstance(value, float):
+        value = f"{value:.4g}"
+    return str(value).encode("latin-1", "replace").decode("latin-1")
+
+
+def build_certificate(title, context, counts, tables):
+    # context: user form dict; counts: {label: "passed / total"};
+    # tables: [(heading, DataFrame)]
+    from fpdf import FPDF
+    from fpdf.fonts import FontFace
+
+    pdf = FPDF(orientation="landscape", format="A4")
+    pdf.set_auto_page_break(auto=True, margin=12)
+    pdf.add_page()
+
+    logo = logo_bytes()
+    if logo:
+        pdf.image(io.BytesIO(logo), x=pdf.l_margin, y=8, h=16)
+    pdf.set_font("Helvetica", "B", 16)
+    pdf.set_xy(pdf.l_margin + 45, 10)
+    pdf.cell(0, 10, _text(title))
+    pdf.set_font("Helvetica", "", 8)
+    pdf.set_xy(pdf.l_margin + 45, 18)
+    pdf.cell(0, 5, f"Generated {datetime.now():%d-%m-%Y %H:%M}")
+    pdf.set_y(28)
+
+    pdf.set_font("Helvetica", "", 9)
+    fields = [("User", "username"), ("Bench No", "bench_no"), ("Model", "model"), ("Base", "base"),
+              ("Matrix", "matrix"), ("LSD", "lsd")]
+    with pdf.table(col_widths=(30, 60, 30, 60), first_row_as_headings=False, width=180, align="LEFT") as table:
+        for i in range(0, len(fields), 2):
+            row = table.row()
+            for label, key in fields[i:i + 2]:
+                row.cell(label, style=FontFace(emphasis="BOLD"))
+                row.cell(_text(context.get(key)))
+    pdf.ln(3)
+
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.cell(0, 7, "  ".join(f"{label}: {value}" for label, value in counts.items()), new_x="LMARGIN", new_y="NEXT")
+
+    for heading, df in tables:
+        pdf.ln(3)
+        pdf.set_font("Helvetica", "B", 11)
+        pdf.cell(0, 7, _text(heading), new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", "", 7)
+        with pdf.table(first_row_as_headings=True, line_height=4, text_align="LEFT",
+                       headings_style=FontFace(emphasis="BOLD", fill_color=(230, 230, 230))) as table:
+            table.row([_text(c) for c in df.columns])
+            for values in df.itertuples(index=False):
+                row = table.row()
+                for value in values:
+                    color = RESULT_COLORS.get(value) if isinstance(value, str) else None
+                    row.cell(_text(value), style=FontFace(color=color) if color else None)
+
+    return bytes(pdf.output())
+
+
+class CertificateJobs:
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, cache_bytes=CACHE_BYTES,
+                 max_errors=MAX_ERRORS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aps-pdf")
+        self._lock = threading.Lock()
+        self._running = {}
+        self._errors = OrderedDict()
+        self._done = OrderedDict()
+        self._done_size = 0
+        self.max_pending = max_pending
+        self.cache_bytes = cache_bytes
+        self.max_errors = max_errors
+
+    def submit(self, key, fn, *args):
+        # Returns False when the queue is full; a key already running or
+        # done is not submitted again, a failed one is retried
+        with self._lock:
+            if key in self._running or key in self._done:
+                return True
+            if len(self._running) >= self.max_pending:
+                return False
+            self._errors.pop(key, None)
+            self._running[key] = self._pool.submit(self._run, key, fn, *args)
+        return True
+
+    def _run(self, key, fn, *args):
+        try:
+            data = fn(*args)
+        except Exception as e:
+            with self._lock:
+                self._running.pop(key, None)
+                self._errors[key] = f"{type(e).__name__}: {e}"
+                while len(self._errors) > self.max_errors:
+                    self._errors.popitem(last=False)
+            return
+        with self._lock:
+            self._running.pop(key, None)
+            self._done[key] = data
+            self._done_size += len(data)
+            while self._done_size > self.cache_bytes and len(self._done) > 1:
+                _, evicted = self._done.popitem(last=False)
+                self._done_size -= len(evicted)
+
+    def status(self, key):
+        # "done", "running", "failed" or None if never submitted (or evicted)
+        with self._lock:
+            if key in self._done:
+                self._done.move_to_end(key)
+                return "done"
+            if key in self._running:
+                return "running"
+            if key in self._errors:
+                return "failed"
+        return None
+
+    def result(self, key):
+        with self._lock:
+            return self._done.get(key)
+
+    def error(self, key):
+        with self._lock:
+            return self._errors.get(key)
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_jobs():
+    # One pool and cache per server process
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = CertificateJobs()
+    return _jobs
+
+
+def certificate_panel(key, file_stem, title, context, counts, tables):
+    # key identifies the result (e.g. the score stage key); the status is
+    # polled from a fragment so only this panel reruns while a job renders
+    if not PDF_AVAILABLE:
+        st.caption("PDF certificates need the optional fpdf2 package (pip install fpdf2).")
+        return
+
+    jobs = get_jobs()
+    # Offered again after a failure, to retry
+    if jobs.status(key) in (None, "failed") and st.button("📄 Generate PDF certificate",
+                                                          key=f"{file_stem}_pdf_generate"):
+        if not jobs.submit(key, build_certificate, title, context, counts, tables):
+            st.warning("The certificate queue is full, please try again in a moment.")
+
+    @st.fragment(run_every=1.0 if jobs.status(key) == "running" else None)
+    def show_status():
+        status = jobs.status(key)
+        if status == "running":
+            st.info("⏳ Building the certificate...")
+        elif status == "done":
+            if st.session_state.get(f"{file_stem}_pdf_polling"):
+                # Finished while polling: rerun once to stop the timer
+                st.session_state[f"{file_stem}_pdf_polling"] = False
+                st.rerun()
+            st.download_button("📥 Download PDF certificate", data=jobs.result(key), file_name=f"{file_stem}.pdf",
+                               mime="application/pdf", key=f"{file_stem}_pdf_download")
+        elif status == "failed":
+            st.error(f"Certificate failed: {jobs.error(key)}")
+        st.session_state[f"{file_stem}_pdf_polling"] = status == "running"
+
+    show_status()
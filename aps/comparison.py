@@ -0,0 +1,82 @@
+# One stability report scored against every precision table at once.
+#
+# The limits of all T model/base tables are looked up for the report rows
+# once, stacked with the multipliers of both regimes (ShortTerm 1.5x,
+# LongTerm 3x, excluded elements 3x in either) into a (tables, regimes,
+# rows) array, and compared with the row deviations in one broadcast.
+# The per-element roll-up follows summarize_stability, so the column for
+# the bench's own model and the selected stability type matches the
+# regular result.
+#
+# By default the report's own acceptance wins over the table, as in
+# regular scoring; with report_limits=False every limit comes from the
+# tables, which is what tells two models' limits apart.
+import numpy as np
+import pandas as pd
+
+from aps.reference_data import REFERENCE_DIR
+from aps.schema import flag, original
+from aps.scoring import STABILITY_MULTIPLIERS, drop_base_element, stability_multipliers
+from aps.thresholds import load_precision_index, precision_bases, precision_models
+
+REGIMES = list(STABILITY_MULTIPLIERS)
+
+
+def precision_tables(folder=REFERENCE_DIR):
+    # [(model, base, ThresholdIndex)] for every sheet of every precision workbook
+    tables = []
+    for model, path in precision_models(folder).items():
+        for base in precision_bases(path):
+            index = load_precision_index(path, base)
+            if index is not None:
+                tables.append((model, base, index))
+    return tables
+
+
+def comparison_label(model, base, regime):
+    return f"{model} / {base} / {regime}"
+
+
+def limit_stack(df, tables, excluded_elements, report_limits=True):
+    # (tables, regimes, rows) stability limits for the rows of df
+    cv = pd.to_numeric(df["CV"], errors="coerce").to_numpy(dtype=float)
+    elements = df["Elements"].astype(str)
+    limits = np.stack([index.lookup(cv, elements) for _, _, index in tables]) if tables else np.empty((0, len(df)))
+    if report_limits:
+        own = df["S_Limit"].to_numpy(dtype=float, na_value=np.nan)
+        limits = np.where(np.isnan(own), limits, own)
+    multipliers = np.stack([stability_multipliers(elements, regime, excluded_elements) for regime in REGIMES])
+    return limits[:, None, :] * multipliers[None, :, :]
+
+
+def compare_tables(final_df, base, tables, excluded_elements, report_limits=True):
+    # Parsed stability rows -> (element verdict matrix, pass counts per column)
+    df = drop_base_element(final_df, base)
+    limits = limit_stack(df, tables, excluded_elements, report_limits)
+    dev = df["DEV"].to_numpy(dtype=float, na_value=np.nan)
+    # As in summarize_stability, any row that is not a Pass fails its element
+    fails = ~(dev <= limits)
+
+    # Rows without a certified value take no part in the element verdict
+    certified = ~original(df, "Cert. Val.").astype(str).str.contains("-", na=False).to_numpy()
+    codes, elements = pd.factorize(df["Elements"].astype(str).str.upper()[certified], sort=True)
+    members = np.zeros((len(codes), len(elements)))
+    members[np.arange(len(codes)), codes] = 1
+    fail_any = fails[..., certified] @ members > 0
+    missing = (flag(df, "Cert. Val.") == "-").to_numpy()[certified]
+    missing_all = missing @ members == members.sum(axis=0)
+
+    verdicts = np.where(missing_all, "NA", np.where(fail_any, "Fail", "Pass"))
+    columns = [comparison_label(model, table_base, regime) for model, table_base, _ in tables for regime in REGIMES]
+    matrix = pd.DataFrame(verdicts.reshape(len(columns), len(elements)).T, columns=columns)
+    matrix.insert(0, "Elements", elements.str.title())
+
+    passed = (verdicts == "Pass").sum(axis=2).ravel()
+    scored = (verdicts != "NA").sum(axis=2).ravel()
+    counts = pd.DataFrame({
+        "Model": [model for model, _, _ in tables for _ in REGIMES],
+        "Base": [table_base for _, table_base, _ in tables for _ in REGIMES],
+        "Regime": REGIMES * len(tables),
+        "Stability Pass": [f"{p} / {n}" for p, n in zip(passed, scored)],
+    })
+    return matrix, counts
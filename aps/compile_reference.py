@@ -0,0 +1,54 @@
+# Compiles the reference workbooks in Precision_tables/ for fast loading.
+#
+#   python -m aps.compile_reference [--folder Precision_tables] [--force]
+#
+# Run it as a build or start-up step when several server processes share
+# one machine: they then memory-map the same compiled files instead of
+# each parsing the workbooks. Workbooks that are already compiled and
+# unchanged are skipped; a changed workbook is also recompiled by the
+# first process that needs it.
+import argparse
+import os
+import time
+
+from aps.reference_data import (
+    BASE_MATRIX_FILE,
+    MODELS_FILE,
+    REFERENCE_DIR,
+    compile_workbook,
+    read_manifest,
+)
+from aps.thresholds import compile_precision_file, precision_files
+
+
+def compile_all(folder=REFERENCE_DIR, force=False):
+    # Returns [(file, status)] with status "compiled", "up to date" or "failed"
+    jobs = [(os.path.join(folder, os.path.basename(f)), "workbook", compile_workbook)
+            for f in (BASE_MATRIX_FILE, MODELS_FILE)]
+    jobs += [(os.path.join(folder, f), "precision", compile_precision_file) for f in sorted(precision_files(folder))]
+
+    results = []
+    for path, kind, compile_fn in jobs:
+        if not os.path.exists(path):
+            continue
+        if not force and read_manifest(path, kind) is not None:
+            results.append((path, "up to date"))
+            continue
+        results.append((path, "compiled" if compile_fn(path) is not None else "failed"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the reference workbooks for memory-mapped loading.")
+    parser.add_argument("--folder", default=REFERENCE_DIR)
+    parser.add_argument("--force", action="store_true", help="recompile unchanged workbooks too")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    for path, status in compile_all(args.folder, args.force):
+        print(f"{status:<11} {os.path.basename(path)}")
+    print(f"Done in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
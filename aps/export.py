@@ -0,0 +1,156 @@
+# Result export in xlsx, CSV or Parquet, built only when a download is
+# requested and cached by the content hash of the result table.
+#
+# xlsx is written with openpyxl's write-only workbook, which streams rows
+# to a temporary file instead of holding every cell object in memory, and
+# colours the Pass/Fail cells of the *_Result columns. Typed results
+# (aps.schema) are written with their original cell text.
+import hashlib
+import io
+import math
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+from aps.schema import display_frame
+
+FORMATS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Cached exports are evicted oldest-first past this total size
+CACHE_BYTES = 64 * 1024 * 1024
+
+VERDICT_FILLS = {
+    "Pass": PatternFill("solid", start_color="C6EFCE", end_color="C6EFCE"),
+    "Fail": PatternFill("solid", start_color="FFC7CE", end_color="FFC7CE"),
+}
+HEADER_FONT = Font(bold=True)
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_size = [0]
+
+
+def result_digest(df):
+    digest = hashlib.sha1()
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    # Mixed object columns are hashed through their string form
+    hashed = df.astype({c: str for c in df.columns if df[c].dtype == object})
+    digest.update(pd.util.hash_pandas_object(hashed, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _cell_value(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):
+        # numpy scalars
+        value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+    return value
+
+
+def _write_sheet(wb, sheet_name, df):
+    ws = wb.create_sheet(sheet_name)
+
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.font = HEADER_FONT
+        header.append(cell)
+    ws.append(header)
+
+    verdict_cols = {i for i, name in enumerate(df.columns) if str(name).endswith("_Result")}
+    for row in df.itertuples(index=False, name=None):
+        out = []
+        for i, value in enumerate(row):
+            value = _cell_value(value)
+            if i in verdict_cols and value in VERDICT_FILLS:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.fill = VERDICT_FILLS[value]
+                out.append(cell)
+            else:
+                out.append(value)
+        ws.append(out)
+
+
+def write_xlsx(df, sheet_name="Sheet1", extra=()):
+    # extra: (sheet name, frame) pairs written after the result sheet
+    wb = Workbook(write_only=True)
+    _write_sheet(wb, sheet_name, df)
+    for name, table in extra:
+        _write_sheet(wb, name, table)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def write_csv(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def write_parquet(df):
+    # Parquet columns need a single type; mixed object columns
+    # (e.g. "Cert. Val." holding numbers and "-") are written as text
+    mixed = {c: str for c in df.columns
+             if df[c].dtype == object and pd.api.types.infer_dtype(df[c], skipna=True) not in ("string", "empty")}
+    table = df.astype(mixed)
+    for col in mixed:
+        table[col] = table[col].where(df[col].notna(), None)
+    buffer = io.BytesIO()
+    table.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def export_bytes(df, fmt="xlsx", digest=None, extra=()):
+    # digest: an already known content key for df (and extra), skips hashing it.
+    # extra: (sheet name, frame) pairs added to the xlsx workbook only, the
+    # single-table formats carry the result alone
+    key = (digest or result_digest(df) + "".join(result_digest(t) for _, t in extra), fmt)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    if fmt == "xlsx" and extra:
+        data = write_xlsx(display_frame(df), extra=extra)
+    else:
+        data = WRITERS[fmt](display_frame(df))
+
+    with _lock:
+        _cache[key] = data
+        _cache_size[0] += len(data)
+        while _cache_size[0] > CACHE_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_size[0] -= len(evicted)
+    return data
+
+
+def download_result(df, file_stem, key, build=None):
+    # Format picker plus a download button whose file is produced on click.
+    # build(fmt) -> bytes replaces the default export_bytes(df, fmt).
+    fmt = st.radio("Format", list(FORMATS), horizontal=True, key=f"{key}_format")
+    extension, mime = FORMATS[fmt]
+    build = build or (lambda f: export_bytes(df, f))
+    st.download_button(
+        label=f"Download .{extension}",
+        data=lambda: build(fmt),
+        file_name=f"{file_stem}.{extension}",
+        mime=mime,
+        key=f"{key}_download",
+    )
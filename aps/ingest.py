@@ -0,0 +1,367 @@
+# Watch-folder ingestion of instrument reports.
+#
+#   python -m aps.ingest /shared/reports --out aps_ingested --model "Metavision 10008X_A" --bench B1
+#
+# Instruments export reports onto a shared folder; this process polls it
+# and scores every new or changed report with the same pipeline as the
+# pages (see aps.batch), on a process pool. Each report's test type, base
+# and matrix come from its "Sample Name | ..." header rows:
+# - one sample name repeated over 8 / 16 blocks is a ShortTerm / LongTerm
+#   stability run, anything else an Accuracy report;
+# - "Matrix: LAS" names the matrix, and "Base: Fe" or the "Method: FE_LAS"
+#   prefix the base.
+# --base / --matrix fill in what the headers do not say.
+#
+# A file is picked up once its size and mtime are unchanged between two
+# polls (so half-written exports are left alone), then hashed; content
+# already scored under any name is skipped. What was processed is
+# checkpointed in the SQLite database of the activity log, per file (size,
+# mtime, digest) and per content digest (status, verdict counts, result
+# workbook), so a restart carries on where it stopped: only files whose
+# stat changed are hashed again, and reports that were in flight are
+# scored again. Only scored reports count as done: a report that failed
+# is tried again after a restart or once the reference data changes, and
+# one that took its worker process down, or that cannot be read, is tried
+# once more before it is recorded as an error. Results go to --out as the workbooks aps.batch
+# writes, and every scored report is also logged as a run in the activity
+# log.
+import argparse
+import hashlib
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from aps.activity_log import DB_FILE, connect, get_log
+from aps.batch import REPORT_PATTERNS, score_accuracy_file, score_stability_file, write_result
+from aps.pipeline import ACCURACY_TEST, EXPECTED_SETS, ReportError
+from aps.reference_data import load_base_matrix, reference_version
+from aps.report_parser import block_ranges, parse_header
+from aps.report_reader import read_report
+
+POLL_SECONDS = 2.0
+INGEST_USER = "ingest"
+# Reports queued per worker; the rest wait in the folder for the next poll
+QUEUE_PER_WORKER = 4
+# Attempts at a report whose worker process died, or that could not be
+# read, before it is an error
+MAX_ATTEMPTS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ingest_reports (
+    digest TEXT PRIMARY KEY,
+    processed_at TEXT NOT NULL,
+    report TEXT, test_type TEXT, base TEXT, matrix TEXT,
+    status TEXT NOT NULL,
+    passed INTEGER, total INTEGER, result_file TEXT, seconds REAL
+);
+"""
+
+
+def _connect(path):
+    conn = connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _canonical(value, choices):
+    # The known spelling of value, case-insensitively; None if unknown
+    matches = [c for c in choices if str(c).strip().lower() == str(value or "").strip().lower()]
+    return matches[0] if matches else None
+
+
+def identify_report(df_raw, base="", matrix=""):
+    # (test type, base, matrix) from the block headers; base / matrix are
+    # the fallbacks when the headers do not name a known one
+    ranges = block_ranges(df_raw)
+    if not ranges:
+        raise ReportError("No sample blocks found in the report.")
+    headers = [parse_header(str(df_raw.iat[h, 0])) for h, _, _ in ranges]
+
+    samples = {h.get("sample name") for h in headers}
+    test_type = ACCURACY_TEST
+    if len(ranges) > 1 and len(samples) == 1:
+        # Nearest stability type; check_set_count reports a wrong count
+        test_type = min(EXPECTED_SETS, key=lambda t: abs(EXPECTED_SETS[t] - len(ranges)))
+
+    base_matrix = load_base_matrix()
+    bases = [b for b in base_matrix if b != "base"]
+    first = headers[0]
+    named_base = first.get("base") or first.get("method", "").split("_")[0]
+    base = _canonical(named_base, bases) or _canonical(base, bases)
+    if base is None:
+        raise ReportError("The report header does not name a known base; pass --base.")
+    matrices = list(base_matrix[base].columns)
+    matrix = _canonical(first.get("matrix"), matrices) or _canonical(matrix, matrices) or ""
+    return test_type, base, matrix
+
+
+def error_outcome(path, digest, error, seconds=0.0):
+    return {"digest": digest, "report": os.path.basename(path), "path": path, "test_type": None, "base": None,
+            "matrix": None, "status": f"Error: {error}", "passed": None, "total": None, "result_file": None,
+            "seconds": seconds}
+
+
+def ingest_report(path, digest, out_dir, defaults):
+    # Runs in a worker process; returns plain data only
+    started = time.perf_counter()
+    name = os.path.basename(path)
+    outcome = {"digest": digest, "report": name, "path": path, "test_type": None, "base": None, "matrix": None}
+    try:
+        df_raw = read_report(path)
+        test_type, base, matrix = identify_report(df_raw, defaults.get("base"), defaults.get("matrix"))
+        outcome.update(test_type=test_type, base=base, matrix=matrix)
+        if test_type == ACCURACY_TEST:
+            if not matrix:
+                raise ReportError("The report header does not name a known matrix; pass --matrix.")
+            final_df, elements, info = score_accuracy_file(df_raw, base, matrix, defaults.get("bench_no", ""))
+            passed, total = info["accuracy_pass"] + info["precision_pass"], info["accuracy_total"] + info["precision_total"]
+        else:
+            if not defaults.get("model"):
+                raise ReportError("--model is required for the stability tests.")
+            final_df, elements, info = score_stability_file(df_raw, base, defaults["model"], test_type)
+            passed, total = info["stability_pass"], info["stability_total"]
+
+        # Content-named, so a changed report never overwrites an earlier result
+        stem, ext = os.path.splitext(name)
+        result_path = write_result(final_df, test_type, f"{stem}_{digest[:8]}{ext}", out_dir)
+        outcome.update(status="OK", passed=int(passed), total=int(total), result_file=os.path.basename(result_path),
+                       summary={"counts": {k: int(v) for k, v in info.items()},
+                                "elements": elements.to_dict(orient="records")})
+    except Exception as e:
+        # Whatever goes wrong is this report's error, not the ingest process's
+        outcome.update(status=f"Error: {e}", passed=None, total=None, result_file=None)
+    outcome["seconds"] = round(time.perf_counter() - started, 3)
+    return outcome
+
+
+class Ingestor:
+    def __init__(self, watch_dir, out_dir, defaults=None, workers=None, path=DB_FILE):
+        self.watch_dir = watch_dir
+        self.out_dir = out_dir
+        self.defaults = dict(defaults or {})
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.path = path
+        self.stop_event = threading.Event()
+        # path -> (size, mtime_ns) seen on the previous poll
+        self._last_seen = {}
+        self._in_flight = {}
+        # path -> reference version of the files whose report failed
+        self._failed = {}
+        self._version = reference_version()
+        # digest -> times its worker process died on it
+        self._crashes = {}
+        # path -> times it could not be read for hashing
+        self._read_errors = {}
+        self.stats = {"scored": 0, "errors": 0, "duplicates": 0}
+
+        os.makedirs(out_dir, exist_ok=True)
+        conn = _connect(path)
+        try:
+            # Files whose report failed last time are picked up again
+            self._files = {p: (size, mtime) for p, size, mtime in conn.execute(
+                "SELECT f.path, f.size, f.mtime_ns FROM ingest_files f JOIN ingest_reports r ON r.digest = f.digest "
+                "WHERE r.status = 'OK'")}
+            self._done = {d for (d,) in conn.execute("SELECT digest FROM ingest_reports WHERE status = 'OK'")}
+        finally:
+            conn.close()
+
+    def scan(self):
+        # Reports whose stat changed since their checkpoint and held still since the last poll
+        seen = {}
+        for entry in os.scandir(self.watch_dir):
+            if not entry.is_file() or entry.name.startswith("~$"):
+                continue
+            if not any(entry.name.lower().endswith(p[1:]) for p in REPORT_PATTERNS):
+                continue
+            stat = entry.stat()
+            seen[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        ready = [p for p, sig in seen.items()
+                 if self._last_seen.get(p) == sig and self._files.get(p) != sig and p not in self._in_flight]
+        self._last_seen = seen
+        return sorted(ready, key=lambda p: seen[p][1])
+
+    def _checkpoint_file(self, conn, path, digest):
+        size, mtime = self._last_seen[path]
+        conn.execute("INSERT OR REPLACE INTO ingest_files VALUES (?, ?, ?, ?)", (path, size, mtime, digest))
+        self._files[path] = (size, mtime)
+
+    def _record(self, conn, outcome):
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_reports VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (outcome["digest"], datetime.now().isoformat(sep=" ", timespec="seconds"), outcome["report"],
+             outcome["test_type"], outcome["base"], outcome["matrix"], outcome["status"], outcome["passed"],
+             outcome["total"], outcome["result_file"], outcome["seconds"]),
+        )
+        if outcome["status"] == "OK":
+            self._done.add(outcome["digest"])
+            self.stats["scored"] += 1
+            user_data = {"username": INGEST_USER, "bench_no": self.defaults.get("bench_no", ""),
+                         "model": self.defaults.get("model", ""), "base": outcome["base"], "matrix": outcome["matrix"]}
+            get_log().log_run(user_data, outcome["test_type"], outcome["report"], outcome["digest"],
+                              outcome["passed"], outcome["total"], outcome["summary"])
+        else:
+            self.stats["errors"] += 1
+        print(f"{outcome['status'][:60]:<60} {outcome['report']} ({outcome['seconds']:.2f}s)", flush=True)
+
+    def _retry_failed(self):
+        # After a reference data change the failed reports are scored again
+        version = reference_version()
+        if version != self._version:
+            for path in self._failed:
+                self._files.pop(path, None)
+            self._failed.clear()
+            self._version = version
+
+    def run(self, interval=POLL_SECONDS, once=False):
+        # Polls until stop() (or, with once, until the folder is drained)
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        conn = _connect(self.path)
+        backlog = []
+        try:
+            while not self.stop_event.is_set():
+                self._retry_failed()
+                queued = set(backlog)
+                backlog.extend(p for p in self.scan() if p not in queued)
+
+                # Hash and queue up to QUEUE_PER_WORKER reports per worker
+                while backlog and len(self._in_flight) < self.workers * QUEUE_PER_WORKER:
+                    path = backlog.pop(0)
+                    if path not in self._last_seen:
+                        continue
+                    try:
+                        digest = file_digest(path)
+                    except OSError as e:
+                        # Locked by the instrument: tried again on the next poll, then recorded under
+                        # a placeholder digest so the file is checkpointed and --once can finish
+                        self._read_errors[path] = self._read_errors.get(path, 0) + 1
+                        if self._read_errors[path] < MAX_ATTEMPTS:
+                            continue
+                        del self._read_errors[path]
+                        digest = f"unreadable:{path}"
+                        self._record(conn, error_outcome(path, digest, e))
+                        self._failed[path] = self._version
+                        self._checkpoint_file(conn, path, digest)
+                        continue
+                    self._read_errors.pop(path, None)
+                    if digest in self._done:
+                        self.stats["duplicates"] += 1
+                        self._checkpoint_file(conn, path, digest)
+                        continue
+                    if digest in {d for d, _ in self._in_flight.values()}:
+                        # Checked again on the next poll, once the copy in flight has its outcome
+                        continue
+                    try:
+                        future = pool.submit(ingest_report, path, digest, self.out_dir, self.defaults)
+                    except BrokenProcessPool:
+                        pool = self._replace_pool(pool)
+                        future = pool.submit(ingest_report, path, digest, self.out_dir, self.defaults)
+                    self._in_flight[path] = (digest, future)
+                conn.commit()
+
+                finished = [f for _, f in self._in_flight.values() if f.done()]
+                if not finished and self._in_flight:
+                    wait([f for _, f in self._in_flight.values()], timeout=interval, return_when=FIRST_COMPLETED)
+                broken = False
+                for path, (digest, future) in list(self._in_flight.items()):
+                    if not future.done():
+                        continue
+                    del self._in_flight[path]
+                    try:
+                        outcome = future.result()
+                    except BrokenProcessPool as e:
+                        # Every report in flight fails with the worker that died;
+                        # they go back to the folder scan for another attempt
+                        broken = True
+                        self._crashes[digest] = self._crashes.get(digest, 0) + 1
+                        if self._crashes[digest] < MAX_ATTEMPTS:
+                            continue
+                        outcome = error_outcome(path, digest, e)
+                    except Exception as e:
+                        outcome = error_outcome(path, digest, e)
+                    self._crashes.pop(digest, None)
+                    self._record(conn, outcome)
+                    if outcome["status"] == "OK":
+                        self._failed.pop(path, None)
+                    else:
+                        self._failed[path] = self._version
+                    if path in self._last_seen:
+                        self._checkpoint_file(conn, path, digest)
+                conn.commit()
+                if broken:
+                    pool = self._replace_pool(pool)
+
+                if once and not backlog and not self._in_flight and not self.scan_pending():
+                    break
+                if not self._in_flight and not backlog:
+                    self.stop_event.wait(interval)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            conn.close()
+            get_log().flush()
+        return self.stats
+
+    def _replace_pool(self, pool):
+        pool.shutdown(wait=False, cancel_futures=True)
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def scan_pending(self):
+        # Files still to pick up: changed since their checkpoint
+        return any(self._files.get(p) != sig for p, sig in self._last_seen.items())
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m aps.ingest", description="Watch a folder and score new APS reports.")
+    parser.add_argument("folder", help="folder the instruments export reports to")
+    parser.add_argument("--out", default="aps_ingested", help="result folder (default: %(default)s)")
+    parser.add_argument("--model", default="", help="bench model, required for the stability tests")
+    parser.add_argument("--bench", default="", help="bench number; reuses its confirmed sample mappings")
+    parser.add_argument("--base", default="", help="base when a report header does not name one")
+    parser.add_argument("--matrix", default="", help="matrix when a report header does not name one")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="poll interval in seconds (default: %(default)s)")
+    parser.add_argument("--once", action="store_true", help="score what is in the folder, then exit")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        parser.error(f"not a folder: {args.folder}")
+
+    ingestor = Ingestor(args.folder, args.out, {"model": args.model, "bench_no": args.bench, "base": args.base,
+                                                 "matrix": args.matrix}, args.workers)
+    signal.signal(signal.SIGTERM, lambda signum, frame: ingestor.stop())
+    print(f"Watching {args.folder} every {args.interval}s ({ingestor.workers} workers), results in {args.out}", flush=True)
+    started = time.perf_counter()
+    try:
+        stats = ingestor.run(args.interval, args.once)
+    except KeyboardInterrupt:
+        ingestor.stop()
+        stats = ingestor.stats
+    elapsed = time.perf_counter() - started
+    print(f"\nScored {stats['scored']} reports, {stats['errors']} errors, {stats['duplicates']} duplicates "
+          f"in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# Operator-confirmed sample mappings, remembered per base/matrix/bench.
+#
+# Kept in the same SQLite database as the activity log. A remembered
+# mapping is only used for expected samples the fuzzy matcher could not
+# map, so it never overrides an automatic match.
+from datetime import datetime
+
+from aps.activity_log import DB_FILE, connect
+from aps.sample_matcher import normalize_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sample_mappings (
+    base TEXT NOT NULL,
+    matrix TEXT NOT NULL,
+    bench_no TEXT NOT NULL,
+    imported TEXT NOT NULL,
+    expected TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (base, matrix, bench_no, imported)
+);
+"""
+
+
+def _connect(path):
+    conn = connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _key(base, matrix, bench_no):
+    return (str(base or ""), str(matrix or ""), normalize_name(bench_no or ""))
+
+
+def load_mappings(base, matrix, bench_no, path=DB_FILE):
+    # imported name -> expected name
+    conn = _connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT imported, expected FROM sample_mappings WHERE base = ? AND matrix = ? AND bench_no = ?",
+            _key(base, matrix, bench_no))
+        return dict(rows.fetchall())
+    finally:
+        conn.close()
+
+
+def save_mappings(base, matrix, bench_no, mapping, path=DB_FILE):
+    if not mapping:
+        return
+    now = datetime.now().isoformat(sep=" ", timespec="seconds")
+    rows = [(*_key(base, matrix, bench_no), normalize_name(imported), normalize_name(expected), now)
+            for imported, expected in mapping.items()]
+    conn = _connect(path)
+    try:
+        with conn:
+            # One expected sample maps to one imported name per bench
+            conn.executemany(
+                "DELETE FROM sample_mappings WHERE base = ? AND matrix = ? AND bench_no = ? AND expected = ?",
+                [(r[0], r[1], r[2], r[4]) for r in rows])
+            conn.executemany("INSERT OR REPLACE INTO sample_mappings VALUES (?, ?, ?, ?, ?, ?)", rows)
+    finally:
+        conn.close()
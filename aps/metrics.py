@@ -0,0 +1,98 @@
+# Per-run stage instrumentation.
+#
+# Each page run collects one record per stage: wall time, rows produced,
+# peak traced memory and whether the result came from the stage cache
+# (aps.stages). finish() appends the run as one JSON line to METRICS_FILE
+# so runs can be aggregated across sessions, e.g. with
+# pd.read_json("aps_metrics.jsonl", lines=True). Reruns where every stage
+# came from the cache (a widget change further down the page) are not
+# written.
+#
+# Memory is measured with tracemalloc when APS_TRACE_MEMORY=1. Tracing is
+# process wide and slows every allocation of every session while it is on,
+# so it is off by default; with several sessions computing at once a
+# stage's peak also includes the others' allocations.
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+METRICS_FILE = os.environ.get("APS_METRICS_FILE", "aps_metrics.jsonl")
+TRACE_MEMORY = os.environ.get("APS_TRACE_MEMORY", "0") == "1"
+
+_write_lock = threading.Lock()
+
+
+def rows_of(value):
+    # Rows of a stage result: a DataFrame, or the first one in a tuple
+    if isinstance(value, tuple):
+        value = next((v for v in value if isinstance(v, pd.DataFrame)), None)
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+
+def append_metrics(record, path=None):
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        with open(path or METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class RunMetrics:
+    def __init__(self, page, context=None, path=None, trace_memory=TRACE_MEMORY):
+        self.page = page
+        self.context = {k: (context or {}).get(k) for k in ("bench_no", "model", "base", "matrix")}
+        self.path = path
+        self.trace_memory = trace_memory
+        self.started = time.perf_counter()
+        self.timestamp = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self.finished = False
+
+    @contextmanager
+    def stage(self, name):
+        # The body may set record["rows"] and record["cached"]
+        record = {"stage": name, "cached": False, "rows": None}
+        tracing = self.trace_memory
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = round((time.perf_counter() - started) * 1000, 3)
+            record["peak_kb"] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1) if tracing else None
+            self.stages.append(record)
+            if self.finished and not record["cached"]:
+                # e.g. an export built on download, after the run was written
+                append_metrics(self._record([record]), self.path)
+
+    def _record(self, stages):
+        return {
+            "timestamp": self.timestamp,
+            "page": self.page,
+            **self.context,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "stages": stages,
+        }
+
+    def recomputed(self):
+        return any(not record["cached"] for record in self.stages)
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            if self.recomputed():
+                append_metrics(self._record(self.stages), self.path)
+
+    def table(self):
+        return pd.DataFrame(self.stages, columns=["stage", "cached", "rows", "ms", "peak_kb"]).rename(columns={
+            "stage": "Stage", "cached": "Cached", "rows": "Rows", "ms": "Wall (ms)", "peak_kb": "Peak Memory (KiB)",
+        })
@@ -0,0 +1,157 @@
+# Report-to-result flow shared by the Streamlit pages and the batch CLI.
+#
+# The pages keep their own widgets and messages; everything that decides a
+# number or a verdict lives here so the pages and the CLI cannot drift apart.
+import pandas as pd
+
+from aps.reference_data import load_base_matrix, load_excluded_elements
+from aps.report_parser import block_ranges, merge_reports, parse_report
+from aps.sample_matcher import SampleMatcher, normalize_name
+from aps.schema import compact_results, normalize_measurements
+from aps.scoring import (
+    EXPECTED_SETS,
+    clean_elements,
+    drop_base_element,
+    prepare_measurements,
+    score_accuracy_precision,
+    score_stability,
+    summarize_accuracy,
+    summarize_precision,
+    summarize_stability,
+)
+
+ACCURACY_TEST = "Accuracy"
+TEST_TYPES = [ACCURACY_TEST] + list(EXPECTED_SETS)
+
+ACCURACY_COLUMNS = ["Sample Name", "Elements", "Mean", "Cert. Val.", "DEV", "A_Limit", "%DEV_A", "A_Result",
+                    "SD", "P_Limit", "%DEV_P", "P_Result"]
+STABILITY_COLUMNS = ["Set", "Elements", "Mean", "Cert. Val.", "DEV", "S_Limit", "%DEV_S", "S_Result"]
+
+NOT_FOUND = "❌ Not Found"
+
+
+class ReportError(Exception):
+    pass
+
+
+def expected_samples(base, matrix):
+    xls = load_base_matrix()
+    if base in xls and matrix in xls[base].columns:
+        return xls[base][matrix].dropna().tolist()
+    return []
+
+
+def parse_accuracy_report(df_raw):
+    # Returns the stacked blocks with upper-cased sample names and the
+    # number of sample blocks found
+    blocks = block_ranges(df_raw)
+    if not blocks:
+        return None, 0
+    final_df = normalize_measurements(parse_report(df_raw, blocks).drop(columns="Block"))
+    final_df["Sample Name"] = final_df["Sample Name"].astype(str).str.strip().str.upper()
+    return final_df, len(blocks)
+
+
+def auto_map_samples(expected, imported):
+    # imported name -> expected name, plus the expected names left unmapped
+    matcher = SampleMatcher(imported)
+    mapping = {}
+    unmapped = []
+    for name in expected:
+        match = matcher.best_match(name)
+        if match is not None:
+            mapping[match] = name
+        else:
+            unmapped.append(name)
+    return mapping, unmapped
+
+
+def remembered_matches(unmapped, imported, remembered):
+    # expected name -> imported name, from mappings an operator confirmed
+    # earlier (see aps.mapping_store); only names present in this report
+    by_name = {normalize_name(name): name for name in imported}
+    found = {}
+    for stored_imported, stored_expected in remembered.items():
+        if stored_imported in by_name:
+            found.setdefault(stored_expected, by_name[stored_imported])
+    return {name: found[normalize_name(name)] for name in unmapped if normalize_name(name) in found}
+
+
+def apply_sample_mapping(final_df, mapping):
+    final_df = final_df.copy()
+    final_df["Sample Name"] = final_df["Sample Name"].replace(mapping)
+    return final_df
+
+
+def mapping_table(expected, mapping):
+    return pd.DataFrame({
+        "Expected Sample": expected,
+        "Imported Sample": [next((k for k, v in mapping.items() if v == e), NOT_FOUND) for e in expected],
+    })
+
+
+def score_accuracy_report(final_df, base, mapping):
+    # Expects the mapping to have been applied once already for display;
+    # the second pass is kept from the original page flow
+    final_df = apply_sample_mapping(final_df, mapping)
+    final_df["Elements"] = clean_elements(final_df["Elements"])
+    final_df = drop_base_element(final_df, base)
+
+    final_df = prepare_measurements(final_df)
+    # P_Limit is a placeholder until the precision matrix is wired in
+    final_df = score_accuracy_precision(final_df)
+    return compact_results(final_df), summarize_accuracy(final_df), summarize_precision(final_df)
+
+
+def accuracy_counts(final_df):
+    valid_accuracy = final_df[final_df["%DEV_A"].notna()]
+    valid_precision = final_df[final_df["%DEV_P"].notna()]
+    return {
+        "accuracy_pass": int((valid_accuracy["A_Result"] == "Pass").sum()),
+        "accuracy_total": len(valid_accuracy),
+        "precision_pass": int((valid_precision["P_Result"] == "Pass").sum()),
+        "precision_total": len(valid_precision),
+    }
+
+
+def parse_stability_report(df_raw):
+    # Returns the stacked sets and the number of sets found
+    blocks = block_ranges(df_raw)
+    if not blocks:
+        return None, 0
+    final_df = normalize_measurements(parse_report(df_raw, blocks).drop(columns="Sample Name"))
+    final_df.insert(0, "Set", final_df.pop("Block").astype(str))
+    final_df["Elements"] = clean_elements(final_df["Elements"])
+
+    final_df = prepare_measurements(final_df, strip_cert=False)
+    final_df["S_Limit"] = pd.to_numeric(final_df["Acceptance"], errors="coerce")
+    return final_df, len(blocks)
+
+
+def parse_stability_reports(frames):
+    # Several raw sheets (e.g. one file per set) scored as one run; see
+    # merge_reports for de-duplication and set order
+    return parse_stability_report(merge_reports(frames))
+
+
+def check_set_count(stab_type, set_count):
+    expected_sets = EXPECTED_SETS[stab_type]
+    if set_count != expected_sets:
+        raise ReportError(f"{stab_type} Stability requires exactly {expected_sets} sets. Found {set_count}.")
+
+
+def score_stability_report(final_df, base, threshold_index, stab_type):
+    final_df = drop_base_element(final_df, base)
+    final_df = score_stability(final_df, threshold_index, stab_type, load_excluded_elements())
+
+    element_summary = summarize_stability(final_df)
+    final_df["Elements"] = final_df["Elements"].str.capitalize()
+    return compact_results(final_df), element_summary
+
+
+def stability_counts(element_summary):
+    verdicts = element_summary["Stability_Result"]
+    return {
+        "stability_pass": int((verdicts == "Pass").sum()),
+        "stability_total": int(verdicts.isin(["Pass", "Fail"]).sum()),
+    }
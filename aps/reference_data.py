@@ -0,0 +1,244 @@
+# Process-wide registry for the reference workbooks in Precision_tables/.
+#
+# Each workbook is parsed once per server process and shared by every
+# session. Entries are keyed on the file's mtime and size, so replacing a
+# workbook is picked up on the next rerun. A pickled sidecar next to the
+# workbooks lets a cold process skip openpyxl entirely.
+#
+# Compiled reference data (python -m aps.compile_reference) goes further:
+# every sheet is written once to a .compiled folder next to the workbooks,
+# as Arrow (lookup tables) or memory-mapped .npy arrays (precision sheets,
+# see aps.thresholds), with a per-workbook JSON manifest recording the
+# source's mtime and size. Every server process then loads the same files,
+# memory-mapped from the page cache, instead of parsing its own copy. A
+# stale or missing compile is rebuilt on first use.
+#
+# The returned DataFrames are shared: callers must copy before mutating.
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+REFERENCE_DIR = "Precision_tables"
+BASE_MATRIX_FILE = os.path.join(REFERENCE_DIR, "Database_base_matrix.xlsx")
+MODELS_FILE = os.path.join(REFERENCE_DIR, "Database_Models.xlsx")
+EXCLUDED_ELEMENTS_FILE = os.path.join(REFERENCE_DIR, "Exluded_Elements.txt")
+SIDECAR_DIR = os.path.join(REFERENCE_DIR, ".cache")
+COMPILED_SUBDIR = ".compiled"
+COMPILED_DIR = os.path.join(REFERENCE_DIR, COMPILED_SUBDIR)
+COMPILED_FORMAT = 1
+
+# Set APS_REFERENCE_SIDECAR=0 to keep the cache in memory only
+USE_SIDECAR = os.environ.get("APS_REFERENCE_SIDECAR", "1") != "0"
+# Set APS_REFERENCE_COMPILED=0 to always parse the workbooks
+USE_COMPILED = os.environ.get("APS_REFERENCE_COMPILED", "1") != "0"
+
+_lock = threading.Lock()
+_workbooks = {}
+_excluded = {"signature": None, "elements": []}
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _sidecar_path(path, options):
+    digest = hashlib.sha1(options.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(SIDECAR_DIR, f"{os.path.basename(path)}.{digest}.pkl")
+
+
+def _read_sidecar(sidecar, signature):
+    try:
+        with open(sidecar, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if cached.get("signature") != signature:
+        return None
+    return cached.get("sheets")
+
+
+def _write_sidecar(sidecar, signature, sheets):
+    # Best effort: a read-only deployment simply keeps the in-memory cache
+    try:
+        os.makedirs(SIDECAR_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=SIDECAR_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"signature": signature, "sheets": sheets}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, sidecar)
+    except OSError:
+        pass
+
+
+# Compiled reference data
+
+def compiled_dir(path):
+    # Compiled files live next to their source workbook
+    return os.path.join(os.path.dirname(path), COMPILED_SUBDIR)
+
+
+def _manifest_path(path, folder):
+    return os.path.join(folder, f"{os.path.basename(path)}.json")
+
+
+def read_manifest(path, kind, folder=None):
+    # Manifest of a compiled source workbook, None if missing or stale
+    folder = folder or compiled_dir(path)
+    try:
+        with open(_manifest_path(path, folder)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get("format") != COMPILED_FORMAT or manifest.get("kind") != kind
+            or manifest.get("signature") != list(file_signature(path))):
+        return None
+    return manifest
+
+
+def write_compiled(path, kind, write_sheets, folder=None):
+    # write_sheets(data_dir) writes the sheet files and returns the manifest's
+    # "sheets" entry. Files go to a directory named after the source
+    # signature and the manifest is replaced last, so a reader only ever
+    # sees a complete compile. Returns the manifest, or None if the folder
+    # is not writable.
+    folder = folder or compiled_dir(path)
+    signature = list(file_signature(path))
+    tag = hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[:12]
+    name = f"{os.path.basename(path)}.{tag}"
+    data_dir = os.path.join(folder, name)
+    staging = None
+    try:
+        os.makedirs(folder, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=folder, prefix=".tmp-")
+        sheets = write_sheets(staging)
+        shutil.rmtree(data_dir, ignore_errors=True)
+        os.replace(staging, data_dir)
+
+        manifest = {"format": COMPILED_FORMAT, "kind": kind, "source": os.path.basename(path),
+                    "signature": signature, "dir": name, "sheets": sheets}
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, _manifest_path(path, folder))
+    except OSError:
+        return None
+    finally:
+        # A failed write (disk full, a sheet Arrow cannot type) leaves no
+        # half-written staging directory behind; once moved it is gone
+        if staging is not None and os.path.isdir(staging):
+            shutil.rmtree(staging, ignore_errors=True)
+
+    # Earlier compiles of this workbook; processes still mapping them keep
+    # their open files (and on Windows the delete simply fails)
+    prefix = os.path.basename(path) + "."
+    for entry in os.listdir(folder):
+        if entry.startswith(prefix) and entry != name and os.path.isdir(os.path.join(folder, entry)):
+            shutil.rmtree(os.path.join(folder, entry), ignore_errors=True)
+    return manifest
+
+
+def _json_label(label):
+    return label if isinstance(label, (str, int, float)) and not isinstance(label, bool) else None
+
+
+def compile_workbook(path, folder=None):
+    # Every sheet as an Arrow file; original column labels (ints included)
+    # are kept in the manifest
+    sheets = pd.read_excel(path, sheet_name=None)
+    for df in sheets.values():
+        if any(_json_label(c) is None for c in df.columns):
+            return None
+
+    def write_sheets(data_dir):
+        entries = []
+        for i, (sheet, df) in enumerate(sheets.items()):
+            file = f"sheet{i}.arrow"
+            table = df.set_axis([str(c) for c in df.columns], axis=1)
+            feather.write_feather(table, os.path.join(data_dir, file), compression="uncompressed")
+            entries.append({"name": sheet, "file": file, "columns": list(df.columns)})
+        return entries
+
+    try:
+        return write_compiled(path, "workbook", write_sheets, folder)
+    except (pa.ArrowException, ValueError, TypeError):
+        # Columns Arrow cannot type (mixed objects) stay on the parsed path
+        return None
+
+
+def load_compiled_workbook(path, folder=None):
+    # Sheets from the compiled Arrow files, compiling first if needed
+    folder = folder or compiled_dir(path)
+    manifest = read_manifest(path, "workbook", folder) or compile_workbook(path, folder)
+    if manifest is None:
+        return None
+    data_dir = os.path.join(folder, manifest["dir"])
+    sheets = {}
+    for entry in manifest["sheets"]:
+        df = feather.read_feather(os.path.join(data_dir, entry["file"]), memory_map=True)
+        sheets[entry["name"]] = df.set_axis(pd.Index(entry["columns"]) if entry["columns"] else pd.RangeIndex(0), axis=1)
+    return sheets
+
+
+def load_workbook(path, **read_kwargs):
+    # Same result as pd.read_excel(path, sheet_name=None, **read_kwargs)
+    options = repr(sorted(read_kwargs.items()))
+    key = (os.path.abspath(path), options)
+    signature = file_signature(path)
+
+    with _lock:
+        cached = _workbooks.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    sheets = None
+    if USE_COMPILED and not read_kwargs:
+        sheets = load_compiled_workbook(path)
+    if sheets is None and USE_SIDECAR:
+        sheets = _read_sidecar(_sidecar_path(path, options), signature)
+    if sheets is None:
+        sheets = pd.read_excel(path, sheet_name=None, **read_kwargs)
+        if USE_SIDECAR:
+            _write_sidecar(_sidecar_path(path, options), signature, sheets)
+
+    with _lock:
+        _workbooks[key] = (signature, sheets)
+    return sheets
+
+
+def load_base_matrix():
+    return load_workbook(BASE_MATRIX_FILE)
+
+
+def load_models():
+    return load_workbook(MODELS_FILE)
+
+
+def load_excluded_elements():
+    # Comma separated element symbols, upper-cased
+    signature = file_signature(EXCLUDED_ELEMENTS_FILE)
+    with _lock:
+        if _excluded["signature"] != signature:
+            with open(EXCLUDED_ELEMENTS_FILE, "r") as f:
+                _excluded["elements"] = [e.strip().upper() for e in f.read().split(",") if e.strip()]
+            _excluded["signature"] = signature
+        return list(_excluded["elements"])
+
+
+def reference_version(folder=REFERENCE_DIR):
+    # Changes whenever any reference workbook or list in the folder changes
+    return sorted((name, *file_signature(os.path.join(folder, name)))
+                  for name in os.listdir(folder) if name.endswith((".xlsx", ".txt")))
+
+
+def clear_cache():
+    with _lock:
+        _workbooks.clear()
+        _excluded["signature"] = None
@@ -0,0 +1,134 @@
+# Shared parser for instrument report sheets.
+#
+# A report is a single sheet read with header=None: each sample block starts
+# with a "Sample Name | ..." row in column 0, followed by the column header
+# row and the data rows, and ends at the first completely empty row.
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Header keys that carry a set number, e.g. "Set: 3" or "Set No.: 3"
+SET_KEYS = ("set", "set no", "set no.", "set number")
+
+
+def find_header_rows(df_raw):
+    col0 = df_raw.iloc[:, 0]
+    if not (pd.api.types.is_object_dtype(col0) or pd.api.types.is_string_dtype(col0)):
+        return np.array([], dtype=np.intp)
+    # Non-string cells come back as NaN from .str and are treated as no match
+    return np.flatnonzero(col0.str.contains("Sample Name", regex=False, na=False).to_numpy(dtype=bool))
+
+
+def find_blank_rows(df_raw):
+    return np.flatnonzero(df_raw.isna().to_numpy().all(axis=1))
+
+
+def parse_header(text):
+    # "Key: value | Key: value | ..." -> {"key": "value"}. Values keep any
+    # further colons ("Time: 14:35:10"); the sample name is cut at the next
+    # one, as sample_name_from_header does
+    fields = {}
+    for part in text.split("|"):
+        if ":" in part:
+            key, value = part.split(":", 1)
+            key = key.strip().lower()
+            fields.setdefault(key, value.split(":")[0].strip() if "sample name" in key else value.strip())
+    return fields
+
+
+def sample_name_from_header(text, block_no):
+    parts = text.split("|")
+    return next((p.split(":")[1].strip() for p in parts if "sample name" in p.lower()), f"Sample_{block_no}")
+
+
+def block_ranges(df_raw):
+    # Returns (header_row, data_start, data_end) for every block, following
+    # the same walk as the original row loop: a "Sample Name" row that falls
+    # inside a block being consumed is treated as data, not as a new header.
+    n = len(df_raw)
+    headers = find_header_rows(df_raw)
+    blanks = find_blank_rows(df_raw)
+
+    ranges = []
+    pos = 0
+    for h in headers:
+        if h < pos or h + 1 >= n:
+            continue
+        start = h + 2
+        k = np.searchsorted(blanks, start, side="left")
+        end = int(blanks[k]) if k < len(blanks) else n
+        ranges.append((int(h), start, end))
+        pos = end
+    return ranges
+
+
+def parse_report(df_raw, ranges=None):
+    # One long-format DataFrame with every block stacked. Columns are the
+    # report's own headers plus "Sample Name" and "Block" (1-based order of
+    # the block in the sheet).
+    if ranges is None:
+        ranges = block_ranges(df_raw)
+
+    blocks = []
+    for block_no, (h, start, end) in enumerate(ranges, start=1):
+        headers = df_raw.iloc[h + 1].tolist()
+        df_block = df_raw.iloc[start:end].set_axis(headers, axis=1).reset_index(drop=True).infer_objects()
+        df_block["Sample Name"] = sample_name_from_header(df_raw.iat[h, 0], block_no)
+        df_block["Block"] = block_no
+        blocks.append(df_block)
+
+    if not blocks:
+        return pd.DataFrame(columns=["Sample Name", "Block"])
+    return pd.concat(blocks, ignore_index=True)
+
+
+def block_headers(df_raw):
+    # Parsed "Key: value" fields of every block header, in block order.
+    return [parse_header(df_raw.iat[h, 0]) for h, _, _ in block_ranges(df_raw)]
+
+
+def block_order_key(header):
+    # (set number, timestamp) of a parsed block header; None where absent
+    set_no = next((header[k] for k in SET_KEYS if k in header), None)
+    set_no = pd.to_numeric(set_no, errors="coerce") if set_no is not None else None
+    when = " ".join(header[k] for k in ("date", "time") if k in header)
+    when = pd.to_datetime(when, errors="coerce") if when else None
+    return (None if pd.isna(set_no) else float(set_no)), (None if pd.isna(when) else when)
+
+
+def merge_reports(frames):
+    # Stacks the blocks of several raw sheets into one raw sheet:
+    # blocks whose rows were already seen (the same set exported twice) are
+    # dropped, and the rest are ordered by set number if every block header
+    # has one, else by date/time if every block has one, else kept in
+    # upload order. A single sheet is returned as it is.
+    if len(frames) == 1:
+        return frames[0]
+
+    blocks = []
+    seen = set()
+    for df_raw in frames:
+        for h, _, end in block_ranges(df_raw):
+            rows = df_raw.iloc[h:end]
+            digest = hashlib.sha1(rows.to_csv(header=False, index=False).encode("utf-8")).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            blocks.append((block_order_key(parse_header(df_raw.iat[h, 0])), rows))
+
+    set_numbers = [key[0] for key, _ in blocks]
+    timestamps = [key[1] for key, _ in blocks]
+    if blocks and all(n is not None for n in set_numbers):
+        blocks = [b for _, b in sorted(zip(set_numbers, blocks), key=lambda pair: pair[0])]
+    elif blocks and all(t is not None for t in timestamps):
+        blocks = [b for _, b in sorted(zip(timestamps, blocks), key=lambda pair: pair[0])]
+
+    # A blank row after every block ends it, whatever followed it before
+    pieces = []
+    for _, rows in blocks:
+        pieces.append(rows.reset_index(drop=True))
+        pieces.append(pd.DataFrame([[np.nan] * rows.shape[1]], columns=rows.columns))
+    if not pieces:
+        return pd.DataFrame()
+    return pd.concat(pieces, ignore_index=True)
@@ -0,0 +1,128 @@
+# Reads an uploaded instrument report into the raw header-less sheet the
+# parsers expect, i.e. the same frame as pd.read_excel(file, header=None).
+#
+# The format is detected from the file content, not the extension:
+#   xlsx  zip container        -> calamine if installed, else openpyxl
+#   xls   OLE2 compound file   -> calamine if installed, else xlrd
+#   text  CSV / TSV export     -> delimiter sniffed, blank separator rows kept
+# If the preferred engine fails on a file the next one is tried.
+import csv
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+
+UPLOAD_TYPES = ["xlsx", "xls", "csv", "tsv", "txt"]
+
+TEXT_ENCODINGS = ("utf-8-sig", "cp1252")
+
+
+def _available(module):
+    return find_spec(module) is not None
+
+
+def excel_engines(kind):
+    # Fastest first; only engines whose package is installed
+    if kind == "xlsx":
+        candidates = [("calamine", "python_calamine"), ("openpyxl", "openpyxl")]
+    else:
+        candidates = [("calamine", "python_calamine"), ("xlrd", "xlrd")]
+    return [engine for engine, module in candidates if _available(module)]
+
+
+def _read_bytes(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    data = source.read()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return data
+
+
+def detect_format(data):
+    if data.startswith(XLSX_MAGIC):
+        return "xlsx"
+    if data.startswith(XLS_MAGIC):
+        return "xls"
+    return "text"
+
+
+def read_excel_bytes(data, kind, engine=None):
+    engines = [engine] if engine else excel_engines(kind)
+    if not engines:
+        raise ValueError(f"No Excel engine installed for .{kind} files.")
+    error = None
+    for name in engines:
+        try:
+            return pd.read_excel(io.BytesIO(data), header=None, engine=name)
+        except Exception as e:  # engine-specific parse errors; try the next one
+            error = e
+    raise error
+
+
+def _decode(data):
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def read_text_bytes(data):
+    # Rows keep their blank separators. Like the Excel readers, numbers are
+    # typed per cell, so "0.12" -> 0.12 while "<0.001" and "-" stay text
+    text = _decode(data)
+    sample = text[:64 * 1024]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel_tab if "\t" in sample else csv.excel
+    rows = list(csv.reader(io.StringIO(text), dialect))
+
+    # Trailing blank lines carry nothing, like trailing empty sheet rows
+    while rows and not any(cell.strip() for cell in rows[-1]):
+        rows.pop()
+    if not rows:
+        return pd.DataFrame()
+    frame = pd.DataFrame(rows, dtype=object).fillna("")
+    frame = frame.where(frame.apply(lambda col: col.str.strip() != ""), np.nan)
+    for col in frame.columns:
+        numbers = pd.to_numeric(frame[col], errors="coerce")
+        frame[col] = numbers.astype(object).where(numbers.notna(), frame[col])
+    return frame.infer_objects()
+
+
+def read_report(source, engine=None):
+    # source: path, bytes or file-like (e.g. a Streamlit UploadedFile)
+    data = source if isinstance(source, bytes) else _read_bytes(source)
+    kind = detect_format(data)
+    if kind == "text":
+        return read_text_bytes(data)
+    return read_excel_bytes(data, kind, engine)
+
+
+def read_reports(sources, max_workers=None, engine=None):
+    # Reads several reports concurrently. Identical files (by content hash)
+    # are read once; returns [(digest, df_raw)] in first-seen order.
+    unique = {}
+    for source in sources:
+        data = source if isinstance(source, bytes) else _read_bytes(source)
+        unique.setdefault(hashlib.sha1(data).hexdigest(), data)
+    if len(unique) <= 1:
+        return [(digest, read_report(data, engine)) for digest, data in unique.items()]
+
+    workers = max_workers or min(len(unique), (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aps-read") as pool:
+        frames = list(pool.map(lambda data: read_report(data, engine), unique.values()))
+    return list(zip(unique, frames))
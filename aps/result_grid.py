@@ -0,0 +1,97 @@
+# Server-side result viewer: filter, sort and page the scored rows in
+# pandas and send only the visible page to the browser.
+#
+# A ResultGrid is built once per result (cache it in the stage cache). It
+# precomputes the failure mask, integer codes for the element and
+# sample/set columns and one ordering per sortable column, so filtering
+# and sorting a rerun is a few numpy operations whatever the report size.
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from aps.schema import display_frame
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def _codes(values):
+    # Integer codes and labels, categoricals without recomputing
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), list(values.cat.categories)
+    codes, labels = pd.factorize(values, sort=True)
+    return codes, list(labels)
+
+
+class ResultGrid:
+    def __init__(self, df, columns, verdict_columns, group_column, sort_columns):
+        self.df = df
+        self.columns = columns
+        self.group_column = group_column
+        self.sort_columns = sort_columns
+
+        self.failing = np.zeros(len(df), dtype=bool)
+        for col in verdict_columns:
+            self.failing |= (df[col] == "Fail").to_numpy()
+        self.element_codes, self.elements = _codes(df["Elements"])
+        self.group_codes, self.groups = _codes(df[group_column])
+
+        # Stable orderings, rows without a value last in both directions
+        self.orders = {}
+        for col in sort_columns:
+            values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            self.orders[(col, True)] = np.argsort(values, kind="stable")
+            self.orders[(col, False)] = np.argsort(-values, kind="stable")
+
+    def select(self, failing_only=False, element=None, group=None, sort=None, ascending=False):
+        # Row positions passing the filters, in display order
+        mask = np.ones(len(self.df), dtype=bool)
+        if failing_only:
+            mask &= self.failing
+        if element is not None:
+            mask &= self.element_codes == self.elements.index(element)
+        if group is not None:
+            mask &= self.group_codes == self.groups.index(group)
+        order = self.orders[(sort, ascending)] if sort else np.arange(len(self.df))
+        return order[mask[order]]
+
+    def page(self, rows, page_no, page_size):
+        start = (page_no - 1) * page_size
+        return display_frame(self.df.iloc[rows[start:start + page_size]], self.columns)
+
+
+def result_grid(grid, key, group_label):
+    # Filter / sort / page widgets and the visible page
+    col1, col2, col3, col4 = st.columns(4)
+    failing_only = col1.checkbox("Only failing rows", key=f"{key}_failing")
+    element = col2.selectbox("Element", ["All"] + grid.elements, key=f"{key}_element")
+    group = col3.selectbox(group_label, ["All"] + grid.groups, key=f"{key}_group")
+    sort_options = ["Report order"] + [f"{c} {d}" for c in grid.sort_columns for d in ("↓", "↑")]
+    sort_choice = col4.selectbox("Sort", sort_options, key=f"{key}_sort")
+
+    sort, ascending = None, False
+    if sort_choice != "Report order":
+        sort, direction = sort_choice.rsplit(" ", 1)
+        ascending = direction == "↑"
+
+    rows = grid.select(failing_only, None if element == "All" else element, None if group == "All" else group,
+                       sort, ascending)
+
+    # Back to the first page whenever the filters change
+    signature = (failing_only, element, group, sort_choice)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_page"] = 1
+
+    col5, col6, col7 = st.columns([1, 1, 2])
+    page_size = col5.selectbox("Rows per page", PAGE_SIZES, index=2, key=f"{key}_page_size")
+    pages = max(1, math.ceil(len(rows) / page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page_no = col6.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+
+    start = (page_no - 1) * page_size
+    col7.caption(f"Rows {min(start + 1, len(rows))}–{min(start + page_size, len(rows))} of {len(rows)} "
+                 f"({len(grid.df)} in the report)")
+    st.dataframe(grid.page(rows, page_no, page_size), hide_index=True)
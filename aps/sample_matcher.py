@@ -0,0 +1,67 @@
+# Fuzzy matching of expected sample names against the names in a report.
+#
+# Gives the same answer as difflib.get_close_matches(query, names, n=1,
+# cutoff=cutoff) but only runs SequenceMatcher on names that can still reach
+# the cutoff. Two strings with ratio >= c share at least
+# (1.5 * c - 1) * (len(a) + len(b)) - 1 character bigrams (each matching
+# block of length L contributes L - 1 bigrams, and the number of blocks is
+# bounded by the unmatched characters), so a bigram index over the names
+# rules out most candidates without scoring them.
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+import numpy as np
+
+DEFAULT_CUTOFF = 0.9
+
+
+def normalize_name(name):
+    return re.sub(r"\s+", " ", str(name).strip().upper())
+
+
+def bigrams(text):
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+class SampleMatcher:
+    def __init__(self, names):
+        self.names = list(names)
+        self.lengths = np.array([len(n) for n in self.names], dtype=np.int64)
+        postings = defaultdict(lambda: ([], []))
+        for i, name in enumerate(self.names):
+            for gram, count in bigrams(name).items():
+                postings[gram][0].append(i)
+                postings[gram][1].append(count)
+        self.postings = {g: (np.array(ix, dtype=np.int64), np.array(c, dtype=np.int64)) for g, (ix, c) in postings.items()}
+
+    def candidates(self, query, cutoff=DEFAULT_CUTOFF):
+        # Indexes of names that pass the length and shared-bigram bounds
+        shared = np.zeros(len(self.names), dtype=np.int64)
+        for gram, count in bigrams(query).items():
+            if gram in self.postings:
+                ix, counts = self.postings[gram]
+                shared[ix] += np.minimum(counts, count)
+
+        q_len = len(query)
+        total = q_len + self.lengths
+        # real_quick_ratio bound (difflib scores two empty strings 1.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            length_ok = (total == 0) | (2.0 * np.minimum(q_len, self.lengths) / total >= cutoff)
+        bigram_ok = shared >= np.floor((1.5 * cutoff - 1) * total) - 1
+        return np.flatnonzero(length_ok & bigram_ok)
+
+    def best_match(self, query, cutoff=DEFAULT_CUTOFF):
+        # Same tie-break as get_close_matches: highest ratio, then the
+        # lexically greatest name
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        best = None
+        for i in self.candidates(query, cutoff):
+            name = self.names[i]
+            matcher.set_seq1(name)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff and (best is None or (score, name) > best):
+                    best = (score, name)
+        return best[1] if best else None
@@ -0,0 +1,80 @@
+# Typed column layout for parsed and scored reports.
+#
+# Instrument columns mix numbers with text ("<0.001", ">5", "-"). At parse
+# time each measurement column becomes float64, and the text it held moves
+# to a categorical "<column> Flag" column (NaN where the cell was numeric),
+# so every comparison runs on floats and the original cell can still be
+# told apart. Scored results keep elements, samples, sets and verdicts as
+# categoricals. display_frame() turns a typed frame back into the columns
+# the pages have always shown; call it only when rendering or exporting.
+import numpy as np
+import pandas as pd
+
+FLAG_SUFFIX = " Flag"
+VERDICTS = pd.CategoricalDtype(["Pass", "Fail", "NA"])
+CATEGORY_COLUMNS = ("Sample Name", "Elements", "Set")
+VERDICT_COLUMNS = ("A_Result", "P_Result", "S_Result")
+
+
+def measurement_columns(df):
+    return [c for c in df.columns if c in ("Mean", "SD", "Cert. Val.")
+            or (str(c).startswith("Acceptance") and not str(c).endswith(FLAG_SUFFIX))]
+
+
+def split_numeric(values):
+    # float64 values, and the non-numeric cells as a categorical flag
+    numbers = pd.to_numeric(values, errors="coerce").astype("float64")
+    text = values.where(numbers.isna() & values.notna())
+    flags = text.astype(str).where(text.notna()).astype("category")
+    return numbers, flags
+
+
+def normalize_measurements(df):
+    df = df.copy()
+    for col in measurement_columns(df):
+        if str(df[col].dtype) == "float64" or f"{col}{FLAG_SUFFIX}" in df.columns:
+            continue
+        numbers, flags = split_numeric(df[col])
+        df[col] = numbers
+        df[f"{col}{FLAG_SUFFIX}"] = flags
+    return df
+
+
+def flag(df, col):
+    # Text originally in col as a plain Series (NaN where numeric)
+    name = f"{col}{FLAG_SUFFIX}"
+    if name in df.columns:
+        return df[name].astype(object)
+    return pd.Series(np.nan, index=df.index, dtype=object)
+
+
+def original(df, col):
+    # The cell as the report had it: its text, else its number
+    return flag(df, col).where(flag(df, col).notna(), df[col].astype(object))
+
+
+def compact_results(df):
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in VERDICT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(VERDICTS)
+    return df
+
+
+def display_frame(df, columns=None):
+    # Object columns with the original text restored, in the given order
+    # (default: every column except the flags)
+    if columns is None:
+        columns = [c for c in df.columns if not str(c).endswith(FLAG_SUFFIX)]
+    out = {}
+    for col in columns:
+        if f"{col}{FLAG_SUFFIX}" in df.columns:
+            out[col] = original(df, col)
+        elif isinstance(df[col].dtype, pd.CategoricalDtype):
+            out[col] = df[col].astype(object)
+        else:
+            out[col] = df[col]
+    return pd.DataFrame(out, index=df.index)
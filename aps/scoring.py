@@ -0,0 +1,135 @@
+# Column-wise scoring shared by the accuracy/precision and stability pages.
+#
+# Verdicts are "Pass", "Fail" or "NA" with the same rules the pages have
+# always used; everything here works on whole columns and grouped
+# aggregations rather than per-row apply calls.
+import numpy as np
+import pandas as pd
+
+from aps.schema import FLAG_SUFFIX, flag, normalize_measurements, original
+
+STABILITY_MULTIPLIERS = {"ShortTerm": 1.5, "LongTerm": 3}
+EXPECTED_SETS = {"ShortTerm": 8, "LongTerm": 16}
+EXCLUDED_MULTIPLIER = 3
+PRECISION_FACTOR = 0.05
+
+
+def clean_elements(elements):
+    # "Mn (%)" -> "Mn"
+    return elements.str.replace(" (%)", "", regex=False).str.strip().str.capitalize()
+
+
+def drop_base_element(df, base):
+    return df[df["Elements"].str.capitalize() != base.strip().capitalize()]
+
+
+def merge_acceptance(df):
+    # Acceptance (2s) / (3s) columns are brought back to one sigma and merged
+    acceptance = pd.Series(np.nan, index=df.index)
+    for col in [c for c in df.columns if str(c).startswith("Acceptance") and not str(c).endswith(FLAG_SUFFIX)]:
+        temp = pd.to_numeric(df[col].replace("-", np.nan), errors="coerce")
+        if "2s" in col:
+            temp = temp / 2
+        elif "3s" in col:
+            temp = temp / 3
+        acceptance = acceptance.combine_first(temp)
+    return acceptance
+
+
+def prepare_measurements(df, strip_cert=True):
+    # Drops censored means ("<0.001", ">5") and adds CV, CertValNum, DEV and
+    # Acceptance. The accuracy page compares the stripped certified value
+    # with "-", the stability page compares it as-is. Works on the typed
+    # columns of aps.schema; the text cells are in the flag columns.
+    df = normalize_measurements(df)
+    df = df[~flag(df, "Mean").astype(str).str.contains("<|>")].copy()
+
+    cert_text = flag(df, "Cert. Val.")
+    no_cert = (cert_text.astype(str).str.strip() if strip_cert else cert_text) == "-"
+    df["CV"] = df["Mean"].where(no_cert, df["Cert. Val."])
+    # A missing SD stays NaN here; precision scoring counts it as 0
+    df["SD"] = pd.to_numeric(df["SD"], errors="coerce")
+    df["CertValNum"] = df["Cert. Val."].astype("float64")
+    df["DEV"] = (df["CertValNum"] - df["Mean"]).abs()
+    df["Acceptance"] = merge_acceptance(df)
+    return df
+
+
+def _verdicts(value, limit):
+    # Pass when both sides are present and value <= limit, else Fail
+    passed = value.notna() & limit.notna() & (value <= limit)
+    return pd.Series(np.where(passed, "Pass", "Fail"), index=value.index, dtype=object)
+
+
+def score_accuracy_precision(df):
+    df["SD"] = df["SD"].fillna(0)
+    df["A_Limit"] = pd.to_numeric(df["Acceptance"], errors="coerce")
+    df["P_Limit"] = df["CV"].astype(float) * PRECISION_FACTOR
+
+    df["A_Result"] = _verdicts(df["DEV"], df["A_Limit"])
+    df["P_Result"] = _verdicts(df["SD"], df["P_Limit"])
+    df["%DEV_A"] = ((df["DEV"] / df["A_Limit"]) * 100).round(2)
+    df["%DEV_P"] = ((df["SD"] / df["P_Limit"]) * 100).round(2)
+
+    df.loc[df["%DEV_A"].isna(), "A_Result"] = "NA"
+    df.loc[df["%DEV_P"].isna(), "P_Result"] = "NA"
+    return df
+
+
+def _rollup(df, result_col, missing_col, label):
+    # Per element: NA when every row is marked missing or no row has a
+    # verdict, Pass when every verdict passes, Fail otherwise. Sample_Count
+    # is the number of rows with a verdict.
+    flags = pd.DataFrame({
+        "missing": flag(df, missing_col) == "-",
+        "valid": df[result_col] != "NA",
+        "fail": df[result_col] == "Fail",
+    })
+    agg = flags.groupby(df["Elements"]).agg(missing=("missing", "all"), valid=("valid", "sum"), fail=("fail", "any"))
+
+    verdict = np.where(agg["missing"] | (agg["valid"] == 0), "NA", np.where(agg["fail"], "Fail", "Pass"))
+    return pd.DataFrame({
+        "Elements": agg.index.str.title(),
+        label: verdict,
+        "Sample_Count": agg["valid"].astype(int).to_numpy(),
+    })
+
+
+def summarize_accuracy(df):
+    return _rollup(df, "A_Result", "Cert. Val.", "Accuracy_Result")
+
+
+def summarize_precision(df):
+    return _rollup(df, "P_Result", "Acceptance", "Precision_Result")
+
+
+def stability_multipliers(elements, stab_type, excluded_elements):
+    excluded = elements.str.upper().isin(excluded_elements)
+    return np.where(excluded, EXCLUDED_MULTIPLIER, STABILITY_MULTIPLIERS[stab_type])
+
+
+def score_stability(df, threshold_index, stab_type, excluded_elements):
+    # Acceptance from the report wins; the precision table fills the gaps
+    df["CV"] = pd.to_numeric(df["CV"], errors="coerce")
+    df["S_Limit0"] = threshold_index.lookup(df["CV"], df["Elements"])
+    df["S_Limit"] = df["S_Limit"].fillna(df["S_Limit0"])
+
+    df["Elements"] = df["Elements"].str.upper()
+    df["S_Limit"] = df["S_Limit"] * stability_multipliers(df["Elements"], stab_type, excluded_elements)
+
+    dev, limit = df["DEV"], df["S_Limit"]
+    df["%DEV_S"] = ((dev / limit) * 100).round(2).where(dev.notna() & limit.notna())
+    df["S_Result"] = np.where(dev.isna(), "NA", np.where(dev <= limit, "Pass", "Fail"))
+    return df
+
+
+def summarize_stability(df):
+    # Rows without a certified value take no part in the element verdict
+    certified = df[~original(df, "Cert. Val.").astype(str).str.contains("-", na=False)]
+    agg = pd.DataFrame({
+        "missing": flag(certified, "Cert. Val.") == "-",
+        "fail": certified["S_Result"] != "Pass",
+    }).groupby(certified["Elements"]).agg(missing=("missing", "all"), fail=("fail", "any"))
+
+    verdict = np.where(agg["missing"], "NA", np.where(agg["fail"], "Fail", "Pass"))
+    return pd.DataFrame({"Elements": agg.index.str.title(), "Stability_Result": verdict})
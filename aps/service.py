@@ -0,0 +1,294 @@
+# Local HTTP scoring service for LIMS integration (standard library only).
+#
+#   python -m aps.service --port 8765 --workers 4
+#
+#   POST /score?test=Accuracy&base=Fe&matrix=LAS[&bench=B1][&rows=0]
+#   POST /score?test=LongTerm&base=Fe&model=Metavision%2010008X_A
+#        body: the report file as is (xlsx, xls, csv or tsv)
+#   GET  /health    liveness and reference data version
+#   GET  /metrics   request counters and latency percentiles
+#
+# /score answers with JSON: the pass counts, the per-element summary and,
+# unless rows=0, the per-row results, computed by the same functions as
+# the pages (see aps.batch). Reports are scored in a process pool whose
+# workers preload the reference tables once (memory-mapped when compiled,
+# see aps.compile_reference). At most --max-pending reports are accepted at
+# a time, beyond that the service answers 503; a report that takes longer
+# than --timeout gets 504. A worker process that dies fails the requests it
+# had with 500 and the pool is replaced. A client that stalls for
+# SOCKET_TIMEOUT seconds while sending the report is disconnected.
+import argparse
+import hashlib
+import json
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from aps.batch import score_accuracy_file, score_stability_file
+from aps.pipeline import ACCURACY_COLUMNS, ACCURACY_TEST, STABILITY_COLUMNS, TEST_TYPES, ReportError
+from aps.reference_data import load_base_matrix, load_excluded_elements, load_models, reference_version
+from aps.report_reader import read_report
+from aps.schema import display_frame
+from aps.thresholds import load_threshold_index
+
+MAX_BODY = 50 * 1024 * 1024
+# Seconds a client may stall while sending a request or reading the answer
+SOCKET_TIMEOUT = 30
+LATENCY_WINDOW = 1000
+
+
+def preload_reference():
+    # Worker initializer: every table a request may need, loaded once
+    bases = [b for b in load_base_matrix() if b != "base"]
+    for model in load_models():
+        for base in bases:
+            load_threshold_index(model, base)
+    load_excluded_elements()
+
+
+def _records(df):
+    return json.loads(df.to_json(orient="records", double_precision=15))
+
+
+def score_report(data, test_type, base, matrix="", model="", bench_no="", include_rows=True):
+    # Runs in a worker process; returns a JSON-ready dict
+    df_raw = read_report(data)
+    if test_type == ACCURACY_TEST:
+        final_df, elements, info = score_accuracy_file(df_raw, base, matrix, bench_no)
+        columns = ACCURACY_COLUMNS
+    else:
+        final_df, elements, info = score_stability_file(df_raw, base, model, test_type)
+        columns = STABILITY_COLUMNS
+
+    result = {
+        "test": test_type,
+        "base": base,
+        "matrix": matrix,
+        "model": model,
+        "report_sha1": hashlib.sha1(data).hexdigest(),
+        "info": {k: (v.item() if isinstance(v, np.generic) else v) for k, v in info.items()},
+        "summary": _records(elements),
+    }
+    if include_rows:
+        result["rows"] = _records(display_frame(final_df, columns))
+    return result
+
+
+class ServiceStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counts = Counter()
+        self.pending = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.pending >= limit:
+                return False
+            self.pending += 1
+            return True
+
+    def release(self, seconds=None):
+        with self._lock:
+            self.pending -= 1
+            if seconds is not None:
+                self.latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = np.array(self.latencies)
+            snapshot = {"uptime_s": round(time.time() - self.started, 1), "pending": self.pending,
+                        "counts": dict(self.counts)}
+        if len(latencies):
+            snapshot["latency_ms"] = {f"p{q}": round(float(np.percentile(latencies, q)) * 1000, 1)
+                                      for q in (50, 95, 99)}
+        return snapshot
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    server_version = "APSScoring/1.0"
+    protocol_version = "HTTP/1.1"
+    timeout = SOCKET_TIMEOUT
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send(HTTPStatus.OK, {"status": "ok", "workers": self.server.workers,
+                                       "reference_version": reference_version()})
+        elif path == "/metrics":
+            self._send(HTTPStatus.OK, self.server.stats.snapshot())
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/score":
+            self._send(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        stats = self.server.stats
+        stats.count("requests")
+
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        test_type, base = params.get("test", ""), params.get("base", "")
+        error = None
+        if test_type not in TEST_TYPES:
+            error = f"test must be one of {', '.join(TEST_TYPES)}"
+        elif not base:
+            error = "base is required"
+        elif test_type == ACCURACY_TEST and not params.get("matrix"):
+            error = "matrix is required for the Accuracy test"
+        elif test_type != ACCURACY_TEST and not params.get("model"):
+            error = "model is required for the stability tests"
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = 0
+        if error is None and not 0 < length <= MAX_BODY:
+            status = HTTPStatus.REQUEST_ENTITY_TOO_LARGE if length > MAX_BODY else HTTPStatus.BAD_REQUEST
+            stats.count("rejected_body")
+            self.close_connection = True
+            self._send(status, {"error": f"send the report as the request body (at most {MAX_BODY} bytes)"})
+            return
+        if error is not None:
+            stats.count("bad_request")
+            self.close_connection = True
+            self._send(HTTPStatus.BAD_REQUEST, {"error": error})
+            return
+
+        # The slot is taken before the body is read, so --max-pending also
+        # bounds the report bytes held in memory
+        if not stats.acquire(self.server.max_pending):
+            stats.count("rejected_busy")
+            self.close_connection = True
+            self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "busy, retry later"})
+            return
+        try:
+            data = self.rfile.read(length)
+        except OSError:
+            data = b""
+        if len(data) < length:
+            # The client stalled or went away before sending the whole report
+            stats.count("incomplete_body")
+            stats.release()
+            self.close_connection = True
+            return
+
+        started = time.perf_counter()
+        pool = self.server.pool
+        try:
+            future = pool.submit(
+                score_report, data, test_type, base, params.get("matrix", ""), params.get("model", ""),
+                params.get("bench", ""), params.get("rows", "1") != "0")
+            result = future.result(timeout=self.server.timeout_s)
+        except FutureTimeout:
+            # Still queued: it is not scored at all. Already running: the
+            # worker finishes it anyway and the result is dropped
+            future.cancel()
+            stats.count("timeouts")
+            self._send(HTTPStatus.GATEWAY_TIMEOUT, {"error": f"scoring took longer than {self.server.timeout_s}s"})
+        except BrokenProcessPool:
+            stats.count("worker_crashes")
+            self.server.replace_pool(pool)
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "the scoring worker stopped, retry the report"})
+        except (ReportError, ValueError, KeyError) as e:
+            stats.count("report_errors")
+            self._send(HTTPStatus.UNPROCESSABLE_ENTITY, {"error": str(e)})
+        except Exception as e:
+            stats.count("server_errors")
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            stats.count("ok")
+            self._send(HTTPStatus.OK, result)
+        finally:
+            stats.release(time.perf_counter() - started)
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, workers, max_pending, timeout_s, verbose=False):
+        super().__init__(address, ScoringHandler)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout_s = timeout_s
+        self.verbose = verbose
+        self.stats = ServiceStats()
+        self._pool_lock = threading.Lock()
+        self.pool = self._new_pool()
+
+    def _new_pool(self):
+        # spawn: forking a process that already runs server threads is unsafe
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=preload_reference)
+
+    def replace_pool(self, broken):
+        # Every request on a broken pool lands here; the first one replaces it
+        with self._pool_lock:
+            if self.pool is broken:
+                self.pool = self._new_pool()
+                broken.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self):
+        # Starts every worker (and its preload) before the first request
+        for future in [self.pool.submit(time.sleep, 0.2) for _ in range(self.workers)]:
+            future.result()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m aps.service", description="HTTP scoring service for APS reports.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="scoring processes")
+    parser.add_argument("--max-pending", type=int, default=64, help="reports accepted at once (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per report (default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    server = ScoringServer((args.host, args.port), max(1, args.workers), args.max_pending, args.timeout, args.verbose)
+    # A service manager's SIGTERM shuts the worker pool down like Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server.warm_up()
+    print(f"APS scoring service on http://{args.host}:{args.port} ({server.workers} workers)")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
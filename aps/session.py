@@ -0,0 +1,95 @@
+# Per-session user context (name, bench, base, matrix, model, checklist).
+#
+# The context lives in st.session_state, so operators sharing one server no
+# longer overwrite each other through temp_user_data.json. A signed token
+# can be put in the page URL (?ctx=...) to restore the context after a
+# reload or in a new tab without touching shared disk.
+#
+# Tokens are signed with APS_SESSION_SECRET. Without it a random secret is
+# generated per server process, so tokens stop working after a restart.
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+
+import streamlit as st
+
+CONTEXT_KEY = "aps_context"
+TOKEN_PARAM = "ctx"
+
+# Legacy shared file written by older versions of app.py. Off by default:
+# every new session would otherwise start from whichever operator wrote it
+# last. Set APS_LEGACY_CONTEXT_FILE=temp_user_data.json to read it once per
+# session as a fallback while migrating.
+LEGACY_FILE = os.environ.get("APS_LEGACY_CONTEXT_FILE", "")
+
+_SECRET = os.environ.get("APS_SESSION_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_SECRET, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def make_token(context):
+    payload = _b64encode(json.dumps(context, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def read_token(token):
+    # Returns the context, or None when the token is malformed or tampered with
+    try:
+        payload, signature = token.split(".", 1)
+    except (AttributeError, ValueError):
+        return None
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        return json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+
+
+def _read_legacy_file():
+    if not LEGACY_FILE:
+        return None
+    try:
+        with open(LEGACY_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_context(context):
+    st.session_state[CONTEXT_KEY] = context
+
+
+def load_context():
+    # Session state first, then a URL token, then the legacy shared file
+    context = st.session_state.get(CONTEXT_KEY)
+    if context is not None:
+        return context
+
+    token = st.query_params.get(TOKEN_PARAM)
+    context = read_token(token) if token else None
+    if context is None:
+        context = _read_legacy_file()
+    if context is not None:
+        save_context(context)
+    return context
+
+
+def context_query_params():
+    # For st.page_link(..., query_params=...) so the target page can be
+    # reloaded or opened in a new tab
+    context = st.session_state.get(CONTEXT_KEY)
+    return {TOKEN_PARAM: make_token(context)} if context is not None else None
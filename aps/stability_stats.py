@@ -0,0 +1,99 @@
+# Within-set and between-set variance analysis of a stability run.
+#
+# The stacked sets are laid out as element x set matrices of the set means
+# and SDs, and every statistic is computed for all elements at once:
+# - Within SD: short-term repeatability, pooled from the set SDs,
+#   sqrt(mean(SD^2)) (every set has the same number of burns n).
+# - Between SD: one-way ANOVA from the summary statistics. MS_within is
+#   the pooled variance, MS_between = n * var(set means), and the
+#   between-set component is sqrt(max(0, (MS_between - MS_within) / n)).
+#   F = MS_between / MS_within.
+# - Drift: least-squares slope of the set means over the set order, per
+#   set and as % of the grand mean.
+# - Control signal: individuals chart of the set means, limits at the
+#   grand mean +/- 3 sigma with sigma from the average moving range
+#   (MR / 1.128); "Beyond limits" when a set mean falls outside, "Run of 8"
+#   when 8 consecutive set means sit on one side of the grand mean.
+#
+# Missing values (a set without the element, a blank or a text cell such
+# as "-") are left out of every sum.
+import os
+
+import numpy as np
+import pandas as pd
+
+from aps.schema import flag
+
+REPLICATES = int(os.environ.get("APS_STABILITY_REPLICATES", "3"))
+SIGMA_LIMIT = 3
+RUN_LENGTH = 8
+D2 = 1.128
+
+STATISTICS_COLUMNS = ["Elements", "Sets", "Grand Mean", "Within SD", "Between SD", "F", "Drift/Set", "Drift %/Set",
+                      "Control_Signal"]
+
+
+def set_matrix(final_df, column):
+    # element x set matrix of column, sets in report order
+    elements = pd.Categorical(final_df["Elements"].astype(str), categories=pd.unique(final_df["Elements"].astype(str)))
+    sets = pd.Categorical(final_df["Set"].astype(str), categories=pd.unique(final_df["Set"].astype(str)))
+    matrix = np.full((len(elements.categories), len(sets.categories)), np.nan)
+    matrix[elements.codes, sets.codes] = final_df[column].to_numpy(dtype="float64", na_value=np.nan)
+    return list(elements.categories), matrix
+
+
+def _safe_div(num, den):
+    out = np.full(np.broadcast(num, den).shape, np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def _runs(signs, length):
+    # True where some window of `length` consecutive signs is all +1 or all -1
+    if signs.shape[1] < length:
+        return np.zeros(signs.shape[0], dtype=bool)
+    windows = np.lib.stride_tricks.sliding_window_view(signs, length, axis=1).sum(axis=2)
+    return (np.abs(windows) == length).any(axis=1)
+
+
+def stability_statistics(final_df, replicates=REPLICATES):
+    elements, means = set_matrix(final_df, "Mean")
+    sd = pd.to_numeric(final_df["SD"], errors="coerce").where(flag(final_df, "SD").isna())
+    _, sds = set_matrix(final_df.assign(SD=sd), "SD")
+
+    present = ~np.isnan(means)
+    k = present.sum(axis=1)
+    grand = _safe_div(np.where(present, means, 0.0).sum(axis=1), k)
+    centred = np.where(present, means - grand[:, None], 0.0)
+
+    # One-way ANOVA from the set means and SDs
+    has_sd = ~np.isnan(sds)
+    ms_within = _safe_div(np.where(has_sd, sds ** 2, 0.0).sum(axis=1), has_sd.sum(axis=1))
+    ms_between = replicates * _safe_div((centred ** 2).sum(axis=1), k - 1)
+    between_sd = np.sqrt(np.clip(ms_between - ms_within, 0, None) / replicates)
+    f_ratio = _safe_div(ms_between, ms_within)
+
+    # Drift over the set order 1..S
+    order = np.arange(1, means.shape[1] + 1, dtype="float64")
+    x = np.where(present, order - _safe_div(np.where(present, order, 0.0).sum(axis=1), k)[:, None], 0.0)
+    slope = _safe_div((x * centred).sum(axis=1), (x ** 2).sum(axis=1))
+
+    # Individuals chart on the set means
+    moving_range = np.abs(np.diff(means, axis=1))
+    has_range = ~np.isnan(moving_range)
+    sigma = _safe_div(np.where(has_range, moving_range, 0.0).sum(axis=1), has_range.sum(axis=1)) / D2
+    beyond = (np.abs(centred) > SIGMA_LIMIT * sigma[:, None]).any(axis=1) & (sigma > 0)
+    run = _runs(np.sign(centred).astype(int), RUN_LENGTH)
+    signal = np.where(k < 2, "NA", np.where(beyond, "Beyond limits", np.where(run, f"Run of {RUN_LENGTH}", "OK")))
+
+    return pd.DataFrame({
+        "Elements": [str(e).title() for e in elements],
+        "Sets": k,
+        "Grand Mean": grand,
+        "Within SD": np.sqrt(ms_within),
+        "Between SD": np.where(k > 1, between_sd, np.nan),
+        "F": f_ratio.round(3),
+        "Drift/Set": slope,
+        "Drift %/Set": (_safe_div(slope, np.abs(grand)) * 100).round(3),
+        "Control_Signal": signal,
+    }, columns=STATISTICS_COLUMNS)
@@ -0,0 +1,84 @@
+# Memoized page stages.
+#
+# A page reruns top to bottom on every widget interaction. Each stage
+# (read, parse, map, score, summarize, export) is keyed on a hash of its
+# inputs, normally the key of the stage before it plus whatever else it
+# depends on, and the last result per stage is kept in the session. A
+# rerun caused by e.g. one mapping selectbox then only recomputes the
+# stages downstream of the change.
+#
+# Cached values are shared between reruns and must not be mutated.
+# With a RunMetrics attached every stage, hit or miss, is also recorded
+# for the run (see aps.metrics).
+import hashlib
+import json
+import time
+from contextlib import nullcontext
+
+import pandas as pd
+import streamlit as st
+
+from aps.metrics import rows_of
+
+
+def input_key(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    def __init__(self):
+        self.entries = {}
+        self.stats = {}
+        self.metrics = None
+
+    def key_of(self, stage):
+        entry = self.entries.get(stage)
+        return entry[0] if entry else None
+
+    def run(self, stage, inputs, fn, *args, **kwargs):
+        key = input_key(*inputs)
+        stats = self.stats.setdefault(stage, {"hits": 0, "misses": 0, "last": "", "seconds": 0.0})
+        with self.metrics.stage(stage) if self.metrics else nullcontext({}) as record:
+            entry = self.entries.get(stage)
+            if entry is not None and entry[0] == key:
+                stats["hits"] += 1
+                stats["last"] = "hit"
+                record.update(cached=True, rows=rows_of(entry[1]))
+                return entry[1]
+
+            started = time.perf_counter()
+            value = fn(*args, **kwargs)
+            stats["misses"] += 1
+            stats["last"] = "miss"
+            stats["seconds"] = round(time.perf_counter() - started, 4)
+            self.entries[stage] = (key, value)
+            record["rows"] = rows_of(value)
+            return value
+
+    def stats_table(self):
+        return pd.DataFrame([{"Stage": stage, "Hits": s["hits"], "Misses": s["misses"], "This Run": s["last"],
+                              "Last Compute (s)": s["seconds"]} for stage, s in self.stats.items()])
+
+    def begin_run(self, metrics=None):
+        self.metrics = metrics
+        for s in self.stats.values():
+            s["last"] = ""
+
+
+def stage_cache(page, metrics=None):
+    # One cache per page per session
+    key = f"aps_stages_{page}"
+    if key not in st.session_state:
+        st.session_state[key] = StageCache()
+    cache = st.session_state[key]
+    cache.begin_run(metrics)
+    return cache
+
+
+def show_stage_stats(cache):
+    # Cache counters plus, with metrics attached, this run's stage timings
+    with st.expander("⚙️ Pipeline cache and timings"):
+        st.dataframe(cache.stats_table(), hide_index=True)
+        if cache.metrics is not None:
+            st.caption("This run")
+            st.dataframe(cache.metrics.table(), hide_index=True)
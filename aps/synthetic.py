@@ -0,0 +1,83 @@
+# Synthetic instrument reports for benchmarks and manual testing.
+#
+# Writes the layout both report pages parse: per block a
+# "Method: ... | Sample Name: ..." header row, an Elements / Mean / SD /
+# Cert. Val. / Acceptance (2s) column row, one row per element and a blank
+# separator. An accuracy report is one block per sample, a stability
+# report the same sample measured `sets` times.
+#
+#   python -m aps.synthetic report.xlsx --samples 6 --elements 60 --sets 1
+#   python -m aps.synthetic stability.csv --samples 1 --elements 30 --sets 16
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+ELEMENTS = ["Fe", "C", "Si", "Mn", "P", "S", "Cr", "Mo", "Ni", "Al", "Co", "Cu", "Nb", "Ti", "V", "W", "Pb", "Sn",
+            "As", "Zr", "Bi", "Ca", "Ce", "Sb", "Se", "Ta", "B", "Zn", "La", "Te", "N", "Mg", "O", "Ag", "Au", "Be",
+            "Cd", "Ga", "In", "Li", "Ba", "Sr", "Hf", "Re", "Ru", "Rh", "Pd", "Pt", "Ir", "Os", "Ge", "Tl", "Hg", "K",
+            "Na", "Y", "Sc", "Nd", "Pr", "Sm", "Gd", "Dy", "Er", "Yb"]
+
+COLUMNS = ["Elements", "Mean", "SD", "Cert. Val.", "Acceptance (2s)"]
+
+
+def report_rows(samples=6, elements=30, sets=1, sample_names=None, matrix="LAS", method="FE_LAS",
+                censored=0.05, missing_cert=0.1, missing_acceptance=0.2, seed=0):
+    # elements: a count (taken from ELEMENTS) or a list of element names.
+    # censored / missing_*: share of rows with a "<0.001" mean or a "-"
+    # certified value / acceptance, as instruments report them.
+    rng = np.random.default_rng(seed)
+    names = list(sample_names) if sample_names is not None else [f"S{i + 1:03d}" for i in range(samples)]
+    element_names = ELEMENTS[:elements] if isinstance(elements, int) else list(elements)
+    start = date(2025, 1, 1)
+
+    rows = []
+    for sample_no, name in enumerate(names):
+        # One certified composition per sample, shared by all its sets
+        cert = rng.uniform(0.001, 2, len(element_names))
+        for set_no in range(sets):
+            day = (start + timedelta(days=sample_no * sets + set_no)).isoformat()
+            rows.append([f"Method: {method} | Matrix: {matrix} | Date: {day} | Sample Name: {name}"] + [None] * 4)
+            rows.append(list(COLUMNS))
+            for element, value in zip(element_names, cert):
+                mean = value * (1 + rng.normal(0, 0.01))
+                rows.append([
+                    f"{element} (%)",
+                    "<0.001" if rng.random() < censored else mean,
+                    abs(value * rng.normal(0, 0.005)),
+                    "-" if rng.random() < missing_cert else value,
+                    "-" if rng.random() < missing_acceptance else value * 0.04,
+                ])
+            rows.append([None] * 5)
+    return rows
+
+
+def write_report(path, **kwargs):
+    # .csv / .tsv are written as text, anything else as .xlsx
+    df = pd.DataFrame(report_rows(**kwargs))
+    if path.endswith(".csv"):
+        df.to_csv(path, header=False, index=False)
+    elif path.endswith(".tsv"):
+        df.to_csv(path, sep="\t", header=False, index=False)
+    else:
+        df.to_excel(path, header=False, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic APS instrument report.")
+    parser.add_argument("path")
+    parser.add_argument("--samples", type=int, default=6)
+    parser.add_argument("--elements", type=int, default=30)
+    parser.add_argument("--sets", type=int, default=1)
+    parser.add_argument("--matrix", default="LAS")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_report(args.path, samples=args.samples, elements=args.elements, sets=args.sets, matrix=args.matrix,
+                 seed=args.seed)
+    print(f"Wrote {args.path}")
+
+
+if __name__ == "__main__":
+    main()
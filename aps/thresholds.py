@@ -0,0 +1,182 @@
+# Precompiled precision-threshold lookup for the stability test.
+#
+# A precision sheet has the concentration breakpoints in its first column
+# and one precision column per element. The threshold for a certified value
+# is taken from the first row (in sheet order) whose concentration is
+# >= that value. Running the breakpoints through a prefix maximum keeps that
+# "first row" rule while giving a non-decreasing array for np.searchsorted.
+#
+# Compiled, each sheet's breakpoints and padded value matrix are .npy files
+# next to the workbook (see aps.reference_data), memory-mapped read-only so every server
+# process shares one copy through the page cache.
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from aps.reference_data import (
+    REFERENCE_DIR,
+    USE_COMPILED,
+    compiled_dir,
+    file_signature,
+    load_workbook,
+    read_manifest,
+    write_compiled,
+)
+
+PRECISION_PREFIX = "Precision_figures"
+
+_lock = threading.Lock()
+_listing = {"signature": None, "files": []}
+_indexes = {}
+
+
+class ThresholdIndex:
+    def __init__(self, table=None):
+        if table is None:
+            return
+        table = table.copy()
+        table.columns = table.columns.astype(str).str.strip()
+
+        conc = pd.to_numeric(table.iloc[:, 0], errors="coerce").to_numpy(dtype=float)
+        rows = np.flatnonzero(~np.isnan(conc))
+        self.breakpoints = np.maximum.accumulate(conc[rows]) if len(rows) else np.empty(0)
+
+        # First occurrence wins for repeated element headers
+        elements = table.columns[1:]
+        keep = ~elements.duplicated()
+        self.elements = pd.Index(elements[keep])
+
+        values = table.iloc[rows, 1:].loc[:, keep].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        # Extra NaN row / column absorb "no breakpoint" and "unknown element"
+        self.values = np.full((len(rows) + 1, len(self.elements) + 1), np.nan)
+        self.values[:-1, :-1] = values
+
+    @classmethod
+    def from_arrays(cls, breakpoints, elements, values):
+        # values already carries the NaN pad row and column
+        index = cls()
+        index.breakpoints = breakpoints
+        index.elements = pd.Index(elements, dtype=object)
+        index.values = values
+        return index
+
+    def column(self, element):
+        pos = self.elements.get_indexer([str(element).strip()])[0]
+        return self.values[:-1, pos] if pos >= 0 else None
+
+    def lookup(self, cert_values, elements):
+        cert_values = pd.to_numeric(pd.Series(cert_values), errors="coerce").to_numpy(dtype=float)
+        # NaN sorts past every breakpoint and lands on the NaN row
+        rows = np.searchsorted(self.breakpoints, cert_values, side="left")
+        cols = self.elements.get_indexer(pd.Series(elements, dtype=object).astype(str).str.strip())
+        cols[cols < 0] = len(self.elements)
+        return self.values[rows, cols]
+
+
+def model_code(model_name):
+    # "Metavision 10008X_A" -> "10008X"
+    parts = model_name.split()
+    if len(parts) < 2:
+        return None
+    return parts[1].split("_")[0]
+
+
+def precision_files(folder=REFERENCE_DIR):
+    # Directory listing is reused until the folder itself changes
+    signature = file_signature(folder)
+    with _lock:
+        if _listing["signature"] != signature:
+            _listing["files"] = [f for f in os.listdir(folder) if f.startswith(PRECISION_PREFIX) and f.endswith(".xlsx")]
+            _listing["signature"] = signature
+        return list(_listing["files"])
+
+
+def find_precision_file(model_name, folder=REFERENCE_DIR):
+    code = model_code(model_name)
+    if code is None:
+        return None
+    for file in precision_files(folder):
+        if code in file:
+            return os.path.join(folder, file)
+    return None
+
+
+def compile_precision_file(path, folder=None):
+    # Every base sheet of a precision workbook as .npy arrays
+    sheets = load_workbook(path, skiprows=[1])
+
+    def write_sheets(data_dir):
+        entries = []
+        for i, (sheet, table) in enumerate(sheets.items()):
+            if table.shape[1] == 0:
+                continue
+            index = ThresholdIndex(table)
+            stem = f"sheet{i}"
+            np.save(os.path.join(data_dir, f"{stem}.breakpoints.npy"), index.breakpoints)
+            np.save(os.path.join(data_dir, f"{stem}.values.npy"), index.values)
+            entries.append({"name": sheet, "stem": stem, "elements": [str(e) for e in index.elements]})
+        return entries
+
+    return write_compiled(path, "precision", write_sheets, folder)
+
+
+def load_compiled_index(path, base_name, folder=None):
+    # (found, index) from the memory-mapped arrays, compiling first if
+    # needed; found is None when no compile could be used
+    folder = folder or compiled_dir(path)
+    manifest = read_manifest(path, "precision", folder) or compile_precision_file(path, folder)
+    if manifest is None:
+        return None, None
+    entry = next((e for e in manifest["sheets"] if e["name"] == base_name), None)
+    if entry is None:
+        return True, None
+    data_dir = os.path.join(folder, manifest["dir"])
+    return True, ThresholdIndex.from_arrays(
+        np.load(os.path.join(data_dir, f"{entry['stem']}.breakpoints.npy"), mmap_mode="r"),
+        entry["elements"],
+        np.load(os.path.join(data_dir, f"{entry['stem']}.values.npy"), mmap_mode="r"),
+    )
+
+
+def precision_models(folder=REFERENCE_DIR):
+    # {"Metavision 10008X": path} for every precision workbook in the folder
+    return {f[len(PRECISION_PREFIX):-len(".xlsx")].strip("_ "): os.path.join(folder, f)
+            for f in sorted(precision_files(folder))}
+
+
+def precision_bases(path):
+    # Base sheet names of a precision workbook
+    manifest = (read_manifest(path, "precision") or compile_precision_file(path)) if USE_COMPILED else None
+    if manifest is None:
+        return [name for name, table in load_workbook(path, skiprows=[1]).items() if table.shape[1]]
+    return [entry["name"] for entry in manifest["sheets"]]
+
+
+def load_threshold_index(model_name, base_name, folder=REFERENCE_DIR):
+    path = find_precision_file(model_name, folder)
+    if path is None:
+        return None
+    return load_precision_index(path, base_name)
+
+
+def load_precision_index(path, base_name):
+    signature = file_signature(path)
+    key = (os.path.abspath(path), base_name)
+    with _lock:
+        cached = _indexes.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    found, index = load_compiled_index(path, base_name) if USE_COMPILED else (None, None)
+    if found is None:
+        sheets = load_workbook(path, skiprows=[1])
+        if base_name not in sheets:
+            return None
+        index = ThresholdIndex(sheets[base_name])
+    elif index is None:
+        return None
+    with _lock:
+        _indexes[key] = (signature, index)
+    return index
@@ -0,0 +1,242 @@
+# Long-term stability trends per bench and element.
+#
+# Every scored stability run is kept twice:
+# - its per-set, per-element rows as one Parquet file in a hive-partitioned
+#   tree, TREND_DIR/bench_no=.../model=.../date=YYYY-MM-DD/<run>.parquet,
+#   append only, for analysis with pandas/pyarrow filters;
+# - one point per element (mean |%DEV_S|, fails) in the SQLite database of
+#   the activity log, plus running totals per bench/model/element that are
+#   updated in place as runs arrive. The trend page reads only these, so
+#   it never rescans the history.
+#
+# Slopes are least squares over the run points, from running sums of t,
+# t^2, y and t*y with t in days.
+import hashlib
+import json
+import os
+from datetime import datetime
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from aps.activity_log import DB_FILE, connect
+
+TREND_DIR = os.environ.get("APS_TREND_DIR", "aps_trends")
+EWM_ALPHA = 0.2
+MAX_POINTS = 400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trend_runs (
+    run_key TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    bench_no TEXT, model TEXT, base TEXT, matrix TEXT, stab_type TEXT, path TEXT
+);
+
+CREATE TABLE IF NOT EXISTS trend_points (
+    run_key TEXT NOT NULL,
+    bench_no TEXT NOT NULL, model TEXT NOT NULL, element TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    abs_pct REAL, mean_dev REAL, fails INTEGER, sets INTEGER
+);
+CREATE INDEX IF NOT EXISTS trend_points_series ON trend_points (bench_no, model, element, timestamp);
+
+CREATE TABLE IF NOT EXISTS trend_stats (
+    bench_no TEXT NOT NULL, model TEXT NOT NULL, element TEXT NOT NULL,
+    runs INTEGER, sets INTEGER, fails INTEGER,
+    sum_dev REAL, sum_abs_pct REAL, ewm_abs_pct REAL, ewm_fail_rate REAL,
+    sum_t REAL, sum_t2 REAL, sum_y REAL, sum_ty REAL,
+    first_ts TEXT, last_ts TEXT,
+    PRIMARY KEY (bench_no, model, element)
+);
+"""
+
+UPSERT_STATS = f"""
+INSERT INTO trend_stats VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (bench_no, model, element) DO UPDATE SET
+    runs = runs + 1,
+    sets = sets + excluded.sets,
+    fails = fails + excluded.fails,
+    sum_dev = sum_dev + excluded.sum_dev,
+    sum_abs_pct = sum_abs_pct + excluded.sum_abs_pct,
+    ewm_abs_pct = ewm_abs_pct + {EWM_ALPHA} * (excluded.ewm_abs_pct - ewm_abs_pct),
+    ewm_fail_rate = ewm_fail_rate + {EWM_ALPHA} * (excluded.ewm_fail_rate - ewm_fail_rate),
+    sum_t = sum_t + excluded.sum_t,
+    sum_t2 = sum_t2 + excluded.sum_t2,
+    sum_y = sum_y + excluded.sum_y,
+    sum_ty = sum_ty + excluded.sum_ty,
+    first_ts = min(first_ts, excluded.first_ts),
+    last_ts = max(last_ts, excluded.last_ts)
+"""
+
+EPOCH = datetime(2000, 1, 1)
+
+# Partition keys are read as the strings they were written from, so bench
+# "12" is not inferred as an integer that a string filter cannot match
+PARTITIONING = ds.partitioning(
+    pa.schema([("bench_no", pa.string()), ("model", pa.string()), ("date", pa.string())]), flavor="hive")
+
+
+def _connect(path):
+    conn = connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _days(timestamp):
+    return (datetime.fromisoformat(timestamp) - EPOCH).total_seconds() / 86400
+
+
+def run_rows(final_df):
+    # Numeric per-set rows of a scored stability result
+    return pd.DataFrame({
+        "set": pd.to_numeric(final_df["Set"].astype(str), errors="coerce").astype("Int64"),
+        "element": final_df["Elements"].astype(str),
+        "mean": pd.to_numeric(final_df["Mean"], errors="coerce"),
+        "cert": pd.to_numeric(final_df["Cert. Val."], errors="coerce"),
+        "dev": pd.to_numeric(final_df["DEV"], errors="coerce"),
+        "s_limit": pd.to_numeric(final_df["S_Limit"], errors="coerce"),
+        "pct_dev_s": pd.to_numeric(final_df["%DEV_S"], errors="coerce"),
+        "fail": final_df["S_Result"].eq("Fail"),
+    })
+
+
+def element_points(rows):
+    # One trend point per element: mean |%DEV_S|, mean DEV, fails and sets
+    valid = rows[rows["pct_dev_s"].notna()]
+    return valid.assign(abs_pct=valid["pct_dev_s"].abs()).groupby("element").agg(
+        abs_pct=("abs_pct", "mean"), sum_abs_pct=("abs_pct", "sum"), sum_dev=("dev", "sum"),
+        fails=("fail", "sum"), sets=("abs_pct", "size"),
+    ).reset_index()
+
+
+def partition_path(bench_no, model, day, root=TREND_DIR):
+    # Hive-style directories; values are URI-encoded as pyarrow expects
+    parts = [f"bench_no={quote(str(bench_no), safe='')}", f"model={quote(str(model), safe='')}", f"date={day}"]
+    return os.path.join(root, *parts)
+
+
+def trend_run_key(user_data, stab_type, report_digest):
+    # The same report scored again on the same bench counts once
+    parts = [user_data.get("bench_no"), user_data.get("model"), stab_type, report_digest]
+    return hashlib.sha1(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+def record_stability_run(user_data, stab_type, run_key, final_df, timestamp=None, path=DB_FILE, root=TREND_DIR):
+    # Stores a scored run once; returns False if run_key was already stored
+    timestamp = timestamp or datetime.now().isoformat(sep=" ", timespec="seconds")
+    bench_no, model = str(user_data.get("bench_no", "")), str(user_data.get("model", ""))
+    rows = run_rows(final_df)
+    points = element_points(rows)
+    t = _days(timestamp)
+
+    folder = partition_path(bench_no, model, timestamp[:10], root)
+    file_path = os.path.join(folder, f"{run_key}.parquet")
+
+    conn = _connect(path)
+    try:
+        with conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO trend_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_key, timestamp, bench_no, model, user_data.get("base"), user_data.get("matrix"), stab_type,
+                 file_path)).rowcount
+            if not inserted:
+                return False
+
+            os.makedirs(folder, exist_ok=True)
+            tmp_path = file_path + ".tmp"
+            rows.assign(timestamp=pd.Timestamp(timestamp), stab_type=stab_type, base=user_data.get("base"),
+                        matrix=user_data.get("matrix"), run_key=run_key).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, file_path)
+
+            conn.executemany("INSERT INTO trend_points VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (run_key, bench_no, model, p.element, timestamp, float(p.abs_pct), float(p.sum_dev / p.sets),
+                 int(p.fails), int(p.sets)) for p in points.itertuples()])
+            conn.executemany(UPSERT_STATS, [
+                (bench_no, model, p.element, int(p.sets), int(p.fails), float(p.sum_dev), float(p.sum_abs_pct),
+                 float(p.abs_pct), p.fails / p.sets, t, t * t, float(p.abs_pct), t * float(p.abs_pct),
+                 timestamp, timestamp) for p in points.itertuples()])
+        return True
+    finally:
+        conn.close()
+
+
+def trend_benches(path=DB_FILE):
+    # (bench_no, model) pairs with stored runs
+    conn = _connect(path)
+    try:
+        return conn.execute("SELECT DISTINCT bench_no, model FROM trend_stats ORDER BY bench_no, model").fetchall()
+    finally:
+        conn.close()
+
+
+def rolling_stats(bench_no, model, path=DB_FILE):
+    conn = _connect(path)
+    try:
+        stats = pd.read_sql_query("SELECT * FROM trend_stats WHERE bench_no = ? AND model = ? ORDER BY element",
+                                  conn, params=(bench_no, model))
+    finally:
+        conn.close()
+
+    n = stats["runs"]
+    denominator = n * stats["sum_t2"] - stats["sum_t"] ** 2
+    slope = (n * stats["sum_ty"] - stats["sum_t"] * stats["sum_y"]) / denominator.where(denominator > 1e-9)
+    return pd.DataFrame({
+        "Elements": stats["element"],
+        "Runs": n,
+        "Sets": stats["sets"],
+        "Mean DEV": stats["sum_dev"] / stats["sets"],
+        "Mean |%DEV_S|": stats["sum_abs_pct"] / stats["sets"],
+        "Recent |%DEV_S| (EWM)": stats["ewm_abs_pct"],
+        "|%DEV_S| Trend per 30 days": slope * 30,
+        "Failure Rate %": stats["fails"] / stats["sets"] * 100,
+        "Recent Failure Rate % (EWM)": stats["ewm_fail_rate"] * 100,
+        "First Run": stats["first_ts"],
+        "Last Run": stats["last_ts"],
+    })
+
+
+def trend_series(bench_no, model, element, max_points=MAX_POINTS, path=DB_FILE):
+    # Run points of one element, averaged into at most max_points time
+    # buckets (with the bucket's min/max) when the history is longer
+    conn = _connect(path)
+    try:
+        where = "WHERE bench_no = ? AND model = ? AND element = ?"
+        params = (bench_no, model, element)
+        count, first, last = conn.execute(
+            f"SELECT COUNT(*), MIN(julianday(timestamp)), MAX(julianday(timestamp)) FROM trend_points {where}",
+            params).fetchone()
+        if count <= max_points or last == first:
+            query = (f"SELECT timestamp, abs_pct, abs_pct AS min_abs_pct, abs_pct AS max_abs_pct, fails, sets, "
+                     f"1 AS runs FROM trend_points {where} ORDER BY timestamp")
+            bucket_params = params
+        else:
+            width = (last - first) / max_points
+            query = (f"SELECT MIN(timestamp) AS timestamp, AVG(abs_pct) AS abs_pct, MIN(abs_pct) AS min_abs_pct, "
+                     f"MAX(abs_pct) AS max_abs_pct, SUM(fails) AS fails, SUM(sets) AS sets, COUNT(*) AS runs "
+                     f"FROM trend_points {where} "
+                     f"GROUP BY MIN(CAST((julianday(timestamp) - ?) / ? AS INTEGER), ?) ORDER BY 1")
+            bucket_params = params + (first, width, max_points - 1)
+        series = pd.read_sql_query(query, conn, params=bucket_params)
+    finally:
+        conn.close()
+    series["timestamp"] = pd.to_datetime(series["timestamp"])
+    return series
+
+
+def load_history(bench_no=None, model=None, start=None, end=None, columns=None, root=TREND_DIR):
+    # Raw per-set rows from the Parquet tree; partition filters skip
+    # every other bench/model/date directory
+    if not os.path.isdir(root):
+        return pd.DataFrame()
+    filters = []
+    if bench_no is not None:
+        filters.append(("bench_no", "==", str(bench_no)))
+    if model is not None:
+        filters.append(("model", "==", str(model)))
+    if start is not None:
+        filters.append(("date", ">=", str(start)))
+    if end is not None:
+        filters.append(("date", "<=", str(end)))
+    return pd.read_parquet(root, columns=columns, filters=filters or None, partitioning=PARTITIONING)
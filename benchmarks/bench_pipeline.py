@@ -0,0 +1,177 @@
+# Times each stage of the report pipeline on synthetic reports.
+#
+#   python benchmarks/bench_pipeline.py [--repeat 5] [--compare REF]
+#
+# Stages: read, parse, map (accuracy only), thresholds (index build and
+# lookup), score, summary and export (xlsx / csv / parquet). Results are
+# written to benchmarks/results/<commit>.json; --compare takes another
+# commit (or a results file) and prints the ratio per stage, so a
+# regression shows up as a ratio well above 1.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aps.export import write_csv, write_parquet, write_xlsx  # noqa: E402
+from aps.pipeline import (  # noqa: E402
+    accuracy_counts,
+    apply_sample_mapping,
+    auto_map_samples,
+    expected_samples,
+    parse_accuracy_report,
+    parse_stability_report,
+    score_accuracy_report,
+    score_stability_report,
+    stability_counts,
+)
+from aps.reference_data import load_workbook  # noqa: E402
+from aps.report_reader import read_report  # noqa: E402
+from aps.schema import display_frame  # noqa: E402
+from aps.synthetic import ELEMENTS, write_report  # noqa: E402
+from aps.thresholds import ThresholdIndex, find_precision_file  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+BASE = "Fe"
+MATRIX = "LAS"
+MODEL = "Metavision 10008X_A"
+
+# name, test, samples, elements, sets
+CASES = [
+    ("accuracy_6x30", "Accuracy", 6, 30, 1),
+    ("accuracy_40x60", "Accuracy", 40, 60, 1),
+    ("shortterm_8x30", "ShortTerm", 1, 30, 8),
+    ("longterm_16x60", "LongTerm", 1, 60, 16),
+]
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return result, {"median_ms": statistics.median(times) * 1000, "best_ms": min(times) * 1000}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def run_case(path, test, repeat, threshold_sheet):
+    stages = {}
+    with open(path, "rb") as f:
+        data = f.read()
+
+    df_raw, stages["read"] = timed(lambda: read_report(data), repeat)
+
+    if test == "Accuracy":
+        (parsed, _), stages["parse"] = timed(lambda: parse_accuracy_report(df_raw), repeat)
+        expected = [str(s).strip().upper() for s in expected_samples(BASE, MATRIX)]
+        imported = parsed["Sample Name"].unique().tolist()
+        (mapping, _), stages["map"] = timed(lambda: auto_map_samples(expected, imported), repeat)
+    else:
+        (parsed, _), stages["parse"] = timed(lambda: parse_stability_report(df_raw), repeat)
+
+    cert = pd.to_numeric(parsed["Cert. Val."], errors="coerce").to_numpy()
+    elements = parsed["Elements"].astype(str).str.replace(r"\s*\(.*\)", "", regex=True).to_numpy()
+    index, stages["thresholds"] = timed(lambda: ThresholdIndex(threshold_sheet), repeat)
+    _, lookup = timed(lambda: index.lookup(cert, elements), repeat)
+    stages["thresholds"] = {k: stages["thresholds"][k] + lookup[k] for k in lookup}
+
+    if test == "Accuracy":
+        (scored, acc, prec), stages["score"] = timed(
+            lambda: score_accuracy_report(apply_sample_mapping(parsed, mapping), BASE, mapping), repeat)
+        _, stages["summary"] = timed(
+            lambda: (acc.merge(prec, on="Elements", how="outer"), accuracy_counts(scored)), repeat)
+    else:
+        (scored, element_summary), stages["score"] = timed(
+            lambda: score_stability_report(parsed, BASE, index, test), repeat)
+        _, stages["summary"] = timed(lambda: stability_counts(element_summary), repeat)
+
+    for fmt, writer in (("xlsx", write_xlsx), ("csv", write_csv), ("parquet", write_parquet)):
+        _, stages[f"export_{fmt}"] = timed(lambda: writer(display_frame(scored)), repeat)
+
+    return {"rows": len(parsed), "stages": stages}
+
+
+def load_results(ref):
+    path = ref if os.path.isfile(ref) else os.path.join(RESULTS_DIR, f"{ref}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current, previous):
+    print(f"\nvs {previous['commit']}: current / previous median")
+    for name, case in current["cases"].items():
+        old = previous["cases"].get(name)
+        if old is None:
+            continue
+        ratios = []
+        for stage, timing in case["stages"].items():
+            if stage in old["stages"] and old["stages"][stage]["median_ms"]:
+                ratios.append(f"{stage} {timing['median_ms'] / old['stages'][stage]['median_ms']:.2f}")
+        print(f"{name:<16} " + "  ".join(ratios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the report pipeline stage by stage.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare", help="commit or results file to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    threshold_sheet = load_workbook(find_precision_file(MODEL), skiprows=[1])[BASE]
+    sample_names = expected_samples(BASE, MATRIX)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "repeat": args.repeat,
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, test, samples, elements, sets in CASES:
+            # Real sample names where there are enough, so auto mapping hits
+            names = sample_names if test == "Accuracy" and samples <= len(sample_names) else None
+            path = write_report(os.path.join(tmp, f"{name}.xlsx"), samples=samples, elements=ELEMENTS[:elements],
+                                sets=sets, sample_names=names, matrix=MATRIX)
+            results["cases"][name] = run_case(path, test, args.repeat, threshold_sheet)
+
+    print(f"{'case':<16} {'stage':<14} {'median ms':>10} {'best ms':>10}")
+    for name, case in results["cases"].items():
+        for stage, timing in case["stages"].items():
+            print(f"{name:<16} {stage:<14} {timing['median_ms']:>10.2f} {timing['best_ms']:>10.2f}")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {os.path.relpath(path, ROOT)}")
+
+    if args.compare:
+        compare(results, load_results(args.compare))
+
+
+if __name__ == "__main__":
+    main()
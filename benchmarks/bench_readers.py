@@ -0,0 +1,67 @@
+# Compares the report reader engines on representative reports.
+#
+#   python benchmarks/bench_readers.py [report.xlsx ...] [--repeat 5]
+#
+# Without arguments a 16-set stability-style report is generated in a
+# temporary folder. Each installed engine is timed on the same bytes, and
+# the CSV path on a CSV copy of the sheet.
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aps.report_reader import detect_format, excel_engines, read_excel_bytes, read_text_bytes  # noqa: E402
+from aps.synthetic import write_report  # noqa: E402
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare report reader engines.")
+    parser.add_argument("reports", nargs="*")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    reports = args.reports
+    tmp = None
+    if not reports:
+        tmp = tempfile.TemporaryDirectory()
+        reports = [os.path.join(tmp.name, "stability_16x40.xlsx")]
+        write_report(reports[0], samples=1, elements=40, sets=16, censored=0, missing_cert=0, missing_acceptance=0)
+
+    print(f"{'report':<28} {'engine':<10} {'median ms':>10} {'best ms':>10} {'rows':>6}")
+    for path in reports:
+        with open(path, "rb") as f:
+            data = f.read()
+        kind = detect_format(data)
+        name = os.path.basename(path)[:28]
+        if kind == "text":
+            median, best = timed(lambda: read_text_bytes(data), args.repeat)
+            print(f"{name:<28} {'text':<10} {median * 1000:>10.1f} {best * 1000:>10.1f} {len(read_text_bytes(data)):>6}")
+            continue
+
+        for engine in excel_engines(kind):
+            median, best = timed(lambda: read_excel_bytes(data, kind, engine), args.repeat)
+            rows = len(read_excel_bytes(data, kind, engine))
+            print(f"{name:<28} {engine:<10} {median * 1000:>10.1f} {best * 1000:>10.1f} {rows:>6}")
+
+        csv_data = read_excel_bytes(data, kind).to_csv(header=False, index=False).encode("utf-8")
+        median, best = timed(lambda: read_text_bytes(csv_data), args.repeat)
+        print(f"{name + ' (as CSV)':<28} {'text':<10} {median * 1000:>10.1f} {best * 1000:>10.1f} {'':>6}")
+
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# Rerun latency and throughput of the Streamlit app under concurrent operator sessions.
+#
+#   python benchmarks/bench_reruns.py [--concurrency 1,2,4,8] [--reruns 3] [--compare REF] [--max-p95-ms 2000]
+#
+# Every simulated operator is a streamlit.testing AppTest session. AppTest
+# swaps process-wide state (the runtime singleton and config) for the
+# length of a run, so two sessions cannot rerun at the same time in one
+# process: each session gets a worker process of its own. At each
+# concurrency level that many workers load the app (a warm-up session, so
+# imports and the reference data are not timed), wait for each other and
+# then all rerun at once, sharing the CPUs, the activity log database and
+# the trend store. A `streamlit run` server keeps its sessions in one
+# process whose script threads also share the GIL, so its own latency
+# under load can only be higher than what this measures with one process
+# per session.
+#
+# A session fills the sidebar form and checklist, opens the Accuracy page,
+# uploads a generated report (one sample name that needs a manual
+# mapping), switches that mapping and the result grid filters back and
+# forth, then opens the Stability page, uploads a LongTerm report and
+# changes the burns per set. Each session uploads its own reports, so the
+# per-content caches do not turn the reruns into cache hits.
+#
+# Reported per concurrency level: throughput (reruns per second over all
+# sessions, from the common start until the last session finishes),
+# p50 / p95 / p99 rerun time overall and per step (one AppTest run, i.e.
+# one script rerun of that session), and memory as resident-set growth
+# per session. Results are written to benchmarks/results/reruns_<commit>.json;
+# --compare takes another commit (or a results file) and prints the
+# throughput and p95 ratios per level. --max-p95-ms exits non-zero when
+# any step is slower at any level, as a regression check.
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The runs, trend points and metrics the sessions record always go to a
+# scratch folder, never the real stores; set before aps reads its
+# environment. Worker processes inherit the folder of the parent.
+SCRATCH = os.environ.get("APS_BENCH_SCRATCH")
+if SCRATCH is None:
+    SCRATCH = os.environ["APS_BENCH_SCRATCH"] = tempfile.mkdtemp(prefix="aps_bench_reruns_")
+    atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+for name, file_name in (("APS_LOG_DB", "aps_activity.db"), ("APS_TREND_DIR", "aps_trends"),
+                        ("APS_METRICS_FILE", "aps_metrics.jsonl")):
+    os.environ[name] = os.path.join(SCRATCH, file_name)
+
+from aps.pipeline import expected_samples  # noqa: E402
+from aps.synthetic import write_report  # noqa: E402
+from bench_pipeline import BASE, MATRIX, MODEL, RESULTS_DIR, git_commit, load_results  # noqa: E402
+from streamlit import config  # noqa: E402
+from streamlit.logger import set_log_level  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP = os.path.join(ROOT, "app.py")
+ACCURACY_PAGE = "pages/1_Accuracy_and_Precision.py"
+STABILITY_PAGE = "pages/2_Stability_Test.py"
+ELEMENTS = ["Fe", "C", "Si", "Mn", "P", "S", "Cr", "Ni", "Mo", "Cu", "Al", "V"]
+UNMAPPED = "UNKNOWN SAMPLE"
+
+
+def rss_kb():
+    # Current resident set size of this process (Linux)
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def write_reports(folder, session_no):
+    names = list(expected_samples(BASE, MATRIX))
+    accuracy = write_report(os.path.join(folder, f"accuracy_{session_no}.xlsx"), samples=len(names),
+                            elements=ELEMENTS, sample_names=names[:-1] + [UNMAPPED], matrix=MATRIX, seed=session_no)
+    stability = write_report(os.path.join(folder, f"stability_{session_no}.xlsx"), samples=1, sets=16,
+                             elements=ELEMENTS, matrix=MATRIX, seed=1000 + session_no)
+    with open(accuracy, "rb") as a, open(stability, "rb") as s:
+        return a.read(), s.read()
+
+
+class Session:
+    def __init__(self, session_no, reports, timeout):
+        self.session_no = session_no
+        self.accuracy_report, self.stability_report = reports
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.times = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def rerun(self, step):
+        started = time.perf_counter()
+        self.at.run()
+        self.times[step].append((time.perf_counter() - started) * 1000)
+        if len(self.at.exception):
+            self.errors[step] += 1
+
+    def steps(self, reruns):
+        # One rerun per step; the caller decides when the next one runs
+        self.rerun("open_app")
+        yield
+        # Elements go stale after a rerun, the sidebar is looked up again each time
+        self.at.sidebar.text_input[0].input(f"operator {self.session_no}")
+        self.at.sidebar.text_input[1].input(f"B{self.session_no}")
+        self.at.sidebar.selectbox[0].select(BASE)
+        self.rerun("form")
+        yield
+        self.at.sidebar.selectbox[1].select(MATRIX)
+        self.at.sidebar.selectbox[2].select(MODEL)
+        for box in self.at.checkbox:
+            box.check()
+        self.rerun("form")
+        yield
+
+        self.at.switch_page(ACCURACY_PAGE)
+        self.rerun("accuracy_open")
+        yield
+        self.at.file_uploader[0].upload("accuracy.xlsx", self.accuracy_report)
+        self.rerun("accuracy_upload")
+        yield
+        for i in range(reruns):
+            mapping = next((s for s in self.at.selectbox if str(s.key).startswith("map_")), None)
+            if mapping is not None:
+                mapping.select(mapping.options[-1] if i % 2 == 0 else mapping.options[0])
+                self.rerun("accuracy_mapping")
+                yield
+            self.at.checkbox(key="accuracy_grid_failing").set_value(i % 2 == 0)
+            self.rerun("accuracy_grid")
+            yield
+
+        self.at.switch_page(STABILITY_PAGE)
+        self.rerun("stability_open")
+        yield
+        self.at.radio(key="stab_type").set_value("LongTerm")
+        self.at.file_uploader[0].upload("stability.xlsx", self.stability_report)
+        self.rerun("stability_upload")
+        yield
+        for i in range(reruns):
+            self.at.number_input(key="stab_replicates").set_value(3 + (i + 1) % 2)
+            self.rerun("stability_statistics")
+            yield
+            self.at.selectbox(key="stability_grid_sort").select_index(1 + i % 2)
+            self.rerun("stability_grid")
+            yield
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return {f"p{p}_ms": float(np.percentile(values, p)) for p in (50, 95, 99)} | {"count": len(values)}
+
+
+def quiet():
+    # Each rerun would otherwise log the Arrow fallback of the mixed result columns
+    config.set_option("logger.level", "error")
+    set_log_level("error")
+
+
+def session_worker(session_no, reruns, timeout, start, results):
+    # One operator session in a process of its own; waits at start until
+    # every session of the level is warmed up
+    try:
+        os.chdir(ROOT)
+        quiet()
+        with tempfile.TemporaryDirectory() as tmp:
+            reports = write_reports(tmp, session_no)
+        for _ in Session(-1 - session_no, reports, timeout).steps(1):
+            pass
+        session = Session(session_no, reports, timeout)
+        rss_before = rss_kb()
+        start.wait()
+        for _ in session.steps(reruns):
+            pass
+        results.put({"times": dict(session.times), "errors": dict(session.errors),
+                     "rss_kb": rss_kb() - rss_before,
+                     "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    except Exception:
+        start.abort()
+        results.put({"failed": traceback.format_exc()})
+
+
+def run_level(concurrency, reruns, timeout):
+    # spawn: each worker starts with fresh Streamlit state, as a new session would
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Barrier(concurrency + 1)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=session_worker, args=(i, reruns, timeout, start, results), daemon=True)
+               for i in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    try:
+        start.wait()
+    except threading.BrokenBarrierError:
+        pass
+    started = time.perf_counter()
+    outcomes = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+
+    failed = [o["failed"] for o in outcomes if "failed" in o]
+    if failed:
+        raise RuntimeError(f"a session failed at concurrency {concurrency}:\n{failed[0]}")
+    steps, errors = defaultdict(list), defaultdict(int)
+    for outcome in outcomes:
+        for step, values in outcome["times"].items():
+            steps[step].extend(values)
+        for step, count in outcome["errors"].items():
+            errors[step] += count
+    reruns_total = sum(len(v) for v in steps.values())
+    return {
+        "concurrency": concurrency,
+        "reruns_per_session": reruns_total / concurrency,
+        "elapsed_s": elapsed,
+        "reruns_per_s": reruns_total / elapsed,
+        "rss_per_session_kb": sum(o["rss_kb"] for o in outcomes) / concurrency,
+        "peak_rss_kb": max(o["peak_rss_kb"] for o in outcomes),
+        "steps": {step: percentiles(values) for step, values in steps.items()},
+        "all": percentiles([v for values in steps.values() for v in values]),
+        "errors": dict(errors),
+    }
+
+
+def compare(current, previous):
+    print(f"\nvs {previous['commit']}: current / previous")
+    old_levels = {level["concurrency"]: level for level in previous["levels"]}
+    for level in current["levels"]:
+        old = old_levels.get(level["concurrency"])
+        if old and old["reruns_per_s"] and old["all"]["p95_ms"]:
+            print(f"  {level['concurrency']:>3} sessions: throughput {level['reruns_per_s'] / old['reruns_per_s']:.2f}"
+                  f"  p95 {level['all']['p95_ms'] / old['all']['p95_ms']:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time app reruns with operator sessions rerunning concurrently.")
+    parser.add_argument("--concurrency", default="1,2,4,8",
+                        help="sessions rerunning at once, one run per level (default: %(default)s)")
+    parser.add_argument("--reruns", type=int, default=3,
+                        help="mapping / filter changes per page (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=120,
+                        help="seconds allowed per rerun (default: %(default)s)")
+    parser.add_argument("--max-p95-ms", type=float, help="fail when any step's p95 rerun time is above this")
+    parser.add_argument("--compare", help="commit or results file to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+    try:
+        levels = sorted({int(c) for c in args.concurrency.split(",") if c.strip()})
+    except ValueError:
+        parser.error("--concurrency takes comma-separated session counts, e.g. 1,2,4,8")
+    if not levels or levels[0] < 1:
+        parser.error("--concurrency takes session counts of at least 1")
+
+    os.chdir(ROOT)
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "streamlit": st.__version__,
+        "cpus": os.cpu_count(),
+        "levels": [],
+    }
+    print(f"{'sessions':>8} {'reruns':>7} {'reruns/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'MB/session':>11}")
+    for concurrency in levels:
+        level = run_level(concurrency, args.reruns, args.timeout)
+        results["levels"].append(level)
+        t = level["all"]
+        print(f"{concurrency:>8} {t['count']:>7} {level['reruns_per_s']:>9.1f} {t['p50_ms']:>9.1f} "
+              f"{t['p95_ms']:>9.1f} {t['p99_ms']:>9.1f} {level['rss_per_session_kb'] / 1024:>11.1f}", flush=True)
+
+    print(f"\np95 ms per step at {', '.join(map(str, levels))} sessions")
+    for step in results["levels"][0]["steps"]:
+        row = " ".join(f"{level['steps'][step]['p95_ms']:>9.1f}" for level in results["levels"] if step in level["steps"])
+        print(f"{step:<22} {row}")
+    errors = {level["concurrency"]: level["errors"] for level in results["levels"] if level["errors"]}
+    if errors:
+        print(f"Reruns with an exception, per level: {errors}")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"reruns_{results['commit']}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {os.path.relpath(path, ROOT)}")
+
+    if args.compare:
+        compare(results, load_results(args.compare if os.path.isfile(args.compare) else f"reruns_{args.compare}"))
+
+    slow = sorted({f"{step} at {level['concurrency']}" for level in results["levels"]
+                   for step, t in level["steps"].items() if args.max_p95_ms and t["p95_ms"] > args.max_p95_ms})
+    if slow or errors:
+        print(f"\nFAILED: p95 above {args.max_p95_ms} ms in {', '.join(slow)}" if slow else "\nFAILED: reruns raised")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,40 @@
 # pages/1_Accuracy_and_Precision.py
 import streamlit as st
-import pandas as pd
-import numpy as np
-import os
-import json
-from difflib import get_close_matches
-import io
-TEMP_FILE = "temp_user_data.json"
+import hashlib
+from aps.activity_log import get_log
+from aps.certificates import certificate_panel
+from aps.export import download_result, export_bytes
+from aps.metrics import RunMetrics
+from aps.mapping_store import load_mappings, save_mappings
+from aps.pipeline import (
+    ACCURACY_COLUMNS,
+    NOT_FOUND,
+    accuracy_counts,
+    apply_sample_mapping,
+    auto_map_samples,
+    expected_samples,
+    mapping_table,
+    parse_accuracy_report,
+    remembered_matches,
+    score_accuracy_report,
+)
+from aps.reference_data import reference_version
+from aps.result_grid import ResultGrid, result_grid
+from aps.report_reader import UPLOAD_TYPES, read_report
+from aps.schema import display_frame
+from aps.session import load_context
+from aps.stages import input_key, show_stage_stats, stage_cache
 
 st.set_page_config(page_title="Accuracy and Precision", layout="wide")
 st.title("🧪 Accuracy & Precision Test")
 
 # Load user session
 def load_user_data():
-    try:
-        with open(TEMP_FILE, "r") as f:
-            return json.load(f)
-    except:
+    user_data = load_context()
+    if user_data is None:
         st.error("User data not found. Please complete the main form first.")
         st.stop()
+    return user_data
 
 user_data = load_user_data()
 base = user_data.get("base", "")
@@ -27,9 +43,7 @@ samples = []
 
 # Load expected samples
 try:
-    xls = pd.read_excel("Precision_tables/Database_base_matrix.xlsx", sheet_name=None)
-    if base in xls and matrix in xls[base].columns:
-        samples = xls[base][matrix].dropna().tolist()
+    samples = expected_samples(base, matrix)
 except Exception as e:
     st.error(f"Error loading base/matrix sample data: {e}")
     st.stop()
@@ -37,196 +51,83 @@ except Exception as e:
 sample_count = len(samples)
 st.info(f"🧾 Expected Samples: {sample_count}")
 
-# Upload Excel report
-uploaded_file = st.file_uploader("📤 Upload Excel Report", type=["xlsx", "xls"])
+# Upload report
+uploaded_file = st.file_uploader("📤 Upload Report (Excel / CSV)", type=UPLOAD_TYPES)
+
+# Each stage is memoized on its inputs, so a widget rerun only recomputes
+# the stages downstream of what changed
+metrics = RunMetrics("accuracy", user_data)
+stages = stage_cache("accuracy", metrics)
 
 if uploaded_file:
-    df_raw = pd.read_excel(uploaded_file, header=None)
+    report_bytes = uploaded_file.getvalue()
+    report_digest = hashlib.sha1(report_bytes).hexdigest()
+    df_raw = stages.run("read", [report_digest], read_report, report_bytes)
     st.success("Excel file uploaded successfully.")
     
-    sample_blocks = []
-    i = 0
-    found_samples = 0
-
-    while i < len(df_raw):
-        row = df_raw.iloc[i]
-        if isinstance(row[0], str) and "Sample Name" in row[0]:
-            found_samples += 1
-            parts = row[0].split("|")
-            sample_name = next((p.split(":")[1].strip() for p in parts if "sample name" in p.lower()), f"Sample_{found_samples}")
-
-            i += 1
-            headers = df_raw.iloc[i].tolist()
-            i += 1
-
-            block_data = []
-            while i < len(df_raw) and not df_raw.iloc[i].isnull().all():
-                block_data.append(df_raw.iloc[i].tolist())
-                i += 1
-
-            df_sample = pd.DataFrame(block_data, columns=headers)
-            df_sample["Sample Name"] = sample_name
-            sample_blocks.append(df_sample)
-        else:
-            i += 1
+    final_df, found_samples = stages.run("parse", [stages.key_of("read")], parse_accuracy_report, df_raw)
 
     if found_samples != sample_count:
         st.warning(f"Expected {sample_count} samples, but found {found_samples} samples.")
 
-    if not sample_blocks:
+    if final_df is None:
         st.error("No valid sample data found in uploaded file.")
         st.stop()
 
-    final_df = pd.concat(sample_blocks, ignore_index=True)
-
     # Sample name mapping
-    expected_samples = [str(s).strip().upper() for s in samples]
-    final_df["Sample Name"] = final_df["Sample Name"].astype(str).str.strip().str.upper()
+    expected_names = [str(s).strip().upper() for s in samples]
     imported_samples = final_df["Sample Name"].unique().tolist()
 
-    # Auto map or suggest
-    mapping = {}
-    manual_mapping_needed = {}
-    
-    for expected in expected_samples:
-        match = get_close_matches(expected, imported_samples, n=1, cutoff=0.9)
-        if match:
-            mapping[match[0]] = expected  # reverse: imported → expected
-        else:
-            manual_mapping_needed[expected] = None
-    
-    # Ask for manual mapping if needed
+    # Auto map or suggest (copied, the manual choices are added below)
+    mapping, manual_mapping_needed = stages.run(
+        "map", [stages.key_of("parse"), expected_names], auto_map_samples, expected_names, imported_samples
+    )
+    mapping = dict(mapping)
+
+    # Ask for manual mapping if needed; mappings confirmed on earlier uploads
+    # from this bench are preselected
     if manual_mapping_needed:
         st.warning("🔧 Some samples couldn't be auto-mapped. Please map them manually.")
-    
+
+        bench_no = user_data.get("bench_no", "")
+        remembered = remembered_matches(manual_mapping_needed, imported_samples, load_mappings(base, matrix, bench_no))
+        if remembered:
+            st.info(f"🧠 {len(remembered)} mapping(s) restored from earlier uploads on this bench.")
+
+        options = [NOT_FOUND] + imported_samples
+        confirmed = {}
         for expected in manual_mapping_needed:
             selected = st.selectbox(
                 f"Map expected sample '{expected}' to:",
-                options=["❌ Not Found"] + imported_samples,
+                options=options,
+                index=options.index(remembered[expected]) if expected in remembered else 0,
                 key=f"map_{expected}"
             )
-            if selected != "❌ Not Found":
+            if selected != NOT_FOUND:
                 mapping[selected] = expected  # Add to mapping
-    
-    # Apply mapping to final_df
-    final_df["Sample Name"] = final_df["Sample Name"].replace(mapping)
-    
+                confirmed[selected] = expected
+
+        if confirmed != {imported: expected for expected, imported in remembered.items()}:
+            save_mappings(base, matrix, bench_no, confirmed)
+
     # Display mapping table
-    df_mapping = pd.DataFrame({
-        "Expected Sample": expected_samples,
-        "Imported Sample": [next((k for k, v in mapping.items() if v == e), "❌ Not Found") for e in expected_samples]
-    })
+    df_mapping = mapping_table(expected_names, mapping)
     st.subheader("🔗 Sample Mapping")
     st.dataframe(df_mapping)
 
+    # Apply mapping, clean and score
+    def score(df):
+        return score_accuracy_report(apply_sample_mapping(df, mapping), base, mapping)
 
-    # Update names in final_df
-    final_df["Sample Name"] = final_df["Sample Name"].replace(mapping)
-
-    # Clean and compute
-    final_df["Elements"] = final_df["Elements"].str.replace(" (%)", "", regex=False).str.strip().str.capitalize()
-    base_name = base.strip().capitalize()
-    final_df = final_df[final_df["Elements"] != base_name]
-
-    # Remove outliers / placeholders
-    final_df = final_df[~final_df["Mean"].astype(str).str.contains("<|>")]
-    final_df["CV"] = final_df.apply(lambda row: row["Mean"] if str(row["Cert. Val."]).strip() == '-' else row["Cert. Val."], axis=1)
-    final_df["SD"] = pd.to_numeric(final_df["SD"], errors="coerce").fillna(0)
-    final_df["CertValNum"] = pd.to_numeric(final_df["Cert. Val."], errors="coerce")
-    final_df["DEV"] = (final_df["CertValNum"] - final_df["Mean"]).abs()
-
-    # Calculate Limits — Placeholder logic (to be updated based on precision matrix)
-    # Merge Acceptance columns if exact column not found
-    final_df["Acceptance"] = np.nan
-    for col in final_df.columns:
-        if col.startswith("Acceptance"):
-            temp = pd.to_numeric(final_df[col].replace("-", np.nan), errors="coerce")
-            if "2s" in col:
-                temp = temp / 2
-            elif "3s" in col:
-                temp = temp / 3
-            final_df["Acceptance"] = final_df["Acceptance"].combine_first(temp)
-    
-    final_df["A_Limit"] = pd.to_numeric(final_df["Acceptance"], errors="coerce")
-    final_df["P_Limit"] = final_df["CV"].astype(float) * 0.05  # ← update with real lookup
-
-    # Accuracy and Precision
-    final_df["A_Result"] = final_df.apply(
-        lambda row: "Pass" if pd.notna(row["DEV"]) and pd.notna(row["A_Limit"]) and row["DEV"] <= row["A_Limit"] else "Fail",
-        axis=1
-    )
-
-    final_df["P_Result"] = final_df.apply(
-        lambda row: "Pass" if pd.notna(row["SD"]) and pd.notna(row["P_Limit"]) and row["SD"] <= row["P_Limit"] else "Fail",
-        axis=1
+    final_df, accuracy_summary, precision_summary = stages.run(
+        "score", [stages.key_of("parse"), sorted(mapping.items()), base, reference_version()], score, final_df
     )
-    final_df["%DEV_A"] = ((final_df["DEV"] / final_df["A_Limit"]) * 100).round(2)
-    final_df["%DEV_P"] = ((final_df["SD"] / final_df["P_Limit"]) * 100).round(2)
-    final_df["%DEV_A"] = final_df["%DEV_A"].replace("None", pd.NA)
-    final_df["%DEV_P"] = final_df["%DEV_P"].replace("None", pd.NA)
-    
-    # Update A_Result to 'NA' where %DEV_A is missing
-    final_df.loc[final_df["%DEV_A"].isna(), "A_Result"] = "NA"
-    
-    # Update P_Result to 'NA' where %DEV_P is missing
-    final_df.loc[final_df["%DEV_P"].isna(), "P_Result"] = "NA"
-    
-    # Count valid samples for Accuracy and Precision
-    accuracy_counts = final_df[final_df["%DEV_A"].notna()].groupby("Elements").size().reset_index(name="Sample_Count")
-    precision_counts = final_df[final_df["%DEV_P"].notna()].groupby("Elements").size().reset_index(name="Sample_Count")
-    
-        # Use your existing summarization
-    def summarize_accuracy(group):
-        # Skip if all are missing
-        if (group["Cert. Val."] == "-").all():
-            return "NA"
-    
-        # Filter out NA rows before checking
-        filtered = group[group["A_Result"] != "NA"]
-    
-        if filtered.empty:
-            return "NA"
-    
-        return "Pass" if (filtered["A_Result"] == "Pass").all() else "Fail"
-    
-        
-    def summarize_precision(group):
-        if (group["Acceptance"] == "-").all():
-            return "NA"
-    
-        filtered = group[group["P_Result"] != "NA"]
-    
-        if filtered.empty:
-            return "NA"
-    
-        return "Pass" if (filtered["P_Result"] == "Pass").all() else "Fail"
-
-    
-    accuracy_summary = final_df.groupby("Elements").apply(summarize_accuracy).reset_index()
-    accuracy_summary.columns = ["Elements", "Accuracy_Result"]
-    
-    precision_summary = final_df.groupby("Elements").apply(summarize_precision).reset_index()
-    precision_summary.columns = ["Elements", "Precision_Result"]
-    
-    # Normalize element names
-    accuracy_summary["Elements"] = accuracy_summary["Elements"].str.title()
-    precision_summary["Elements"] = precision_summary["Elements"].str.title()
-    accuracy_counts["Elements"] = accuracy_counts["Elements"].str.title()
-    precision_counts["Elements"] = precision_counts["Elements"].str.title()
-    
-    # Merge counts into summary
-    accuracy_summary = accuracy_summary.merge(accuracy_counts, on="Elements", how="left")
-    precision_summary = precision_summary.merge(precision_counts, on="Elements", how="left")
-    
-    # Fill missing counts
-    accuracy_summary["Sample_Count"] = accuracy_summary["Sample_Count"].fillna(0).astype(int)
-    precision_summary["Sample_Count"] = precision_summary["Sample_Count"].fillna(0).astype(int)
 
-    
-    
     # Merge summaries on Elements
-    summary_table = accuracy_summary.merge(precision_summary, on="Elements", how="outer")
-    
+    def summarize():
+        return accuracy_summary.merge(precision_summary, on="Elements", how="outer"), accuracy_counts(final_df)
+
+    summary_table, counts = stages.run("summarize", [stages.key_of("score")], summarize)
 
     st.subheader("📋 Accuracy Summary Table")
     st.dataframe(accuracy_summary)
@@ -234,49 +135,41 @@ if uploaded_file:
     st.subheader("📋 Precision Summary Table")
     st.dataframe(precision_summary)
     
-
-
-    # Filter out rows with NaN in %DEV_A and %DEV_P
-    valid_accuracy = final_df[final_df["%DEV_A"].notna()]
-    valid_precision = final_df[final_df["%DEV_P"].notna()]
-    
-    # Count only valid and "Pass" entries
-    accuracy_pass_count = valid_accuracy[valid_accuracy["A_Result"] == "Pass"].shape[0]
-    precision_pass_count = valid_precision[valid_precision["P_Result"] == "Pass"].shape[0]
-    
-    # Total valid counts
-    accuracy_total = valid_accuracy.shape[0]
-    precision_total = valid_precision.shape[0]
-    
     # Show metrics
     colA1, colA2 = st.columns(2)
     with colA1:
-        st.metric("Accuracy Pass", f"{accuracy_pass_count} / {accuracy_total}")
+        st.metric("Accuracy Pass", f"{counts['accuracy_pass']} / {counts['accuracy_total']}")
     with colA2:
-        st.metric("Precision Pass", f"{precision_pass_count} / {precision_total}")
+        st.metric("Precision Pass", f"{counts['precision_pass']} / {counts['precision_total']}")
 
+    get_log().log_run(
+        user_data, "Accuracy", uploaded_file.name, report_digest,
+        counts["accuracy_pass"] + counts["precision_pass"], counts["accuracy_total"] + counts["precision_total"],
+        {"counts": counts, "elements": summary_table.to_dict(orient="records")},
+    )
 
-    st.dataframe(final_df[["Sample Name", "Elements", "Mean", "Cert. Val.", "DEV", "A_Limit", "%DEV_A", "A_Result", "SD", "P_Limit", "%DEV_P", "P_Result"]])
 
-    with st.expander("📥 Download Final Result as Excel"):
-        
+    # Only the visible page of rows is sent to the browser
+    grid = stages.run("grid", [stages.key_of("score")], ResultGrid, final_df, ACCURACY_COLUMNS,
+                      ["A_Result", "P_Result"], "Sample Name", ["%DEV_A", "%DEV_P"])
+    result_grid(grid, "accuracy_grid", "Sample")
 
-        # Create a BytesIO buffer
-        buffer = io.BytesIO()
-        
-        # Write the DataFrame to the buffer
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            final_df.to_excel(writer, index=False)
-        
-        # Rewind the buffer
-        buffer.seek(0)
-        
-        # Show the download button
-        st.download_button(
-            label="Download .xlsx",
-            data=buffer,
-            file_name="APS_AccuracyPrecision_Result.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    with st.expander("📥 Download Final Result"):
+        result_key = stages.key_of("score")
+        download_result(
+            final_df, "APS_AccuracyPrecision_Result", key="accuracy_result",
+            build=lambda fmt: stages.run("export", [result_key, fmt], export_bytes, final_df, fmt, result_key),
         )
 
+    with st.expander("📄 Certificate"):
+        certificate_panel(
+            input_key(stages.key_of("score"), user_data), "APS_AccuracyPrecision_Certificate",
+            "Accuracy & Precision Certificate", user_data,
+            {"Accuracy Pass": f"{counts['accuracy_pass']} / {counts['accuracy_total']}",
+             "Precision Pass": f"{counts['precision_pass']} / {counts['precision_total']}"},
+            [("Accuracy Summary", accuracy_summary), ("Precision Summary", precision_summary),
+             ("Results", display_frame(final_df, ACCURACY_COLUMNS))],
+        )
 
+    metrics.finish()
+    show_stage_stats(stages)
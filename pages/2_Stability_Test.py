@@ -1,54 +1,38 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import os
-import json
-from io import BytesIO
-from datetime import datetime
-from io import BytesIO
-import io
+import hashlib
+from aps.activity_log import get_log
+from aps.certificates import certificate_panel
+from aps.comparison import compare_tables, precision_tables
+from aps.export import download_result, export_bytes
+from aps.metrics import RunMetrics
+from aps.pipeline import (
+    STABILITY_COLUMNS,
+    ReportError,
+    check_set_count,
+    parse_stability_reports,
+    score_stability_report,
+    stability_counts,
+)
+from aps.reference_data import load_excluded_elements, reference_version
+from aps.result_grid import ResultGrid, result_grid
+from aps.report_reader import UPLOAD_TYPES, read_reports
+from aps.schema import display_frame
+from aps.session import load_context
+from aps.stability_stats import REPLICATES, stability_statistics
+from aps.stages import input_key, show_stage_stats, stage_cache
+from aps.thresholds import load_threshold_index
+from aps.trend_store import record_stability_run, trend_run_key
 
 st.set_page_config(page_title="Stability Test", layout="wide")
 st.title("📈 Stability Test (Short / Long Term)")
 
-TEMP_FILE = "temp_user_data.json"
-
 # Load saved user data
-@st.cache_data
 def load_user_data():
-    try:
-        with open(TEMP_FILE, "r") as f:
-            return json.load(f)
-    except:
+    user_data = load_context()
+    if user_data is None:
         st.error("User info not found. Please complete setup from main page.")
         st.stop()
-
-def load_precision_table(model_name, base_name):
-    folder = "Precision_tables"
-    model_parts = model_name.split()
-    if len(model_parts) < 2:
-        return None
-    raw_model_code = model_parts[1]
-    core_model_code = raw_model_code.split("_")[0]
-
-    for file in os.listdir(folder):
-        if file.startswith("Precision_figures") and core_model_code in file and file.endswith(".xlsx"):
-            df = pd.read_excel(os.path.join(folder, file), sheet_name=base_name, skiprows=[1])
-            df.columns = df.columns.str.strip()
-            df.iloc[:, 0] = pd.to_numeric(df.iloc[:, 0], errors='coerce')
-            return df
-    return None
-
-def lookup_threshold(cert_val, element, df_table):
-    try:
-        cert_val = float(cert_val)
-    except:
-        return None
-    col = element.strip()
-    filtered = df_table[df_table[df_table.columns[0]] >= cert_val]
-    if not filtered.empty and col in df_table.columns:
-        return filtered.iloc[0][col]
-    return None
+    return user_data
 
 user_data = load_user_data()
 base = user_data["base"]
@@ -60,142 +44,116 @@ lsd = user_data["lsd"]
 st.markdown(f"**User:** {username} | **Bench No:** {user_data['bench_no']} | **Model:** {model} | **LSD:** {lsd}")
 
 st.radio("Select Stability Type", ["ShortTerm", "LongTerm"], horizontal=True, key="stab_type")
-uploaded_file = st.file_uploader("Upload Stability Report (Excel)", type=["xlsx", "xls"])
-
-if uploaded_file:
-    df_raw = pd.read_excel(uploaded_file, header=None)
-    st.success("Stability report loaded.")
-
-    precision_df = load_precision_table(model, base)
-    if precision_df is None:
+# Sets exported as separate files can be uploaded together and are scored as one run
+uploaded_files = st.file_uploader("Upload Stability Report(s) (Excel / CSV)", type=UPLOAD_TYPES,
+                                  accept_multiple_files=True)
+
+metrics = RunMetrics("stability", user_data)
+stages = stage_cache("stability", metrics)
+
+if uploaded_files:
+    # Identical files are read once
+    reports = {}
+    for f in uploaded_files:
+        reports.setdefault(hashlib.sha1(f.getvalue()).hexdigest(), f)
+    digests = list(reports)
+    report_name = ", ".join(f.name for f in reports.values())
+    report_digest = digests[0] if len(digests) == 1 else hashlib.sha1("".join(sorted(digests)).encode()).hexdigest()
+
+    raw_reports = stages.run("read", digests, read_reports, [f.getvalue() for f in reports.values()])
+    if len(reports) == 1:
+        st.success("Stability report loaded.")
+    else:
+        skipped = len(uploaded_files) - len(reports)
+        st.success(f"{len(reports)} stability reports loaded" + (f", {skipped} duplicate file(s) skipped." if skipped else "."))
+
+    threshold_index = stages.run("thresholds", [model, base, reference_version()], load_threshold_index, model, base)
+    if threshold_index is None:
         st.error("Matching precision threshold file not found.")
         st.stop()
 
-    blocks = []
-    i = 0
-    while i < len(df_raw):
-        row = df_raw.iloc[i]
-        if isinstance(row[0], str) and "Sample Name" in row[0]:
-            parts = row[0].split("|")
-            sample_o = parts[3].split(":")[1].strip()
-            matrix_o = parts[1].split(":")[1].strip()
-
-            i += 1
-            headers = df_raw.iloc[i].tolist()
-            i += 1
-            data = []
-            while i < len(df_raw) and not df_raw.iloc[i].isnull().all():
-                data.append(df_raw.iloc[i].tolist())
-                i += 1
-            df_block = pd.DataFrame(data, columns=headers)
-            df_block["Elements"] = df_block["Elements"].str.replace(" (%)", "", regex=False).str.strip().str.capitalize()
-
-            # Clean
-            df_block = df_block[~df_block["Mean"].astype(str).str.contains("<|>")]
-            df_block["CV"] = df_block.apply(lambda row: row["Mean"] if row["Cert. Val."] == '-' else row["Cert. Val."], axis=1)
-            df_block["SD"] = pd.to_numeric(df_block["SD"], errors="coerce").fillna(0)
-            df_block["CertValNum"] = pd.to_numeric(df_block["Cert. Val."], errors="coerce")
-            df_block["DEV"] = (df_block["CertValNum"] - df_block["Mean"]).abs()
-
-            # Merge Acceptance
-            df_block["Acceptance"] = np.nan
-            for col in [c for c in df_block.columns if c.startswith("Acceptance")]:
-                temp = pd.to_numeric(df_block[col].replace("-", np.nan), errors="coerce")
-                if "2s" in col:
-                    temp = temp / 2
-                elif "3s" in col:
-                    temp = temp / 3
-                df_block["Acceptance"] = df_block["Acceptance"].combine_first(temp)
-            df_block["S_Limit"] = pd.to_numeric(df_block["Acceptance"], errors="coerce")
-
-            set_number = len(blocks) + 1
-            df_block.insert(0, "Set", f"{set_number}")
-            blocks.append(df_block)
-        else:
-            i += 1
-
-    expected_sets = 8 if st.session_state.stab_type == "ShortTerm" else 16
-    if len(blocks) != expected_sets:
-        st.error(f"{st.session_state.stab_type} Stability requires exactly {expected_sets} sets. Found {len(blocks)}.")
-        st.stop()
-
-    final_df = pd.concat(blocks, ignore_index=True)
-    base_name = base.strip().capitalize()
-    final_df = final_df[final_df["Elements"].str.capitalize() != base_name]
-
-    final_df["CV"] = pd.to_numeric(final_df["CV"], errors="coerce")
-    final_df["S_Limit0"] = final_df.apply(lambda row: lookup_threshold(row["CV"], row["Elements"], precision_df), axis=1)
-    final_df["S_Limit"] = np.where(final_df["S_Limit"].isna(), final_df["S_Limit0"], final_df["S_Limit"])
-
-    # Excluded Elements
-    excluded_elements = []
-    with open("Precision_tables/Exluded_Elements.txt", "r") as file:
-        excluded_elements = [e.strip().upper() for e in file.read().split(",") if e.strip()]
-
-    # Apply multiplier
-    multiplier = 1.5 if st.session_state.stab_type == "ShortTerm" else 3
-    final_df["Elements"] = final_df["Elements"].str.upper()
-    final_df["S_Limit"] = final_df.apply(
-        lambda row: row["S_Limit"] * 3 if row["Elements"] in excluded_elements else row["S_Limit"] * multiplier,
-        axis=1
+    final_df, set_count = stages.run(
+        "parse", [stages.key_of("read")], parse_stability_reports, [df_raw for _, df_raw in raw_reports]
     )
 
-    final_df["%DEV_S"] = final_df.apply(
-        lambda row: round((row["DEV"] / row["S_Limit"]) * 100, 2) if pd.notna(row["DEV"]) and pd.notna(row["S_Limit"]) else None,
-        axis=1
-    )
+    parsed_df = final_df
+
+    try:
+        check_set_count(st.session_state.stab_type, set_count)
+    except ReportError as e:
+        st.error(str(e))
+        st.stop()
 
-    final_df["S_Result"] = final_df.apply(
-        lambda row: "Pass" if pd.notna(row["DEV"]) and row["DEV"] <= row["S_Limit"] else "Fail"
-        if pd.notna(row["DEV"]) else "NA",
-        axis=1
+    # Precision-table limits, ShortTerm/LongTerm and excluded-element multipliers
+    final_df, element_summary = stages.run(
+        "score", [stages.key_of("parse"), base, model, st.session_state.stab_type, reference_version()],
+        score_stability_report, final_df, base, threshold_index, st.session_state.stab_type,
     )
 
-    # Group Summary
-    def summarize_stability(group):
-        if (group["Cert. Val."] == "-").all():
-            return "NA"
-        return "Pass" if (group["S_Result"] == "Pass").all() else "Fail"
-
-    filtered_df = final_df[~final_df['Cert. Val.'].astype(str).str.contains("-", na=False)]
-    element_summary = filtered_df.groupby("Elements").apply(summarize_stability).reset_index()
-    element_summary.columns = ["Elements", "Stability_Result"]
-    element_summary["Elements"] = element_summary["Elements"].str.title()
-    final_df["Elements"] = final_df["Elements"].str.capitalize()
     st.subheader("📋 Stability Result Summary")
-    stability_pass_count = element_summary[element_summary["Stability_Result"] == "Pass"].shape[0]
-    stability_total = element_summary[element_summary["Stability_Result"].isin(["Pass", "Fail"])].shape[0]
+    counts = stages.run("summarize", [stages.key_of("score")], stability_counts, element_summary)
     
 
     colS1, _ = st.columns(2)
     with colS1:
-        st.metric("Stability Pass", f"{stability_pass_count} / {stability_total}")
+        st.metric("Stability Pass", f"{counts['stability_pass']} / {counts['stability_total']}")
     
+    get_log().log_run(
+        user_data, st.session_state.stab_type, report_name, report_digest,
+        counts["stability_pass"], counts["stability_total"],
+        {"counts": counts, "elements": element_summary.to_dict(orient="records")},
+    )
+
+    # Keep the per-set rows for the trend page
+    stages.run(
+        "trend", [stages.key_of("score"), user_data.get("bench_no")], record_stability_run,
+        user_data, st.session_state.stab_type, trend_run_key(user_data, st.session_state.stab_type, report_digest),
+        final_df,
+    )
+
     # Show Stability result table
     st.dataframe(element_summary)
 
+    # Repeatability within a set vs drift between sets, per element
+    st.subheader("📐 Stability Statistics")
+    replicates = st.number_input("Burns per set (n)", min_value=2, value=REPLICATES, step=1, key="stab_replicates")
+    statistics = stages.run("statistics", [stages.key_of("score"), replicates], stability_statistics, final_df, replicates)
+    st.dataframe(statistics)
+
     # Show full results with option to download
     st.subheader("📋 Stability Summary Table")
-    st.dataframe(final_df[[
-    "Set", "Elements", "Mean", "Cert. Val.", 
-    "DEV", "S_Limit", "%DEV_S", "S_Result" 
-]])
-
-    
-    # Step 1: Create the in-memory buffer
-    buffer = io.BytesIO()
-    
-    # Step 2: Write the DataFrame to Excel using openpyxl
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        final_df.to_excel(writer, index=False)
-    
-    # Step 3: Rewind the buffer to the beginning
-    buffer.seek(0)
-    
-    # Step 4: Create download button
-    st.download_button(
-        label="Download .xlsx",
-        data=buffer,
-        file_name="APS_Stability_Result.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    grid = stages.run("grid", [stages.key_of("score")], ResultGrid, final_df, STABILITY_COLUMNS,
+                      ["S_Result"], "Set", ["%DEV_S"])
+    result_grid(grid, "stability_grid", "Set")
+
+    # The xlsx workbook carries the statistics as a second sheet
+    result_key = input_key(stages.key_of("score"), stages.key_of("statistics"))
+    download_result(
+        final_df, "APS_Stability_Result", key="stability_result",
+        build=lambda fmt: stages.run("export", [result_key, fmt], export_bytes, final_df, fmt, result_key,
+                                     [("Statistics", statistics)]),
     )
+
+    with st.expander("📄 Certificate"):
+        certificate_panel(
+            input_key(stages.key_of("statistics"), user_data), "APS_Stability_Certificate",
+            f"Stability Test Certificate ({st.session_state.stab_type})", user_data,
+            {"Stability Pass": f"{counts['stability_pass']} / {counts['stability_total']}"},
+            [("Stability Result Summary", element_summary), ("Stability Statistics", statistics),
+             ("Results per Set", display_frame(final_df, STABILITY_COLUMNS))],
+        )
+
+    # The same report against every model/base precision table, both regimes
+    with st.expander("🔀 Compare Precision Tables"):
+        report_limits = st.checkbox("Use the report's acceptance where given", value=True, key="compare_report_limits")
+        if st.toggle("Score against every precision table", key="compare_tables"):
+            verdict_matrix, table_counts = stages.run(
+                "compare", [stages.key_of("parse"), base, report_limits, reference_version()],
+                lambda: compare_tables(parsed_df, base, precision_tables(), load_excluded_elements(), report_limits),
+            )
+            st.dataframe(table_counts, hide_index=True)
+            st.dataframe(verdict_matrix, hide_index=True)
+            download_result(verdict_matrix, "APS_Stability_Comparison", key="stability_compare")
+
+    metrics.finish()
+    show_stage_stats(stages)
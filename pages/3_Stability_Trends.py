@@ -0,0 +1,44 @@
+import streamlit as st
+from aps.session import load_context
+from aps.trend_store import load_history, rolling_stats, trend_benches, trend_series
+
+st.set_page_config(page_title="Stability Trends", layout="wide")
+st.title("📉 Stability Trends")
+
+benches = trend_benches()
+if not benches:
+    st.info("No stability runs stored yet. Scored reports from the Stability Test page appear here.")
+    st.stop()
+
+# Start on the operator's own bench if the main form was filled in
+user_data = load_context() or {}
+current = (str(user_data.get("bench_no", "")), str(user_data.get("model", "")))
+bench, model = st.selectbox(
+    "Bench / Model", benches, index=benches.index(current) if current in benches else 0,
+    format_func=lambda pair: f"{pair[0]} | {pair[1]}",
+)
+
+stats = rolling_stats(bench, model)
+st.subheader("📋 Rolling Statistics per Element")
+st.dataframe(stats, hide_index=True)
+
+element = st.selectbox("Element", stats["Elements"].tolist())
+series = trend_series(bench, model, element)
+
+st.subheader(f"📈 |%DEV_S| of {element}")
+if series["runs"].gt(1).any():
+    st.caption(f"Long history: {int(series['runs'].sum())} runs averaged into {len(series)} points "
+               "(band shows each point's min and max).")
+st.line_chart(series.set_index("timestamp")[["abs_pct", "min_abs_pct", "max_abs_pct"]].rename(columns={
+    "abs_pct": "Mean |%DEV_S|", "min_abs_pct": "Min", "max_abs_pct": "Max",
+}))
+st.bar_chart(series.set_index("timestamp")[["fails"]].rename(columns={"fails": "Failed Sets"}))
+
+with st.expander("🔎 Per-set rows"):
+    first, last = series["timestamp"].min().date(), series["timestamp"].max().date()
+    dates = st.date_input("Dates", (max(first, last.replace(day=1)), last), min_value=first, max_value=last)
+    start, end = dates if len(dates) == 2 else (dates[0], dates[0])  # while a range is being picked
+    history = load_history(bench, model, start=start, end=end,
+                           columns=["timestamp", "stab_type", "set", "element", "mean", "cert", "dev", "s_limit",
+                                    "pct_dev_s", "fail"])
+    st.dataframe(history[history["element"] == element] if not history.empty else history, hide_index=True)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tests import the app's shared code as the pages do, from the repo root,
+# and the reference data paths are relative to it, as when the app runs
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,63 @@
+import csv
+import io
+import sqlite3
+
+from aps.activity_log import ActivityLog
+
+
+def test_export_csv_streams_the_filtered_log(tmp_path):
+    log = ActivityLog(str(tmp_path / "log.db"))
+    for i in range(12):
+        log.log_activity({"username": f"op{i % 3}", "bench_no": "B1"})
+    log.flush()
+
+    with log.export_csv(username="op1") as f:
+        data = f.read()
+    assert data == "".join(log.iter_csv(username="op1")).encode("utf-8")
+    rows = list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+    assert len(rows) == 4 and {r["username"] for r in rows} == {"op1"}
+
+
+def failing_writes(monkeypatch, failures):
+    write_batch = ActivityLog._write_batch
+    calls = []
+
+    def flaky(self, conn, batch):
+        calls.append(len(batch))
+        if len(calls) <= failures:
+            raise sqlite3.OperationalError("database is locked")
+        write_batch(self, conn, batch)
+
+    monkeypatch.setattr(ActivityLog, "_write_batch", flaky)
+    return calls
+
+
+def count_activity(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM activity").fetchone()[0]
+
+
+def test_failed_batch_is_retried(tmp_path, monkeypatch):
+    path = str(tmp_path / "log.db")
+    calls = failing_writes(monkeypatch, failures=1)
+    log = ActivityLog(path)
+    log.log_activity({"username": "op1"})
+    assert log.flush()
+    assert len(calls) == 2 and log.dropped == 0
+    assert count_activity(path) == 1
+
+
+def test_failing_batch_is_dropped_and_the_writer_keeps_going(tmp_path, monkeypatch):
+    path = str(tmp_path / "log.db")
+    failing_writes(monkeypatch, failures=2)
+    log = ActivityLog(path)
+    log.log_activity({"username": "op1"})
+    log.log_activity({"username": "op2"})
+    # The flush is released even though its batch was dropped
+    assert log.flush(timeout=5)
+    assert log.dropped == 2
+
+    log.log_activity({"username": "op3"})
+    assert log.flush(timeout=5)
+    assert log._writer.is_alive()
+    assert count_activity(path) == 1
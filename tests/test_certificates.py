@@ -0,0 +1,35 @@
+import time
+
+from aps.certificates import CertificateJobs
+
+
+def wait_for(jobs, key):
+    for _ in range(500):
+        if jobs.status(key) != "running":
+            return jobs.status(key)
+        time.sleep(0.01)
+    raise AssertionError(f"{key} still running")
+
+
+def fail():
+    raise ValueError("no logo")
+
+
+def test_failed_job_can_be_retried():
+    jobs = CertificateJobs()
+    assert jobs.submit("a", fail)
+    assert wait_for(jobs, "a") == "failed"
+    assert jobs.error("a") == "ValueError: no logo"
+
+    assert jobs.submit("a", lambda: b"%PDF")
+    assert wait_for(jobs, "a") == "done"
+    assert jobs.error("a") is None
+    assert jobs.result("a") == b"%PDF"
+
+
+def test_errors_are_bounded():
+    jobs = CertificateJobs(max_errors=3)
+    for key in range(5):
+        jobs.submit(key, fail)
+        wait_for(jobs, key)
+    assert [jobs.status(key) for key in range(5)] == [None, None, "failed", "failed", "failed"]
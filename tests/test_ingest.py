@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+
+import pytest
+
+import aps.ingest as ingest
+from aps import activity_log
+from aps.synthetic import write_report
+
+MODEL = "Metavision 10008X_A"
+ingest_report = ingest.ingest_report
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(activity_log, "_log", activity_log.ActivityLog(str(tmp_path / "log.db")))
+    watch = tmp_path / "watch"
+    watch.mkdir()
+    write_report(str(watch / "accuracy.xlsx"), samples=2, elements=["Fe", "C", "Si"], matrix="LAS")
+    write_report(str(watch / "stability.xlsx"), samples=1, sets=8, elements=["Fe", "C", "Si"], matrix="LAS")
+    return str(watch), str(tmp_path / "out"), str(tmp_path / "log.db")
+
+
+def ingest_once(folders, **defaults):
+    watch, out, db = folders
+    return ingest.Ingestor(watch, out, defaults, workers=1, path=db).run(interval=0.05, once=True)
+
+
+def test_failed_report_is_retried_after_restart(folders):
+    # Without a model the stability report fails and is not marked as done
+    assert ingest_once(folders) == {"scored": 1, "errors": 1, "duplicates": 0}
+    assert ingest_once(folders, model=MODEL) == {"scored": 1, "errors": 0, "duplicates": 0}
+    assert ingest_once(folders, model=MODEL) == {"scored": 0, "errors": 0, "duplicates": 0}
+
+
+def crash_on_stability(path, digest, out_dir, defaults):
+    if "stability" in os.path.basename(path):
+        os._exit(1)
+    return ingest_report(path, digest, out_dir, defaults)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the patched worker needs fork")
+def test_worker_crash_is_recorded_and_the_pool_replaced(folders, monkeypatch):
+    monkeypatch.setattr(ingest, "ingest_report", crash_on_stability)
+    stats = ingest_once(folders, model=MODEL)
+    assert stats == {"scored": 1, "errors": 1, "duplicates": 0}
+
+    conn = ingest._connect(folders[2])
+    try:
+        rows = dict(conn.execute("SELECT report, status FROM ingest_reports").fetchall())
+    finally:
+        conn.close()
+    assert rows["accuracy.xlsx"] == "OK"
+    assert rows["stability.xlsx"].startswith("Error:")
+
+
+def test_unreadable_report_is_recorded_and_once_finishes(folders, monkeypatch):
+    def locked(path):
+        if "stability" in os.path.basename(path):
+            raise PermissionError(13, "Permission denied", path)
+        return digest(path)
+
+    digest = ingest.file_digest
+    monkeypatch.setattr(ingest, "file_digest", locked)
+    stats = ingest_once(folders, model=MODEL)
+    assert stats == {"scored": 1, "errors": 1, "duplicates": 0}
+
+    conn = ingest._connect(folders[2])
+    try:
+        rows = dict(conn.execute("SELECT report, status FROM ingest_reports").fetchall())
+    finally:
+        conn.close()
+    assert rows["stability.xlsx"].startswith("Error:")
+
+    # Readable again: not done, so a restart scores it
+    monkeypatch.setattr(ingest, "file_digest", digest)
+    assert ingest_once(folders, model=MODEL) == {"scored": 1, "errors": 0, "duplicates": 0}
@@ -0,0 +1,38 @@
+import json
+
+from aps.metrics import RunMetrics
+
+
+def lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+def test_fully_cached_rerun_is_not_written(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = RunMetrics("stability", path=str(path), trace_memory=False)
+    with metrics.stage("parse") as record:
+        record["cached"] = True
+    metrics.finish()
+    assert lines(path) == []
+
+    metrics = RunMetrics("stability", path=str(path), trace_memory=False)
+    with metrics.stage("parse") as record:
+        record["cached"] = True
+    with metrics.stage("score"):
+        pass
+    metrics.finish()
+    [run] = lines(path)
+    assert [s["stage"] for s in run["stages"]] == ["parse", "score"]
+    assert run["stages"][1]["peak_kb"] is None
+
+
+def test_stage_after_finish(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = RunMetrics("accuracy", path=str(path), trace_memory=False)
+    metrics.finish()
+    with metrics.stage("export") as record:
+        record["cached"] = True
+    assert lines(path) == []
+    with metrics.stage("export"):
+        pass
+    assert [run["stages"][0]["stage"] for run in lines(path)] == ["export"]
@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from aps import reference_data
+from aps.reference_data import compile_workbook, load_compiled_workbook, write_compiled
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "Thresholds.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"Element": ["C", "Si"], 0.1: [0.01, 0.02]}).to_excel(writer, sheet_name="Fe", index=False)
+        pd.DataFrame({"Element": ["Cu"], 0.1: [0.03]}).to_excel(writer, sheet_name="Cu", index=False)
+    return str(path)
+
+
+def leftovers(folder):
+    return [entry for entry in os.listdir(folder) if entry.startswith(".tmp-")] if os.path.isdir(folder) else []
+
+
+def test_compile_round_trip(workbook, tmp_path):
+    folder = str(tmp_path / "compiled")
+    assert compile_workbook(workbook, folder) is not None
+    sheets = load_compiled_workbook(workbook, folder)
+    assert list(sheets) == ["Fe", "Cu"]
+    assert list(sheets["Fe"].columns) == ["Element", 0.1]
+    assert leftovers(folder) == []
+
+
+def test_failed_arrow_write_removes_staging(workbook, tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise pa.ArrowInvalid("cannot type column")
+
+    monkeypatch.setattr(reference_data.feather, "write_feather", fail)
+    folder = str(tmp_path / "compiled")
+    assert compile_workbook(workbook, folder) is None
+    assert leftovers(folder) == []
+
+
+def test_failed_write_removes_staging(workbook, tmp_path):
+    def write_sheets(data_dir):
+        with open(os.path.join(data_dir, "sheet0.arrow"), "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+
+    folder = str(tmp_path / "compiled")
+    assert write_compiled(workbook, "workbook", write_sheets, folder) is None
+    assert leftovers(folder) == []
+    assert not any(entry.endswith(".json") for entry in os.listdir(folder))
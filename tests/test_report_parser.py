@@ -0,0 +1,128 @@
+# parse_report / block_ranges against the row loop both report pages used
+# before the shared parser, on generated reports and the layouts the loop
+# handled in its own way.
+import numpy as np
+import pandas as pd
+import pytest
+
+from aps.report_parser import block_headers, block_ranges, merge_reports, parse_header, parse_report
+from aps.report_reader import read_report
+from aps.synthetic import report_rows, write_report
+
+
+def loop_parse(df_raw):
+    # The original row loop of the report pages
+    sample_blocks = []
+    i = 0
+    found_samples = 0
+    while i < len(df_raw):
+        row = df_raw.iloc[i]
+        if isinstance(row[0], str) and "Sample Name" in row[0]:
+            found_samples += 1
+            parts = row[0].split("|")
+            sample_name = next((p.split(":")[1].strip() for p in parts if "sample name" in p.lower()),
+                               f"Sample_{found_samples}")
+            i += 1
+            headers = df_raw.iloc[i].tolist()
+            i += 1
+            block_data = []
+            while i < len(df_raw) and not df_raw.iloc[i].isnull().all():
+                block_data.append(df_raw.iloc[i].tolist())
+                i += 1
+            df_sample = pd.DataFrame(block_data, columns=headers)
+            df_sample["Sample Name"] = sample_name
+            sample_blocks.append(df_sample)
+        else:
+            i += 1
+    return sample_blocks
+
+
+def assert_same_blocks(df_raw):
+    expected = loop_parse(df_raw)
+    parsed = parse_report(df_raw)
+
+    assert len(block_ranges(df_raw)) == len(expected)
+    for block_no, df_sample in enumerate(expected, start=1):
+        block = parsed[parsed["Block"] == block_no].drop(columns="Block").reset_index(drop=True)
+        # A block without data rows has no rows in the stacked frame either
+        if df_sample.empty:
+            assert block.empty
+            continue
+        assert list(block.columns) == list(df_sample.columns)
+        pd.testing.assert_frame_equal(block.astype(object), df_sample.astype(object), check_dtype=False,
+                                      check_index_type=False)
+
+
+def raw(rows):
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"samples": 6, "elements": 30},
+    {"samples": 1, "elements": 20, "sets": 16},
+    {"samples": 3, "elements": 5, "sets": 4, "censored": 0.5, "missing_cert": 0.5, "missing_acceptance": 0.5},
+])
+def test_generated_reports(kwargs):
+    assert_same_blocks(raw(report_rows(**kwargs)))
+
+
+@pytest.mark.parametrize("suffix", [".xlsx", ".csv"])
+def test_reports_read_from_file(tmp_path, suffix):
+    path = write_report(str(tmp_path / f"report{suffix}"), samples=4, elements=12, sets=2)
+    assert_same_blocks(read_report(path))
+
+
+def test_last_block_without_blank_row():
+    rows = report_rows(samples=2, elements=4)[:-1]
+    assert_same_blocks(raw(rows))
+
+
+def test_header_without_sample_name_field():
+    rows = report_rows(samples=3, elements=4)
+    rows[6][0] = "Sample Name | Method: FE_LAS"
+    assert_same_blocks(raw(rows))
+
+
+def test_sample_name_row_inside_a_block_is_data():
+    rows = report_rows(samples=2, elements=4)
+    rows[3][0] = "Method: X | Sample Name: inner"
+    assert_same_blocks(raw(rows))
+
+
+def test_leading_rows_and_extra_blank_rows():
+    rows = report_rows(samples=2, elements=3)
+    blank = [None] * 5
+    rows = [["Instrument export", None, None, None, None], blank] + rows[:6] + [blank, blank] + rows[6:]
+    assert_same_blocks(raw(rows))
+
+
+def test_header_followed_by_blank_row():
+    rows = report_rows(samples=2, elements=3)
+    rows.insert(2, [None] * 5)
+    assert_same_blocks(raw(rows))
+
+
+def test_numeric_first_column():
+    df_raw = raw(np.arange(20, dtype=float).reshape(4, 5))
+    assert loop_parse(df_raw) == []
+    assert block_ranges(df_raw) == []
+    assert parse_report(df_raw).empty
+
+
+def timed_block(time_of_day, elements=3, seed=0):
+    rows = report_rows(samples=1, elements=elements, seed=seed)
+    rows[0][0] = f"Method: FE_LAS | Date: 2025-01-01 | Time: {time_of_day} | Sample Name: S001"
+    return raw(rows)
+
+
+def test_parse_header_keeps_colons_in_values():
+    header = parse_header("Method: FE_LAS | Time: 14:35:10 | Sample Name: S001: repeat")
+    assert header["time"] == "14:35:10"
+    assert header["sample name"] == "S001"
+
+
+def test_merge_orders_blocks_by_minutes():
+    # Files of one hour, uploaded out of order
+    frames = [timed_block("10:45", seed=1), timed_block("10:05", seed=2), timed_block("10:25", seed=3)]
+    merged = merge_reports(frames)
+    assert [h["time"] for h in block_headers(merged)] == ["10:05", "10:25", "10:45"]
@@ -0,0 +1,225 @@
+# Column-wise verdicts and roll-ups against the row-by-row apply/groupby
+# code the report pages used before aps.scoring, on generated reports and
+# hand-made rows for the NA, "-", boundary and mixed cases.
+import numpy as np
+import pandas as pd
+import pytest
+
+from aps.pipeline import parse_accuracy_report, parse_stability_report, score_accuracy_report, score_stability_report
+from aps.reference_data import load_excluded_elements
+from aps.synthetic import COLUMNS, report_rows
+from aps.thresholds import find_precision_file, load_threshold_index
+from test_report_parser import loop_parse
+
+BASE = "Fe"
+MODEL = "Metavision 10008X_A"
+
+
+def loop_accuracy(df_raw, base=BASE):
+    # The original accuracy page, from the parsed blocks to the summaries
+    final_df = pd.concat(loop_parse(df_raw), ignore_index=True)
+    final_df["Elements"] = final_df["Elements"].str.replace(" (%)", "", regex=False).str.strip().str.capitalize()
+    final_df = final_df[final_df["Elements"] != base.strip().capitalize()]
+    final_df = final_df[~final_df["Mean"].astype(str).str.contains("<|>")]
+    final_df["CV"] = final_df.apply(lambda row: row["Mean"] if str(row["Cert. Val."]).strip() == '-' else row["Cert. Val."], axis=1)
+    final_df["SD"] = pd.to_numeric(final_df["SD"], errors="coerce").fillna(0)
+    final_df["CertValNum"] = pd.to_numeric(final_df["Cert. Val."], errors="coerce")
+    final_df["DEV"] = (final_df["CertValNum"] - pd.to_numeric(final_df["Mean"])).abs()
+    final_df["Acceptance"] = np.nan
+    for col in final_df.columns:
+        if col.startswith("Acceptance"):
+            temp = pd.to_numeric(final_df[col].replace("-", np.nan), errors="coerce")
+            if "2s" in col:
+                temp = temp / 2
+            elif "3s" in col:
+                temp = temp / 3
+            final_df["Acceptance"] = final_df["Acceptance"].combine_first(temp)
+    final_df["A_Limit"] = pd.to_numeric(final_df["Acceptance"], errors="coerce")
+    final_df["P_Limit"] = final_df["CV"].astype(float) * 0.05
+    final_df["A_Result"] = final_df.apply(
+        lambda row: "Pass" if pd.notna(row["DEV"]) and pd.notna(row["A_Limit"]) and row["DEV"] <= row["A_Limit"] else "Fail",
+        axis=1)
+    final_df["P_Result"] = final_df.apply(
+        lambda row: "Pass" if pd.notna(row["SD"]) and pd.notna(row["P_Limit"]) and row["SD"] <= row["P_Limit"] else "Fail",
+        axis=1)
+    final_df["%DEV_A"] = ((final_df["DEV"] / final_df["A_Limit"]) * 100).round(2)
+    final_df["%DEV_P"] = ((final_df["SD"] / final_df["P_Limit"]) * 100).round(2)
+    final_df.loc[final_df["%DEV_A"].isna(), "A_Result"] = "NA"
+    final_df.loc[final_df["%DEV_P"].isna(), "P_Result"] = "NA"
+
+    accuracy_counts = final_df[final_df["%DEV_A"].notna()].groupby("Elements").size().reset_index(name="Sample_Count")
+    precision_counts = final_df[final_df["%DEV_P"].notna()].groupby("Elements").size().reset_index(name="Sample_Count")
+
+    def summarize_accuracy(group):
+        if (group["Cert. Val."] == "-").all():
+            return "NA"
+        filtered = group[group["A_Result"] != "NA"]
+        if filtered.empty:
+            return "NA"
+        return "Pass" if (filtered["A_Result"] == "Pass").all() else "Fail"
+
+    def summarize_precision(group):
+        if (group["Acceptance"] == "-").all():
+            return "NA"
+        filtered = group[group["P_Result"] != "NA"]
+        if filtered.empty:
+            return "NA"
+        return "Pass" if (filtered["P_Result"] == "Pass").all() else "Fail"
+
+    summaries = []
+    for summarize, counts, label in ((summarize_accuracy, accuracy_counts, "Accuracy_Result"),
+                                     (summarize_precision, precision_counts, "Precision_Result")):
+        summary = final_df.groupby("Elements").apply(summarize).reset_index()
+        summary.columns = ["Elements", label]
+        summary["Elements"] = summary["Elements"].str.title()
+        counts["Elements"] = counts["Elements"].str.title()
+        summary = summary.merge(counts, on="Elements", how="left")
+        summary["Sample_Count"] = summary["Sample_Count"].fillna(0).astype(int)
+        summaries.append(summary)
+    return final_df, summaries[0], summaries[1]
+
+
+def lookup_threshold(cert_val, element, df_table):
+    try:
+        cert_val = float(cert_val)
+    except (TypeError, ValueError):
+        return None
+    col = element.strip()
+    filtered = df_table[df_table[df_table.columns[0]] >= cert_val]
+    if not filtered.empty and col in df_table.columns:
+        return filtered.iloc[0][col]
+    return None
+
+
+def precision_table(model=MODEL, base=BASE):
+    df = pd.read_excel(find_precision_file(model), sheet_name=base, skiprows=[1])
+    df.columns = df.columns.str.strip()
+    df.iloc[:, 0] = pd.to_numeric(df.iloc[:, 0], errors="coerce")
+    return df
+
+
+def loop_stability(df_raw, stab_type, base=BASE):
+    # The original stability page, from the raw sheet to the element summary
+    blocks = []
+    for df_block in loop_parse(df_raw):
+        df_block = df_block.drop(columns="Sample Name")
+        df_block["Elements"] = df_block["Elements"].str.replace(" (%)", "", regex=False).str.strip().str.capitalize()
+        df_block = df_block[~df_block["Mean"].astype(str).str.contains("<|>")]
+        df_block["CV"] = df_block.apply(lambda row: row["Mean"] if row["Cert. Val."] == '-' else row["Cert. Val."], axis=1)
+        df_block["CertValNum"] = pd.to_numeric(df_block["Cert. Val."], errors="coerce")
+        df_block["DEV"] = (df_block["CertValNum"] - pd.to_numeric(df_block["Mean"])).abs()
+        df_block["Acceptance"] = np.nan
+        for col in [c for c in df_block.columns if c.startswith("Acceptance")]:
+            temp = pd.to_numeric(df_block[col].replace("-", np.nan), errors="coerce")
+            if "2s" in col:
+                temp = temp / 2
+            elif "3s" in col:
+                temp = temp / 3
+            df_block["Acceptance"] = df_block["Acceptance"].combine_first(temp)
+        df_block["S_Limit"] = pd.to_numeric(df_block["Acceptance"], errors="coerce")
+        df_block.insert(0, "Set", f"{len(blocks) + 1}")
+        blocks.append(df_block)
+
+    final_df = pd.concat(blocks, ignore_index=True)
+    final_df = final_df[final_df["Elements"].str.capitalize() != base.strip().capitalize()]
+    precision_df = precision_table()
+    final_df["CV"] = pd.to_numeric(final_df["CV"], errors="coerce")
+    final_df["S_Limit0"] = final_df.apply(lambda row: lookup_threshold(row["CV"], row["Elements"], precision_df), axis=1)
+    final_df["S_Limit"] = np.where(final_df["S_Limit"].isna(), final_df["S_Limit0"], final_df["S_Limit"])
+
+    excluded_elements = load_excluded_elements()
+    multiplier = 1.5 if stab_type == "ShortTerm" else 3
+    final_df["Elements"] = final_df["Elements"].str.upper()
+    final_df["S_Limit"] = final_df.apply(
+        lambda row: row["S_Limit"] * 3 if row["Elements"] in excluded_elements else row["S_Limit"] * multiplier, axis=1)
+    final_df["%DEV_S"] = final_df.apply(
+        lambda row: round((row["DEV"] / row["S_Limit"]) * 100, 2)
+        if pd.notna(row["DEV"]) and pd.notna(row["S_Limit"]) else None, axis=1)
+    final_df["S_Result"] = final_df.apply(
+        lambda row: "Pass" if pd.notna(row["DEV"]) and row["DEV"] <= row["S_Limit"] else "Fail"
+        if pd.notna(row["DEV"]) else "NA", axis=1)
+
+    def summarize_stability(group):
+        if (group["Cert. Val."] == "-").all():
+            return "NA"
+        return "Pass" if (group["S_Result"] == "Pass").all() else "Fail"
+
+    filtered_df = final_df[~final_df["Cert. Val."].astype(str).str.contains("-", na=False)]
+    element_summary = filtered_df.groupby("Elements").apply(summarize_stability).reset_index()
+    element_summary.columns = ["Elements", "Stability_Result"]
+    element_summary["Elements"] = element_summary["Elements"].str.title()
+    return final_df, element_summary
+
+
+def numbers(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=float)
+
+
+def assert_same_accuracy(df_raw):
+    expected, expected_accuracy, expected_precision = loop_accuracy(df_raw)
+    parsed, _ = parse_accuracy_report(df_raw)
+    final_df, accuracy, precision = score_accuracy_report(parsed, BASE, {})
+
+    for col in ("A_Result", "P_Result"):
+        assert final_df[col].astype(str).tolist() == expected[col].tolist()
+    for col in ("DEV", "%DEV_A", "%DEV_P", "A_Limit", "P_Limit"):
+        np.testing.assert_array_equal(numbers(final_df[col]), numbers(expected[col]))
+    pd.testing.assert_frame_equal(accuracy.reset_index(drop=True), expected_accuracy, check_dtype=False)
+    pd.testing.assert_frame_equal(precision.reset_index(drop=True), expected_precision, check_dtype=False)
+
+
+def assert_same_stability(df_raw, stab_type):
+    expected, expected_summary = loop_stability(df_raw, stab_type)
+    parsed, _ = parse_stability_report(df_raw)
+    final_df, summary = score_stability_report(parsed, BASE, load_threshold_index(MODEL, BASE), stab_type)
+
+    assert final_df["S_Result"].astype(str).tolist() == expected["S_Result"].tolist()
+    for col in ("S_Limit", "%DEV_S"):
+        np.testing.assert_array_equal(numbers(final_df[col]), numbers(expected[col]))
+    pd.testing.assert_frame_equal(summary.reset_index(drop=True), expected_summary, check_dtype=False)
+
+
+def edge_rows():
+    # One block per case; cert 1.0 with acceptance (2s) 0.5 puts the limit
+    # at 0.25, a mean of 0.75 lands exactly on it
+    header = lambda name: [f"Method: FE_LAS | Matrix: LAS | Date: 2025-01-01 | Sample Name: {name}"] + [None] * 4
+    blank = [None] * 5
+    blocks = {
+        "BOUNDARY": [["C (%)", 0.75, 0.05, 1.0, 0.5], ["Si (%)", 0.7500001, 0.0500001, 1.0, 0.5]],
+        "DASHES": [["C (%)", 0.5, "-", "-", "-"], ["Si (%)", 0.5, 0.01, 0.5, "-"], ["Mn (%)", 0.45, 0.01, "-", "-"]],
+        "BLANKS": [["C (%)", 0.5, None, 0.5, None], ["Si (%)", 0.5, 0.01, None, 0.02], ["Mn (%)", 0.4, 0.01, 0.5, 0.02]],
+        "CENSORED": [["C (%)", "<0.001", 0.01, 0.5, 0.02], ["Si (%)", ">5", 0.01, 0.5, 0.02], ["Mn (%)", 0.5, 0.0, 0.5, 0.02]],
+        "BASE": [["Fe (%)", 70.0, 0.1, 70.0, 1.0], ["C (%)", 0.9, 0.2, 1.0, 0.02]],
+    }
+    rows = []
+    for name, block in blocks.items():
+        rows += [header(name), list(COLUMNS)] + block + [blank]
+    return rows
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"samples": 6, "elements": 30},
+    {"samples": 4, "elements": 10, "censored": 0.3, "missing_cert": 0.4, "missing_acceptance": 0.4, "seed": 3},
+    {"samples": 3, "elements": 5, "missing_cert": 1.0, "seed": 4},
+])
+def test_accuracy_generated(kwargs):
+    assert_same_accuracy(pd.DataFrame(report_rows(**kwargs)))
+
+
+def test_accuracy_edge_cases():
+    assert_same_accuracy(pd.DataFrame(edge_rows()))
+
+
+@pytest.mark.parametrize("stab_type,kwargs", [
+    ("ShortTerm", {"elements": 20, "sets": 8}),
+    ("LongTerm", {"elements": 30, "sets": 16, "censored": 0.2, "missing_cert": 0.3, "missing_acceptance": 0.5,
+                  "seed": 5}),
+    ("LongTerm", {"elements": 8, "sets": 16, "missing_acceptance": 1.0, "seed": 6}),
+])
+def test_stability_generated(stab_type, kwargs):
+    assert_same_stability(pd.DataFrame(report_rows(samples=1, **kwargs)), stab_type)
+
+
+def test_stability_edge_cases():
+    # The edge blocks as sets of one stability run, every element mixed
+    assert_same_stability(pd.DataFrame(edge_rows()), "ShortTerm")
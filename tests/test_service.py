@@ -0,0 +1,73 @@
+import http.client
+import os
+import threading
+import time
+
+import pytest
+
+from aps.service import ScoringHandler, ScoringServer
+
+
+@pytest.fixture
+def server():
+    server = ScoringServer(("127.0.0.1", 0), workers=1, max_pending=4, timeout_s=60)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body=b"report", headers=None):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=60)
+    try:
+        conn.putrequest("POST", "/score?test=LongTerm&base=Fe&model=M1")
+        for name, value in (headers or {"Content-Length": str(len(body))}).items():
+            conn.putheader(name, value)
+        conn.endheaders()
+        conn.send(body)
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", ""])
+def test_bad_content_length(server, length):
+    assert post(server, b"", {"Content-Length": length}) == 400
+
+
+def test_broken_pool_is_replaced(server):
+    broken = server.pool
+    with pytest.raises(Exception):
+        broken.submit(os._exit, 1).result(timeout=60)
+
+    assert post(server) == 500
+    assert server.pool is not broken
+    assert server.stats.snapshot()["counts"]["worker_crashes"] == 1
+    assert server.pool.submit(pow, 2, 3).result(timeout=60) == 8
+
+
+def test_busy_is_rejected_before_the_body_is_read(server):
+    server.max_pending = 0
+    # Only the headers are sent: a 503 proves the body was never waited for
+    assert post(server, b"", {"Content-Length": "1000"}) == 503
+    assert server.stats.snapshot()["pending"] == 0
+
+
+def test_stalled_client_frees_its_slot(server, monkeypatch):
+    monkeypatch.setattr(ScoringHandler, "timeout", 0.5)
+    conn = http.client.HTTPConnection(*server.server_address, timeout=60)
+    try:
+        conn.putrequest("POST", "/score?test=LongTerm&base=Fe&model=M1")
+        conn.putheader("Content-Length", "1000")
+        conn.endheaders()
+        conn.send(b"partial")
+        deadline = time.monotonic() + 30
+        while not server.stats.snapshot()["counts"].get("incomplete_body") and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        conn.close()
+    snapshot = server.stats.snapshot()
+    assert snapshot["counts"]["incomplete_body"] == 1
+    assert snapshot["pending"] == 0
+    assert "latency_ms" not in snapshot
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from aps.pipeline import parse_stability_report
+from aps.stability_stats import stability_statistics
+from aps.synthetic import report_rows
+
+
+def stability_rows(sets=8, seed=0):
+    return report_rows(samples=1, elements=["Fe", "C", "Si"], sets=sets, censored=0, missing_cert=0,
+                       missing_acceptance=0, seed=seed)
+
+
+def sd_cells(rows, element):
+    return [row for row in rows if row[0] == f"{element} (%)"]
+
+
+def expected_within_sd(sds):
+    sds = np.array([s for s in sds if isinstance(s, float)])
+    return np.sqrt(np.mean(sds ** 2))
+
+
+def test_missing_sds_are_left_out():
+    rows = stability_rows()
+    cells = sd_cells(rows, "C")
+    for i, row in enumerate(cells[:6]):
+        row[2] = "-" if i % 2 else None
+    final_df, _ = parse_stability_report(pd.DataFrame(rows))
+
+    stats = stability_statistics(final_df).set_index("Elements")
+    assert np.isclose(stats.loc["C", "Within SD"], expected_within_sd([row[2] for row in cells]))
+    # Means are all present, so the set count is unchanged
+    assert stats.loc["C", "Sets"] == 8
+
+
+def test_within_sd_without_missing_values():
+    rows = stability_rows(seed=1)
+    final_df, _ = parse_stability_report(pd.DataFrame(rows))
+    stats = stability_statistics(final_df).set_index("Elements")
+    for element in ("Fe", "C", "Si"):
+        assert np.isclose(stats.loc[element, "Within SD"], expected_within_sd([r[2] for r in sd_cells(rows, element)]))
@@ -0,0 +1,72 @@
+# ThresholdIndex.lookup against the row scan the stability page used
+# before the compiled index: the first row in sheet order whose
+# concentration is >= the certified value.
+import numpy as np
+import pandas as pd
+import pytest
+
+from aps.reference_data import load_workbook
+from aps.thresholds import ThresholdIndex, load_precision_index, precision_bases, precision_models
+
+
+def lookup_threshold(cert_val, element, df_table):
+    try:
+        cert_val = float(cert_val)
+    except (TypeError, ValueError):
+        return None
+    col = element.strip()
+    filtered = df_table[df_table[df_table.columns[0]] >= cert_val]
+    if not filtered.empty and col in df_table.columns:
+        return filtered.iloc[0][col]
+    return None
+
+
+def scan(table, cert_values, elements):
+    table = table.copy()
+    table.columns = table.columns.astype(str).str.strip()
+    table.iloc[:, 0] = pd.to_numeric(table.iloc[:, 0], errors="coerce")
+    found = [lookup_threshold(c, e, table) for c, e in zip(cert_values, elements)]
+    return pd.to_numeric(pd.Series(found, dtype=object), errors="coerce").to_numpy(dtype=float)
+
+
+def assert_same(table, cert_values, elements):
+    expected = scan(table, cert_values, elements)
+    np.testing.assert_array_equal(ThresholdIndex(table).lookup(cert_values, elements), expected)
+
+
+@pytest.fixture
+def table():
+    # Breakpoints out of order and a row without one, as sheets have them
+    return pd.DataFrame({
+        "Conc": [0.01, 0.1, "n/a", 0.05, 1.0, 10.0],
+        "C": [0.001, 0.002, 0.9, 0.003, 0.01, 0.05],
+        " Si ": [0.0005, np.nan, 0.9, 0.002, "-", 0.04],
+    })
+
+
+def test_values_below_on_and_between_rows(table):
+    cert_values = [0.0, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5, 1.0, 10.0, 10.5, -1.0]
+    for element in ("C", "Si", " C "):
+        assert_same(table, cert_values, [element] * len(cert_values))
+
+
+def test_missing_values_and_unknown_elements(table):
+    assert_same(table, [np.nan, "-", None, 0.02, 0.02], ["C", "C", "Si", "Mn", ""])
+
+
+def test_every_precision_sheet():
+    # Each breakpoint of the raw sheets, just below and above it, and beyond
+    # the ends, through the index the app loads (compiled when available)
+    for path in precision_models().values():
+        sheets = load_workbook(path, skiprows=[1])
+        for base in precision_bases(path):
+            table, index = sheets[base], load_precision_index(path, base)
+            conc = pd.to_numeric(table.iloc[:, 0], errors="coerce").dropna().to_numpy(dtype=float)
+            if not len(conc):
+                continue
+            edges = np.unique(conc)
+            cert_values = np.concatenate([edges, np.nextafter(edges, -np.inf), np.nextafter(edges, np.inf),
+                                          [edges[0] / 2, edges[-1] * 2]])
+            for element in index.elements[:10]:
+                elements = [element] * len(cert_values)
+                np.testing.assert_array_equal(index.lookup(cert_values, elements), scan(table, cert_values, elements))
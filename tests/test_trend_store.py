@@ -0,0 +1,46 @@
+import pandas as pd
+
+from aps.trend_store import load_history, record_stability_run, rolling_stats
+
+
+def scored_run(dev):
+    return pd.DataFrame({
+        "Set": ["1", "2", "1", "2"],
+        "Elements": ["Fe", "Fe", "C", "C"],
+        "Mean": [70.0, 70.1, 0.2, 0.21],
+        "Cert. Val.": [70.0, 70.0, 0.2, 0.2],
+        "DEV": [dev, dev, 0.001, 0.002],
+        "S_Limit": [0.5, 0.5, 0.01, 0.01],
+        "%DEV_S": [dev / 0.5 * 100, dev / 0.5 * 100, 10.0, 20.0],
+        "S_Result": ["Pass", "Pass", "Pass", "Fail"],
+    })
+
+
+def record(tmp_path, bench_no, run_key, timestamp, dev=0.1):
+    user_data = {"bench_no": bench_no, "model": "M1", "base": "FE", "matrix": "LAS"}
+    return record_stability_run(user_data, "ShortTerm", run_key, scored_run(dev), timestamp=timestamp,
+                                path=str(tmp_path / "log.db"), root=str(tmp_path / "trends"))
+
+
+def test_numeric_bench_partitions(tmp_path):
+    # Only numeric bench numbers in the tree: still filtered as strings
+    record(tmp_path, "12", "a", "2025-01-02 10:00:00")
+    record(tmp_path, "7", "b", "2025-01-03 10:00:00")
+    record(tmp_path, 12, "c", "2025-02-01 10:00:00")
+
+    history = load_history("12", root=str(tmp_path / "trends"))
+    assert set(history["run_key"]) == {"a", "c"}
+    assert set(history["bench_no"]) == {"12"}
+
+    history = load_history(12, model="M1", start="2025-01-03", root=str(tmp_path / "trends"))
+    assert set(history["run_key"]) == {"c"}
+    assert load_history("99", root=str(tmp_path / "trends")).empty
+
+
+def test_run_is_recorded_once(tmp_path):
+    assert record(tmp_path, "12", "a", "2025-01-02 10:00:00")
+    assert not record(tmp_path, "12", "a", "2025-01-02 10:00:00")
+
+    stats = rolling_stats("12", "M1", path=str(tmp_path / "log.db"))
+    assert list(stats["Runs"]) == [1, 1]
+    assert stats.set_index("Elements").loc["C", "Failure Rate %"] == 50